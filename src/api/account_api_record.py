@@ -14,10 +14,12 @@ logger.setLevel(logging.DEBUG)
 
 
 class AccountApiRecord(BaseModel):
+    # Fields other than id, created_at and object_type_name may be hidden by access rules and are then left out of
+    # read responses, see FieldProjection
     id: str
-    account_number: str
-    owner_id: str
-    account_name: str
+    account_number: Optional[str] = None
+    owner_id: Optional[str] = None
+    account_name: Optional[str] = None
     description: Optional[str] = None
     created_at: float = 0.0
     updated_at: float = 0.0
@@ -14,11 +14,13 @@ logger.setLevel(logging.DEBUG)
 
 
 class CaseApiRecord(BaseModel):
+    # Fields other than id, created_at and object_type_name may be hidden by access rules and are then left out of
+    # read responses, see FieldProjection
     id: str
-    case_number: str
-    owner_id: str
-    account_id: str
-    summary: str
+    case_number: Optional[str] = None
+    owner_id: Optional[str] = None
+    account_id: Optional[str] = None
+    summary: Optional[str] = None
     description: Optional[str] = None
     created_at: float = 0.0
     updated_at: float = 0.0
@@ -14,11 +14,13 @@ logger.setLevel(logging.DEBUG)
 
 
 class CaseCommentApiRecord(BaseModel):
+    # Fields other than id, created_at and object_type_name may be hidden by access rules and are then left out of
+    # read responses, see FieldProjection
     id: str
-    case_comment_number: str
-    owner_id: str
-    case_id: str
-    summary: str
+    case_comment_number: Optional[str] = None
+    owner_id: Optional[str] = None
+    case_id: Optional[str] = None
+    summary: Optional[str] = None
     description: Optional[str] = None
     created_at: float = 0.0
     updated_at: float = 0.0
@@ -0,0 +1,29 @@
+import logging
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+logging.basicConfig()
+logger = logging.getLogger("SearchHitApiRecord")
+logger.setLevel(logging.DEBUG)
+
+
+class SearchHitApiRecord(BaseModel):
+    object_type_name: str
+    id: str
+    # NULL when the number column is hidden from the user, like case_id
+    number: Optional[str] = None
+    case_id: Optional[str] = None
+    snippet: str
+    rank: float
+
+    @classmethod
+    def from_db_row(cls, row: Dict) -> "SearchHitApiRecord":
+        return SearchHitApiRecord(
+            object_type_name=row["object_type_name"],
+            id=row["id"],
+            number=row.get("number"),
+            case_id=row.get("case_id"),
+            snippet=row["snippet"],
+            rank=float(row["rank"])
+        )
@@ -0,0 +1,29 @@
+import logging
+from typing import Optional
+
+from pydantic import BaseModel
+
+from src.db.workflow_run_queue import WorkflowRun
+
+logging.basicConfig()
+logger = logging.getLogger("WorkflowRunApiRecord")
+logger.setLevel(logging.DEBUG)
+
+
+class WorkflowRunApiRecord(BaseModel):
+    id: str
+    workflow_trigger_id: str
+    workflow_id: str
+    sender_object_type_name: str
+    sender_object_id: str
+    state: str
+    attempts: int
+    max_attempts: int
+    next_run_at: float
+    last_error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+    @classmethod
+    def from_workflow_run(cls, workflow_run: WorkflowRun) -> "WorkflowRunApiRecord":
+        return WorkflowRunApiRecord(**workflow_run.model_dump())
@@ -0,0 +1,121 @@
+import json
+import logging
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, List
+
+from pydantic import TypeAdapter
+
+from src.api.case_api_record import CaseApiRecord
+from src.core.objects.case import Case
+from src.core.reference.object_reference import ObjectReference
+from src.db.case_record import CaseRecord
+from src.db.database import Database
+from src.db.query_templates import QueryTemplates
+from src.db.trusted_row_decoder import TrustedRowDecoder
+from src.server.json_bytes_response import JsonBytesResponse
+
+logging.basicConfig()
+logger = logging.getLogger("CLI Benchmark")
+logger.setLevel(logging.INFO)
+
+case_api_records_adapter: TypeAdapter = TypeAdapter(List[CaseApiRecord])
+
+
+def create_case_records(count: int) -> List[CaseRecord]:
+    owner_id = ObjectReference(object_type_name="User", object_id=uuid.uuid4()).to_json_str()
+    account_id = ObjectReference(object_type_name="Account", object_id=uuid.uuid4()).to_json_str()
+    now = time.time()
+    return [CaseRecord(id=str(uuid.uuid4()), case_number=Case.case_number_from_number(number), owner_id=owner_id,
+                       account_id=account_id, summary=f"Benchmark case {number}", description="Benchmark",
+                       created_at=now + number, updated_at=now + number, commit_at=now + number,
+                       object_type_name="Case")
+            for number in range(1, count + 1)]
+
+
+def decode_validated(db: Database) -> List[CaseApiRecord]:
+    # The original chain: dict rows, CaseRecord, live Case, CaseApiRecord, each one validated
+    [db_conn, db_cursor] = db.connect()
+    rows = db.list_table_rows(db_conn, db_cursor, CaseRecord.table_name())
+    case_api_records = [CaseApiRecord.from_object(CaseRecord.from_db_row(row).convert_to_object()) for row in rows]
+    db_conn.close()
+    return case_api_records
+
+
+def decode_trusted(db: Database) -> List[CaseApiRecord]:
+    # Same query as Database.read_trusted_objects, without the access check
+    [db_conn, _] = db.connect()
+    tuple_cursor = db_conn.cursor()
+    tuple_cursor.row_factory = None
+    QueryTemplates.execute(tuple_cursor, QueryTemplates.select_rows(CaseRecord.table_name()))
+    rows = tuple_cursor.fetchall()
+    decoder = TrustedRowDecoder.for_columns(CaseApiRecord, [column[0] for column in tuple_cursor.description])
+    case_api_records = decoder.decode_all(rows)
+    db_conn.close()
+    return case_api_records
+
+
+def respond_validated(db: Database) -> bytes:
+    # The original chain, then response_model validation and serialization, similar to what FastAPI does
+    return case_api_records_adapter.dump_json(
+        case_api_records_adapter.validate_python([record.model_dump() for record in decode_validated(db)]))
+
+
+def respond_trusted(db: Database) -> bytes:
+    # Same as the LIST endpoints: field values from tuple rows, serialized by JsonBytesResponse
+    [db_conn, _] = db.connect()
+    tuple_cursor = db_conn.cursor()
+    tuple_cursor.row_factory = None
+    QueryTemplates.execute(tuple_cursor, QueryTemplates.select_rows(CaseRecord.table_name()))
+    rows = tuple_cursor.fetchall()
+    decoder = TrustedRowDecoder.for_columns(CaseApiRecord, [column[0] for column in tuple_cursor.description])
+    body = JsonBytesResponse.dumps(decoder.decode_all_values(rows))
+    db_conn.close()
+    return body
+
+
+def best_time(run: Callable[[Database], Any], db: Database, repeat: int) -> float:
+    best_seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(db)
+        seconds = time.perf_counter() - start
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    return best_seconds
+
+
+def main(row_count: int = 10000, repeat: int = 3) -> None:
+    """
+    Compares the validated and the trusted decoding of case rows into API records, and the validated and direct
+    serialization of whole responses, on a temporary database.
+    Debug logging of the models is switched off while timing, it would otherwise dominate both paths.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db: Database = Database(db_name=str(Path(temp_dir) / "benchmark.db"), tuning_profile_name="throughput")
+        [db_conn, db_cursor] = db.connect()
+        db.insert_records(db_conn, db_cursor, create_case_records(row_count))
+        db_conn.close()
+        logging.disable(logging.INFO)
+        try:
+            timings = [(name, best_time(run, db, repeat)) for (name, run) in [
+                ("Validated decoding", decode_validated), ("Trusted decoding", decode_trusted),
+                ("Validated response", respond_validated), ("Direct response", respond_trusted)]]
+        finally:
+            logging.disable(logging.NOTSET)
+        # The live Case in the validated chain resets the timestamps, every other field must be identical
+        timestamps = {"created_at", "updated_at", "commit_at"}
+        assert [record.model_dump(exclude=timestamps) for record in decode_trusted(db)] == \
+               [record.model_dump(exclude=timestamps) for record in decode_validated(db)]
+        assert len(json.loads(respond_trusted(db))) == row_count
+        for (name, seconds) in timings:
+            logger.info(f"{name}: {seconds * 1000 * 10000 / row_count:.1f} ms per 10k rows")
+        logger.info(f"Trusted decoding is {timings[0][1] / timings[1][1]:.1f}x faster, direct response is "
+                    f"{timings[2][1] / timings[3][1]:.1f}x faster for {row_count} rows")
+        db.pool.close_all()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
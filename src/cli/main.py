@@ -1,9 +1,11 @@
+import json
 import logging
 import sys
 
 from src.core.access.access_rule import AccessRule
 from src.core.access.access_type import AccessType
 from src.core.access.profile import Profile
+from src.core.access.row_predicate import RowPredicate
 from src.core.access.user import User
 from src.core.eventbus.workflow import Workflow
 from src.core.eventbus.workflow_step import WorkflowStep
@@ -17,8 +19,10 @@ from src.db.account_record import AccountRecord
 from src.db.case_comment_record import CaseCommentRecord
 
 from src.db.database import Database
+from src.db.full_text_search import FullTextSearch
 from src.db.case_record import CaseRecord
 from src.db.profile_record import ProfileRecord
+from src.db.record_registry import RecordRegistry
 from src.db.user_record import UserRecord
 from src.db.workflow_record import WorkflowRecord
 from src.db.workflow_step_record import WorkflowStepRecord
@@ -41,16 +45,12 @@ def main(clean_db: bool = False):
     db.init_db_schema(db_conn, db_cursor)
     # Reconnect after init_db_schema closes the db connection
     [db_conn, db_cursor] = db.connect()
+    db.report_settings(db_conn, db_cursor)
     # Initialize workflow related object from database
     db.init_workflows_and_triggers(db_conn, db_cursor)
 
-    # Grab the maximum case number from database
-    # This is synced once per session, rest is incremented in memory per construction
-    Case.last_case_number = db.read_max_case_number(db_conn, db_cursor)
-
-    # Grab the maximum account number from database
-    # This is synced once per session, rest is incremented in memory per construction
-    Account.last_account_number = db.read_max_account_number(db_conn, db_cursor)
+    # Case and account numbers come from database sequences, reserved in blocks per process
+    db.init_number_sequences()
 
     # Create live objects
     account_full_access: AccessRule = AccessRule(
@@ -66,7 +66,25 @@ def main(clean_db: bool = False):
                                                                                  case_comment_full_access])
     support_agent_profile: Profile = Profile(name="Support Agent",
                                              access_rules=[case_full_access, case_comment_full_access])
-    sales_agent_profile: Profile = Profile(name="Sales Agent", access_rules=[])
+    # Sales agents read only their own accounts, and the cases they own or that are on their accounts, without the
+    # case descriptions
+    own_account_read_access: AccessRule = AccessRule(
+        data_object_type="Account",
+        access_type=AccessType.READ,
+        row_predicates=[RowPredicate.owned_by_user()])
+    own_case_read_access: AccessRule = AccessRule(
+        data_object_type="Case",
+        access_type=AccessType.READ,
+        row_predicates=[RowPredicate.owned_by_user()],
+        hidden_fields=["description"])
+    own_account_case_read_access: AccessRule = AccessRule(
+        data_object_type="Case",
+        access_type=AccessType.READ,
+        row_predicates=[RowPredicate.referenced_object_owned_by_user("account_object_id", "Account")],
+        hidden_fields=["description"])
+    sales_agent_profile: Profile = Profile(name="Sales Agent", access_rules=[own_account_read_access,
+                                                                             own_case_read_access,
+                                                                             own_account_case_read_access])
     administrator1: User = User(username="admin", fullname="Administrator",
                                 profile_ids=ObjectReferenceList.from_list([administrator_profile]))
     support_agent_user1: User = User(username="jilljohns", fullname="Jill Johns",
@@ -197,34 +215,30 @@ run_temporal_workflow(sender)
                                                          workflow_trigger_event_type="CREATE",
                                                          workflow_to_run_id=ObjectReference.from_object(workflow2))
 
-    # Create and write database records for profiles, but overwrite if exists
-    ProfileRecord.from_object(administrator_profile).insert_or_replace_to_db(db_conn, db_cursor)
-    ProfileRecord.from_object(support_agent_profile).insert_or_replace_to_db(db_conn, db_cursor)
-    ProfileRecord.from_object(sales_agent_profile).insert_or_replace_to_db(db_conn, db_cursor)
-
-    # Create and write database records for users, but overwrite if exists
-    UserRecord.from_object(administrator1).insert_or_replace_to_db(db_conn, db_cursor)
-    UserRecord.from_object(support_agent_user1).insert_or_replace_to_db(db_conn, db_cursor)
-    UserRecord.from_object(sales_agent_user1).insert_or_replace_to_db(db_conn, db_cursor)
+    # Create and write database records for profiles, users and workflows in one transaction, but overwrite if exists
+    db.insert_records(db_conn, db_cursor, [
+        ProfileRecord.from_object(administrator_profile),
+        ProfileRecord.from_object(support_agent_profile),
+        ProfileRecord.from_object(sales_agent_profile),
+        UserRecord.from_object(administrator1),
+        UserRecord.from_object(support_agent_user1),
+        UserRecord.from_object(sales_agent_user1),
+        WorkflowStepRecord.from_object(workflow1_step),
+        WorkflowStepRecord.from_object(workflow2_step),
+        WorkflowStepRecord.from_object(workflow3_step),
+        WorkflowStepRecord.from_object(workflow4_step),
+        WorkflowStepRecord.from_object(workflow5_step),
+        WorkflowStepRecord.from_object(workflow6_step),
+        WorkflowStepRecord.from_object(workflow7_step),
+        WorkflowRecord.from_object(workflow1),
+        WorkflowRecord.from_object(workflow2),
+        WorkflowTriggerRecord.from_object(workflow_trigger1),
+        WorkflowTriggerRecord.from_object(workflow_trigger2),
+        WorkflowTriggerRecord.from_object(workflow_trigger3),
+    ], replace=True)
 
     # Create and write database records for accounts
-    WorkflowStepRecord.from_object(workflow1_step).insert_or_replace_to_db(db_conn, db_cursor)
-    WorkflowStepRecord.from_object(workflow2_step).insert_or_replace_to_db(db_conn, db_cursor)
-    WorkflowStepRecord.from_object(workflow3_step).insert_or_replace_to_db(db_conn, db_cursor)
-    WorkflowStepRecord.from_object(workflow4_step).insert_or_replace_to_db(db_conn, db_cursor)
-    WorkflowStepRecord.from_object(workflow5_step).insert_or_replace_to_db(db_conn, db_cursor)
-    WorkflowStepRecord.from_object(workflow6_step).insert_or_replace_to_db(db_conn, db_cursor)
-    WorkflowStepRecord.from_object(workflow7_step).insert_or_replace_to_db(db_conn, db_cursor)
-
-    WorkflowRecord.from_object(workflow1).insert_or_replace_to_db(db_conn, db_cursor)
-    WorkflowRecord.from_object(workflow2).insert_or_replace_to_db(db_conn, db_cursor)
-
-    WorkflowTriggerRecord.from_object(workflow_trigger1).insert_or_replace_to_db(db_conn, db_cursor)
-    WorkflowTriggerRecord.from_object(workflow_trigger2).insert_or_replace_to_db(db_conn, db_cursor)
-    WorkflowTriggerRecord.from_object(workflow_trigger3).insert_or_replace_to_db(db_conn, db_cursor)
-
-    AccountRecord.from_object(account1).insert_to_db(db_conn, db_cursor)
-    AccountRecord.from_object(account2).insert_to_db(db_conn, db_cursor)
+    db.insert_records(db_conn, db_cursor, [AccountRecord.from_object(account1), AccountRecord.from_object(account2)])
 
     # Enable all triggers for case and comment creations below
     db.init_workflows_and_triggers(db_conn, db_cursor)
@@ -255,8 +269,7 @@ run_temporal_workflow(sender)
 
 
     # Create and write database records for cases
-    CaseRecord.from_object(case1).insert_to_db(db_conn, db_cursor)
-    CaseRecord.from_object(case2).insert_to_db(db_conn, db_cursor)
+    db.insert_records(db_conn, db_cursor, [CaseRecord.from_object(case1), CaseRecord.from_object(case2)])
 
     # Create and write database records for case comments
     CaseCommentRecord.from_object(case1_comment_1).insert_to_db(db_conn, db_cursor)
@@ -274,11 +287,64 @@ run_temporal_workflow(sender)
                 f"{[str(case) for case in sales_agent_cases]}")
     all_triggers = db.read_objects(db_conn, db_cursor, WorkflowTriggerRecord.table_name(), "WorkflowTrigger", None)
     logger.info(f"Workflow triggers (total: {len(all_triggers)}): {[str(trigger) for trigger in all_triggers]}")
+    db_conn.close()
+    db.report_statement_cache()
 
     logger.debug("Stopping CLI")
 
 
+def import_ndjson(file_path: str, batch_size: int = 1000) -> int:
+    """
+    Bulk imports records from a newline delimited JSON file, for example one exported from a LIST endpoint with
+    "Accept: application/x-ndjson". Every line needs an object_type_name. Records with existing ids are overwritten.
+    The whole file is imported in a single transaction.
+    """
+    logger.info(f'Importing records from "{file_path}"')
+    db: Database = Database(db_name="database/crm.db")
+    [db_conn, db_cursor] = db.connect()
+    db.init_number_sequences()
+
+    imported_count: int = 0
+    batch = []
+    with open(file_path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            record_type = RecordRegistry.for_object_type(row.get("object_type_name", ""))
+            if record_type is None:
+                db_conn.close()
+                raise ValueError(f'Line {line_number}: unexpected object type "{row.get("object_type_name")}"')
+            batch.append(record_type.decode(row))
+            if len(batch) >= batch_size:
+                imported_count += db.insert_records(db_conn, db_cursor, batch, replace=True, commit=False)
+                batch = []
+    imported_count += db.insert_records(db_conn, db_cursor, batch, replace=True, commit=False)
+    db_conn.commit()
+    db_conn.close()
+    logger.info(f'Imported {imported_count} records from "{file_path}"')
+    return imported_count
+
+
+def rebuild_search() -> None:
+    """
+    Re-indexes all cases and case comments for full text search, for example after a VACUUM.
+    """
+    db: Database = Database(db_name="database/crm.db")
+    [db_conn, db_cursor] = db.connect()
+    FullTextSearch.rebuild_all(db_cursor)
+    db_conn.commit()
+    db_conn.close()
+
+
 if __name__ == "__main__":
+    if "--rebuild_search" in sys.argv:
+        rebuild_search()
+        sys.exit(0)
+    if "--import" in sys.argv:
+        import_ndjson(sys.argv[sys.argv.index("--import") + 1])
+        sys.exit(0)
     clean_db_param = False
     if "--clean_db" in sys.argv:
         logger.info(f"Cleaning database")
@@ -1,7 +1,9 @@
 import logging
 import uuid
+from typing import List
 
 from src.core.access.access_type import AccessType
+from src.core.access.row_predicate import RowPredicate
 from src.core.base.data_object import DataObject
 
 logging.basicConfig()
@@ -12,13 +14,17 @@ logger.setLevel(logging.DEBUG)
 class AccessRule(DataObject):
     data_object_type: str
     access_type: AccessType
-
-    # TODO: Add field based access rules to AccessRule.
+    # All of them have to hold for a row to be accessible, no predicates give access to all rows
+    row_predicates: List[RowPredicate] = []
+    # Fields left out of everything read through this rule
+    hidden_fields: List[str] = []
 
     def __init__(self, **data):
         super().__init__(id=data.get("id", uuid.uuid4()),
                          data_object_type=data["data_object_type"],
                          access_type=data["access_type"],
+                         row_predicates=data.get("row_predicates", []),
+                         hidden_fields=data.get("hidden_fields", []),
                          object_type_name="AccessRule"
                          )
         logger.debug(f"Creating access rule: {self}")
@@ -42,6 +48,8 @@ class AccessRule(DataObject):
             id=uuid.UUID(json_dict["id"]),
             data_object_type=json_dict["data_object_type"],
             access_type=AccessType.from_str(json_dict["access_type"]),
+            row_predicates=[RowPredicate(**row_predicate) for row_predicate in json_dict.get("row_predicates", [])],
+            hidden_fields=json_dict.get("hidden_fields", []),
             created_at=json_dict["created_at"],
             updated_at=json_dict["updated_at"],
             commit_at=json_dict["commit_at"]
@@ -0,0 +1,30 @@
+import logging
+from typing import ClassVar, Optional
+
+from pydantic import BaseModel
+
+logging.basicConfig()
+logger = logging.getLogger("RowPredicate")
+logger.setLevel(logging.DEBUG)
+
+
+class RowPredicate(BaseModel):
+    """
+    Row condition of an access rule: only rows whose `column` equals `value` are accessible.
+    With `through_object_type`, `column` holds the id of an object of that type, and the `through_column` of that
+    object has to equal `value` instead, for example cases whose account is owned by the user.
+    The value USER_ID stands for the id of the user whose access is checked.
+    """
+    USER_ID: ClassVar[str] = "$user.id"
+    column: str
+    value: str = USER_ID
+    through_object_type: Optional[str] = None
+    through_column: Optional[str] = None
+
+    @classmethod
+    def owned_by_user(cls) -> "RowPredicate":
+        return RowPredicate(column="owner_object_id")
+
+    @classmethod
+    def referenced_object_owned_by_user(cls, column: str, object_type_name: str) -> "RowPredicate":
+        return RowPredicate(column=column, through_object_type=object_type_name, through_column="owner_object_id")
@@ -1,6 +1,6 @@
 import logging
 import uuid
-from typing import List, Optional, ClassVar
+from typing import Dict, List, Optional, ClassVar
 
 from src.core.base.data_field import DataField
 from src.core.base.data_object import DataObject
@@ -39,13 +39,19 @@ class Workflow(DataObject):
         self.workflow_steps = workflow_steps
 
     def load_steps_from_all_steps(self, workflow_steps: List[WorkflowStep]):
-        object_ids = [str(object_id) for object_id in self.workflow_step_ids.object_ids]
-        self.workflow_steps = [workflow_step for workflow_step in workflow_steps if object_ids.__contains__(str(workflow_step.id))]
+        self.load_steps_by_id({str(workflow_step.id): workflow_step for workflow_step in workflow_steps})
+
+    def load_steps_by_id(self, workflow_steps_by_id: Dict[str, WorkflowStep]):
+        # Steps run in the order of workflow_step_ids, unknown ids are skipped
+        object_ids = [str(object_id) for object_id in self.workflow_step_ids.object_ids] \
+            if self.workflow_step_ids is not None else []
+        self.workflow_steps = [workflow_steps_by_id[object_id] for object_id in object_ids
+                               if object_id in workflow_steps_by_id]
 
     def run_workflow(self, sender: Optional[DataObject], trigger: Optional[WorkflowTrigger]):
         logger.debug(f"Running workflow: {self.workflow_name} with id '{str(self.id)}'...")
         for workflow_step in self.workflow_steps:
             logger.debug(f"---Running step '{workflow_step.workflow_step_name}' with id '{str(workflow_step.id)}'...")
-            exec(workflow_step.workflow_step_code, {}, locals())
+            exec(workflow_step.compiled_code(), {}, locals())
             logger.debug(f"---Done running step '{workflow_step.workflow_step_name}' with id '{str(workflow_step.id)}'.")
         logger.debug(f"Done running workflow: {self.workflow_name} with id '{str(self.id)}'.")
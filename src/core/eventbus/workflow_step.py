@@ -1,6 +1,11 @@
+import hashlib
 import logging
+import threading
 import uuid
-from typing import List, ClassVar
+from types import CodeType
+from typing import Dict, List, ClassVar, Optional
+
+from pydantic import PrivateAttr
 
 from src.core.base.data_field import DataField
 from src.core.base.data_object import DataObject
@@ -17,6 +22,11 @@ class WorkflowStep(DataObject):
     workflow_step_code: str
     # DO NOT serialize, transient only
     all_workflow_steps: ClassVar[List["WorkflowStep"]] = []
+    # Compiled step code by SHA-256 of its source, shared by all steps with the same code
+    all_compiled_code: ClassVar[Dict[str, CodeType]] = {}
+    all_compiled_code_lock: ClassVar[threading.Lock] = threading.Lock()
+    _compiled_source: Optional[str] = PrivateAttr(default=None)
+    _compiled_code: Optional[CodeType] = PrivateAttr(default=None)
 
     @classmethod
     def get_custom_fields(cls) -> List[DataField]:
@@ -30,3 +40,23 @@ class WorkflowStep(DataObject):
                          custom_fields=WorkflowStep.get_custom_fields(),
                          object_type_name="WorkflowStep")
         logger.debug(f"Creating workflow step: {self}")
+
+    @classmethod
+    def compile_code(cls, workflow_step_code: str) -> CodeType:
+        """
+        Compiles step code once per distinct source. Raises SyntaxError for invalid code.
+        """
+        source_hash = hashlib.sha256(workflow_step_code.encode("utf-8")).hexdigest()
+        code = WorkflowStep.all_compiled_code.get(source_hash)
+        if code is None:
+            code = compile(workflow_step_code, "<workflow step>", "exec")
+            with WorkflowStep.all_compiled_code_lock:
+                WorkflowStep.all_compiled_code[source_hash] = code
+        return code
+
+    def compiled_code(self) -> CodeType:
+        # Compiled again only when the code of this step was changed
+        if self._compiled_code is None or self._compiled_source != self.workflow_step_code:
+            self._compiled_code = WorkflowStep.compile_code(self.workflow_step_code)
+            self._compiled_source = self.workflow_step_code
+        return self._compiled_code
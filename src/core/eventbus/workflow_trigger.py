@@ -1,6 +1,8 @@
 import logging
 import uuid
-from typing import List, ClassVar
+from typing import Callable, Dict, List, ClassVar, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
 
 from src.core.base.data_field import DataField
 from src.core.base.data_object import DataObject
@@ -19,6 +21,11 @@ class WorkflowTrigger(DataObject):
     # DO NOT serialize, transient only
     workflows: List[DataObject] = []
     all_workflow_triggers: ClassVar[List["WorkflowTrigger"]] = []
+    # Built from all_workflow_triggers whenever they are loaded, see WorkflowDispatchIndex
+    dispatch_index: ClassVar["WorkflowDispatchIndex"]
+    # Set by the server to run triggered workflows in the background, see WorkflowExecutor. Without it, they run
+    # right after the sender object is inserted, see run_after_insert.
+    event_dispatcher: ClassVar[Optional[Callable[[str, str, DataObject], None]]] = None
 
     @classmethod
     def get_custom_fields(cls) -> List[DataField]:
@@ -36,16 +43,78 @@ class WorkflowTrigger(DataObject):
         logger.debug(f"Creating workflow trigger: {self}")
 
     def load_workflows_from_all_workflows(self, workflows: List[DataObject]):
-        object_ids = [str(self.workflow_to_run_id.object_id)]
-        self.workflows = [workflow for workflow in workflows if object_ids.__contains__(str(workflow.id))]
+        self.load_workflows_by_id({str(workflow.id): workflow for workflow in workflows})
+
+    def load_workflows_by_id(self, workflows_by_id: Dict[str, DataObject]):
+        workflow = workflows_by_id.get(str(self.workflow_to_run_id.object_id))
+        self.workflows = [workflow] if workflow is not None else []
+
+    @classmethod
+    def dispatch_event(cls, workflow_trigger_object_type_name: str, workflow_trigger_event_type: str,
+                       sender_object: DataObject):
+        # Queues the runs with the event dispatcher, if there is one
+        if WorkflowTrigger.event_dispatcher is not None:
+            WorkflowTrigger.event_dispatcher(workflow_trigger_object_type_name, workflow_trigger_event_type,
+                                             sender_object)
+
+    @classmethod
+    def run_after_insert(cls, workflow_trigger_object_type_name: str, sender_object: DataObject):
+        """
+        Runs the CREATE triggers of a new object right after it is inserted, when there is no event dispatcher.
+        Workflow steps then see the object as stored, with its number. A failing step is logged and does not fail
+        the insert.
+        """
+        if WorkflowTrigger.event_dispatcher is not None:
+            return
+        try:
+            WorkflowTrigger.run_matching_triggers(workflow_trigger_object_type_name, "CREATE", sender_object)
+        except Exception as e:
+            logger.error(f"Error running {workflow_trigger_object_type_name} triggers: {str(e)}")
+
+    @classmethod
+    def matching_workflows(cls, workflow_trigger_object_type_name: str,
+                           workflow_trigger_event_type: str) -> List[Tuple["WorkflowTrigger", DataObject]]:
+        # (trigger, workflow) pairs to run for the event
+        return list(WorkflowTrigger.dispatch_index.workflows_by_event.get(
+            (workflow_trigger_object_type_name, workflow_trigger_event_type), ()))
 
     @classmethod
     def run_matching_triggers(cls, workflow_trigger_object_type_name: str, workflow_trigger_event_type: str,
                               sender_object: DataObject):
-        for workflow_trigger in WorkflowTrigger.all_workflow_triggers:
-            if workflow_trigger.workflows is not None and \
-                    workflow_trigger.workflow_trigger_object_type_name == workflow_trigger_object_type_name and \
-                    workflow_trigger.workflow_trigger_event_type == workflow_trigger_event_type:
-                for workflow in workflow_trigger.workflows:
-                    logger.debug(f"Running workflow: {workflow.workflow_name} for workflow_trigger_object_type_name - {sender_object.id}")
-                    workflow.run_workflow(sender_object, workflow_trigger)
+        for (workflow_trigger, workflow) in WorkflowTrigger.matching_workflows(workflow_trigger_object_type_name,
+                                                                               workflow_trigger_event_type):
+            logger.debug(f"Running workflow: {workflow.workflow_name} for workflow_trigger_object_type_name - {sender_object.id}")
+            workflow.run_workflow(sender_object, workflow_trigger)
+
+
+class WorkflowDispatchIndex(BaseModel):
+    """
+    Lookup tables for running workflows, built once from the loaded triggers and never changed afterwards.
+    Finding the workflows of an event, or a trigger or workflow by id, is a dict lookup instead of a scan. Loading
+    triggers again builds a new index and replaces the old one as a whole, so a reader always sees one consistent
+    set of triggers.
+    """
+    model_config = ConfigDict(frozen=True, arbitrary_types_allowed=True)
+    # (object type name, event type) -> (trigger, workflow) pairs, in trigger order
+    workflows_by_event: Dict[Tuple[str, str], Tuple[Tuple[WorkflowTrigger, DataObject], ...]] = {}
+    triggers_by_id: Dict[str, WorkflowTrigger] = {}
+    workflows_by_id: Dict[str, DataObject] = {}
+
+    @classmethod
+    def build(cls, workflow_triggers: List[WorkflowTrigger]) -> "WorkflowDispatchIndex":
+        workflows_by_event: Dict[Tuple[str, str], List[Tuple[WorkflowTrigger, DataObject]]] = {}
+        triggers_by_id: Dict[str, WorkflowTrigger] = {}
+        workflows_by_id: Dict[str, DataObject] = {}
+        for workflow_trigger in workflow_triggers:
+            triggers_by_id[str(workflow_trigger.id)] = workflow_trigger
+            key = (workflow_trigger.workflow_trigger_object_type_name, workflow_trigger.workflow_trigger_event_type)
+            for workflow in workflow_trigger.workflows or []:
+                workflows_by_event.setdefault(key, []).append((workflow_trigger, workflow))
+                workflows_by_id[str(workflow.id)] = workflow
+        return WorkflowDispatchIndex(workflows_by_event={key: tuple(pairs) for (key, pairs) in
+                                                         workflows_by_event.items()},
+                                     triggers_by_id=triggers_by_id,
+                                     workflows_by_id=workflows_by_id)
+
+
+WorkflowTrigger.dispatch_index = WorkflowDispatchIndex()
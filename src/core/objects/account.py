@@ -1,6 +1,6 @@
 import logging
 import uuid
-from typing import List, Optional, ClassVar
+from typing import List, Optional
 
 from src.core.base.data_field import DataField
 from src.core.base.data_object import DataObject
@@ -17,7 +17,6 @@ class Account(DataObject):
     owner_id: ObjectReference
     account_name: str
     description: Optional[str] = None
-    last_account_number: ClassVar[int] = 0
 
     @classmethod
     def get_custom_fields(cls) -> List[DataField]:
@@ -32,9 +31,8 @@ class Account(DataObject):
         if existing_account:
             account_number = data["account_number"]
         else:
-            # Increment the account number before creating a new account
-            Account.last_account_number += 1
-            account_number = Account.account_number_from_number(Account.last_account_number)
+            # A new account gets its number when it is inserted, see AccountRecord.assign_account_number
+            account_number = data.get("account_number", "")
         try:
             super().__init__(id=data.get("id", uuid.uuid4()),
                              account_number=account_number,
@@ -46,9 +44,10 @@ class Account(DataObject):
             logger.debug(f"Creating account: {self}")
             logger.debug(f"Running account triggers: {self}")
             # Run triggers only when the account is brand new, not a copy of an existing account
-            # TODO: Run triggers ar database commit time
+            # With an event dispatcher, the triggers run in the background after the account is committed, without
+            # one they run once the account is inserted
             if not existing_account:
-                WorkflowTrigger.run_matching_triggers("Account", "CREATE", self)
+                WorkflowTrigger.dispatch_event("Account", "CREATE", self)
             logger.debug(f"Done running account triggers: {self}")
         except Exception as e:
             logger.error(f"Error creating account: {str(e)}")
@@ -1,6 +1,6 @@
 import logging
 import uuid
-from typing import List, Optional, ClassVar
+from typing import List, Optional
 
 from src.core.base.data_field import DataField
 from src.core.base.data_object import DataObject
@@ -18,7 +18,6 @@ class Case(DataObject):
     account_id: ObjectReference
     summary: str
     description: Optional[str] = None
-    last_case_number: ClassVar[int] = 0
 
     @classmethod
     def get_custom_fields(cls) -> List[DataField]:
@@ -33,9 +32,8 @@ class Case(DataObject):
         if existing_case:
             case_number = data["case_number"]
         else:
-            # Increment the case number before creating a new case
-            Case.last_case_number += 1
-            case_number = Case.case_number_from_number(Case.last_case_number)
+            # A new case gets its number when it is inserted, see CaseRecord.assign_case_number
+            case_number = data.get("case_number", "")
         try:
             super().__init__(id=data.get("id", uuid.uuid4()),
                              case_number=case_number,
@@ -48,9 +46,10 @@ class Case(DataObject):
             logger.debug(f"Creating case: {self}")
             logger.debug(f"Running case triggers: {self}")
             # Run triggers only when the case is brand new, not a copy of an existing case
-            # TODO: Run triggers ar database commit time
+            # With an event dispatcher, the triggers run in the background after the case is committed, without
+            # one they run once the case is inserted
             if not existing_case:
-                WorkflowTrigger.run_matching_triggers("Case", "CREATE", self)
+                WorkflowTrigger.dispatch_event("Case", "CREATE", self)
             logger.debug(f"Done running case triggers: {self}")
         except Exception as e:
             logger.error(f"Error creating case: {str(e)}")
@@ -32,8 +32,9 @@ class CaseComment(DataObject):
         if existing_case_comment:
             case_comment_number = data["case_comment_number"]
         else:
-            # Increment the case comment number before creating a new case number
-            case_comment_number = CaseComment.case_comment_number_from_number(1)
+            # A new case comment gets the next number of its case when it is inserted, see
+            # CaseCommentRecord.assign_case_comment_number
+            case_comment_number = data.get("case_comment_number", "")
         try:
             super().__init__(id=data.get("id", uuid.uuid4()),
                              case_comment_number=case_comment_number,
@@ -46,9 +47,10 @@ class CaseComment(DataObject):
             logger.debug(f"Creating case comment: {self}")
             logger.debug(f"Running case comment triggers: {self.id}")
             # Run triggers only when the case comment is brand new, not a copy of an existing case comment
-            # TODO: Run triggers ar database commit time
+            # With an event dispatcher, the triggers run in the background after the case comment is committed, without
+            # one they run once the case comment is inserted
             if not existing_case_comment:
-                WorkflowTrigger.run_matching_triggers("CaseComment", "CREATE", self)
+                WorkflowTrigger.dispatch_event("CaseComment", "CREATE", self)
             logger.debug(f"Done running case comment triggers: {self.id}")
         except Exception as e:
             logger.error(f"Error creating case comment: {str(e)}")
@@ -2,12 +2,15 @@ import logging
 import time
 import uuid
 from sqlite3 import Cursor, Connection
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, ClassVar
 
 from pydantic import BaseModel
 
+from src.core.eventbus.workflow_trigger import WorkflowTrigger
 from src.core.objects.account import Account
 from src.core.reference.object_reference import ObjectReference
+from src.db.record_codec import RecordCodec
+from src.db.sequence_allocator import SequenceAllocator
 
 logging.basicConfig()
 logger = logging.getLogger("AccountRecord")
@@ -18,12 +21,15 @@ class AccountRecord(BaseModel):
     id: str
     account_number: str
     owner_id: str
+    owner_object_id: Optional[str] = None
     account_name: str
     description: Optional[str] = None
     created_at: float = 0.0
     updated_at: float = 0.0
     commit_at: float = 0.0
     object_type_name: str
+    # Set by the database layer to take numbers from blocks reserved per process, see Database.init_number_sequences
+    number_allocator: ClassVar[Optional[SequenceAllocator]] = None
 
     @classmethod
     def table_name(cls) -> str:
@@ -35,6 +41,7 @@ class AccountRecord(BaseModel):
                 id TEXT PRIMARY KEY,
                 account_number TEXT UNIQUE NOT NULL,
                 owner_id TEXT NOT NULL,
+                owner_object_id TEXT,
                 account_name TEXT NOT NULL,                
                 description TEXT,
                 created_at FLOAT,
@@ -45,21 +52,52 @@ class AccountRecord(BaseModel):
         '''
 
     @classmethod
-    def table_fields(cls) -> str:
-        return f'id, account_number, owner_id, account_name, description, created_at, updated_at, commit_at, ' \
-               f'object_type_name'
+    def table_indexes(cls) -> [str]:
+        return [
+            f"CREATE INDEX IF NOT EXISTS idx_accounts_created_at_id ON {AccountRecord.table_name()} (created_at, id)",
+            f"CREATE INDEX IF NOT EXISTS idx_accounts_owner_object_id ON {AccountRecord.table_name()} (owner_object_id)"
+        ]
+
+    @classmethod
+    def number_sequence_name(cls) -> str:
+        return "account_number"
 
     @classmethod
     def get_last_account_number_query(cls) -> str:
         query = f"SELECT MAX(CAST(account_number AS INTEGER)) AS max_account_number FROM {AccountRecord.table_name()}"
         return query
 
+    @classmethod
+    def reserve_account_number(cls) -> str:
+        """
+        Takes the next account number from the block of this process, reserving a new block on a short transaction of
+        its own when needed. Called ahead of a write transaction, like a group commit, so the insert writes no
+        sequence. Empty without an allocator, the insert assigns the number then.
+        """
+        if AccountRecord.number_allocator is None:
+            return ""
+        return Account.account_number_from_number(AccountRecord.number_allocator.next_value())
+
+    def assign_account_number(self, conn: Connection, cursor: Cursor) -> bool:
+        """
+        Gives a new account its number as it is inserted, so accounts that are built but never stored use up no numbers.
+        """
+        if self.account_number:
+            return False
+        if AccountRecord.number_allocator is not None:
+            number = AccountRecord.number_allocator.next_value_for_insert(conn, cursor)
+        else:
+            number = SequenceAllocator.reserve(cursor, AccountRecord.number_sequence_name(), 1)
+        self.account_number = Account.account_number_from_number(number)
+        return True
+
     @classmethod
     def from_object(cls, obj: Account) -> "AccountRecord":
         return AccountRecord(
             id=str(obj.id),
             account_number=obj.account_number,
             owner_id=obj.owner_id.to_json_str(),
+            owner_object_id=str(obj.owner_id.object_id),
             account_name=obj.account_name,
             description=obj.description,
             created_at=obj.created_at,
@@ -70,17 +108,7 @@ class AccountRecord(BaseModel):
 
     @classmethod
     def from_db_row(cls, row: Dict) -> "AccountRecord":
-        return AccountRecord(
-            id=row["id"],
-            account_number=row["account_number"],
-            owner_id=row["owner_id"],
-            account_name=row["account_name"],
-            description=row.get("description", ""),
-            created_at=float(row["created_at"]),
-            updated_at=float(row["updated_at"]),
-            commit_at=float(row["commit_at"]),
-            object_type_name=row["object_type_name"]
-        )
+        return RecordCodec.for_record_class(AccountRecord).decode(row)
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -88,49 +116,34 @@ class AccountRecord(BaseModel):
         self.created_at = data.get("created_at", now)
         self.updated_at = data.get("updated_at", now)
         self.commit_at = data.get("commit_at", now)
+        # Records built from API or import data may only carry the JSON references
+        if self.owner_object_id is None:
+            self.owner_object_id = str(ObjectReference.from_json_string(self.owner_id).object_id)
         logger.debug(f"Creating account record: {self}")
 
     def insert_to_db(self, conn: Connection, cursor: Cursor) -> None:
+        new_record = self.assign_account_number(conn, cursor)
         now = time.time()
         self.commit_at = now
-        query = f"INSERT INTO {AccountRecord.table_name()} ({AccountRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.account_number, self.owner_id, self.account_name, self.description, self.created_at,
-             self.updated_at, self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(AccountRecord).insert(cursor, self)
         conn.commit()
+        if new_record:
+            WorkflowTrigger.run_after_insert(self.object_type_name, self.convert_to_object())
 
     def insert_or_replace_to_db(self, conn: Connection, cursor: Cursor):
+        new_record = self.assign_account_number(conn, cursor)
         now = time.time()
         self.commit_at = now
-        query = f"INSERT OR REPLACE INTO {AccountRecord.table_name()} ({AccountRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.account_number, self.owner_id, self.account_name, self.description, self.created_at,
-             self.updated_at, self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(AccountRecord).insert(cursor, self, replace=True)
         conn.commit()
-
-    def read_from_db_row(self, row: Dict[str, Any]) -> None:
-        self.id = str(row["id"])
-        self.account_number = str(row["account_number"])
-        self.owner_id = str(row["owner_id"])
-        self.account_name = str(row["account_name"])
-        self.description = str(row.get("description", ""))
-        self.created_at = float(row["created_at"])
-        self.updated_at = float(row["updated_at"])
-        self.commit_at = float(row["commit_at"])
-        self.object_type_name = row["object_type_name"]
+        if new_record:
+            WorkflowTrigger.run_after_insert(self.object_type_name, self.convert_to_object())
 
     def read_from_object(self, obj: Account) -> None:
         self.id = str(obj.id)
         self.account_number = obj.account_number
         self.owner_id = obj.owner_id.to_json_str()
+        self.owner_object_id = str(obj.owner_id.object_id)
         self.account_name = obj.account_name
         self.description = obj.description
         self.created_at = obj.created_at
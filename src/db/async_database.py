@@ -0,0 +1,136 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from sqlite3 import Connection, Cursor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+
+from src.core.access.access_type import AccessType
+from src.core.access.user import User
+from src.db.database import Database
+from src.db.group_commit_writer import GroupCommitWriter
+from src.db.page_cursor import PageCursor
+from src.db.search_cursor import SearchCursor
+
+logging.basicConfig()
+logger = logging.getLogger("AsyncDatabase")
+logger.setLevel(logging.DEBUG)
+
+T = TypeVar("T")
+
+
+class AsyncDatabase(BaseModel):
+    """
+    Awaitable facade over Database for async handlers.
+    Every call checks out a connection, runs the blocking sqlite3 work and hands the connection back, all on one
+    thread of a bounded pool, so the event loop keeps serving other requests meanwhile.
+    Writes from concurrent requests go through one GroupCommitWriter instead, which commits them in groups.
+    The database threads, the writer thread and anything else holding a connection of the same pool, like workflow
+    workers or streamed responses, share the connection pool of `db`. Only when its size covers all of them does a
+    running call get a connection without waiting, see `reserved_connections`.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    db: Database
+    # Connections of the pool left for the writer thread and other long holders, the remaining ones get a thread each
+    reserved_connections: int = 1
+    _executor: ThreadPoolExecutor = PrivateAttr()
+    _writer: GroupCommitWriter = PrivateAttr()
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        # The pool is shared by every Database of the same file and sized by the first one, not necessarily by `db`
+        if self.db.pool.max_size <= self.reserved_connections:
+            raise ValueError(f"Connection pool of {self.db.pool.max_size} leaves no connection for database threads "
+                             f"after {self.reserved_connections} reserved ones")
+        self._executor = ThreadPoolExecutor(max_workers=self.database_threads, thread_name_prefix="db")
+        self._writer = GroupCommitWriter(db=self.db)
+        logger.info(f'Async access to "{self.db.db_name}" with {self.database_threads} database threads and '
+                    f'{self.reserved_connections} reserved connections of {self.db.pool.max_size}')
+
+    @property
+    def database_threads(self) -> int:
+        return self.db.pool.max_size - self.reserved_connections
+
+    async def run_blocking(self, function: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Runs any blocking function on a database thread, with the context variables of the caller.
+        """
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, function, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def run(self, work: Callable[[Connection, Cursor], T]) -> T:
+        """
+        Runs work(conn, cursor) on a database thread with a pooled connection.
+        """
+        def run_with_connection() -> T:
+            [conn, cursor] = self.db.connect()
+            try:
+                return work(conn, cursor)
+            finally:
+                conn.close()
+
+        return await self.run_blocking(run_with_connection)
+
+    async def run_in_transaction(self, work: Callable[[Connection, Cursor], T]) -> T:
+        """
+        Runs work(conn, cursor) on a database thread inside Database.transaction(), see UnitOfWork.
+        """
+        def run_with_transaction() -> T:
+            with self.db.transaction() as [conn, cursor]:
+                return work(conn, cursor)
+
+        return await self.run_blocking(run_with_transaction)
+
+    async def write(self, work: Callable[[Connection, Cursor], T]) -> T:
+        """
+        Queues work(conn, cursor) for the single writer and returns its result once its group is committed.
+        The work runs in its own savepoint of the group's unit of work, an exception discards only its own writes.
+        """
+        return await asyncio.wrap_future(self._writer.submit(work))
+
+    async def read_objects(self, table_name: str, object_type_str: str, user: Optional[User],
+                           limit: Optional[int] = None, after: Optional[PageCursor] = None) -> List[Any]:
+        return await self.run(lambda conn, cursor: self.db.read_objects(conn, cursor, table_name, object_type_str,
+                                                                        user, limit, after))
+
+    async def read_object_by_id(self, table_name: str, object_type_str: str, object_id: uuid.UUID,
+                                user: Optional[User]) -> Any:
+        return await self.run(lambda conn, cursor: self.db.read_object_by_id(conn, cursor, table_name,
+                                                                             object_type_str, object_id, user))
+
+    async def read_trusted_values(self, table_name: str, object_type_str: str, user: Optional[User],
+                                  target_class: type, limit: Optional[int] = None,
+                                  after: Optional[PageCursor] = None) -> List[Dict[str, Any]]:
+        return await self.run(lambda conn, cursor: self.db.read_trusted_values(conn, cursor, table_name,
+                                                                               object_type_str, user, target_class,
+                                                                               limit, after))
+
+    async def read_trusted_value_by_id(self, table_name: str, object_type_str: str, object_id: uuid.UUID,
+                                       user: Optional[User], target_class: type) -> Optional[Dict[str, Any]]:
+        return await self.run(lambda conn, cursor: self.db.read_trusted_value_by_id(conn, cursor, table_name,
+                                                                                    object_type_str, object_id, user,
+                                                                                    target_class))
+
+    async def check_access_many(self, user: Optional[User], object_ids: Sequence[Tuple[str, Any]],
+                                access_type: Optional[AccessType] = None) -> List[bool]:
+        return await self.run(lambda conn, cursor: self.db.check_access_many(conn, cursor, user, object_ids,
+                                                                             access_type))
+
+    async def read_user_by_username(self, username: str) -> Optional[User]:
+        return await self.run(lambda conn, cursor: self.db.read_user_by_username(conn, cursor, username))
+
+    async def search(self, text: str, user: Optional[User], limit: int,
+                     after: Optional[SearchCursor] = None) -> List[Dict[str, Any]]:
+        return await self.run(lambda conn, cursor: self.db.search(conn, cursor, text, user, limit, after))
+
+    async def init_workflows_and_triggers(self) -> None:
+        await self.run(self.db.init_workflows_and_triggers)
+
+    def shutdown(self) -> None:
+        self._writer.stop()
+        self._executor.shutdown(wait=True)
@@ -1,15 +1,16 @@
 import json
 import logging
-import sqlite3
 import time
 import uuid
 from sqlite3 import Cursor, Connection
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, List
 
 from pydantic import BaseModel
 
+from src.core.eventbus.workflow_trigger import WorkflowTrigger
 from src.core.objects.case_comment import CaseComment
 from src.core.reference.object_reference import ObjectReference
+from src.db.record_codec import RecordCodec
 
 logging.basicConfig()
 logger = logging.getLogger("CaseCommentRecord")
@@ -21,6 +22,8 @@ class CaseCommentRecord(BaseModel):
     case_comment_number: str
     owner_id: str
     case_id: str
+    owner_object_id: Optional[str] = None
+    case_object_id: Optional[str] = None
     summary: str
     description: Optional[str] = None
     created_at: float = 0.0
@@ -39,6 +42,8 @@ class CaseCommentRecord(BaseModel):
                 case_comment_number TEXT NOT NULL,
                 owner_id TEXT NOT NULL,
                 case_id TEXT NOT NULL,
+                owner_object_id TEXT,
+                case_object_id TEXT,
                 summary TEXT NOT NULL,                
                 description TEXT,
                 created_at FLOAT,
@@ -49,14 +54,53 @@ class CaseCommentRecord(BaseModel):
         '''
 
     @classmethod
-    def table_fields(cls) -> str:
-        return f'id, case_comment_number, owner_id, case_id, summary, description, created_at, updated_at, ' \
-               f'commit_at, object_type_name'
+    def table_indexes(cls) -> [str]:
+        return [
+            f"CREATE INDEX IF NOT EXISTS idx_case_comments_created_at_id ON {CaseCommentRecord.table_name()} "
+            f"(created_at, id)",
+            f"CREATE INDEX IF NOT EXISTS idx_case_comments_owner_object_id ON {CaseCommentRecord.table_name()} "
+            f"(owner_object_id)",
+            f"CREATE INDEX IF NOT EXISTS idx_case_comments_case_object_id ON {CaseCommentRecord.table_name()} "
+            f"(case_object_id)"
+        ]
 
     @classmethod
-    def get_last_case_comment_number_for_case_query(cls, case_id: str) -> str:
-        query = f"SELECT MAX(CAST(case_comment_number AS INTEGER)) AS max_case_comment_number FROM " \
-                f"{CaseCommentRecord.table_name()} WHERE case_id='{case_id}'"
+    def counter_table_name(cls) -> str:
+        return "CaseCommentCounters"
+
+    @classmethod
+    def counter_table_definition(cls) -> str:
+        # Last comment number handed out per case, so numbering a new comment never scans the comments
+        return f'''{CaseCommentRecord.counter_table_name()} (
+                case_object_id TEXT PRIMARY KEY,
+                last_case_comment_number INTEGER NOT NULL
+            )
+        '''
+
+    @classmethod
+    def get_next_case_comment_number_query(cls) -> str:
+        query = f"INSERT INTO {CaseCommentRecord.counter_table_name()} (case_object_id, last_case_comment_number) " \
+                f"VALUES (?, 1) ON CONFLICT(case_object_id) " \
+                f"DO UPDATE SET last_case_comment_number = last_case_comment_number + 1 " \
+                f"RETURNING last_case_comment_number"
+        return query
+
+    @classmethod
+    def get_advance_case_comment_counter_query(cls) -> str:
+        query = f"INSERT INTO {CaseCommentRecord.counter_table_name()} (case_object_id, last_case_comment_number) " \
+                f"VALUES (?, ?) ON CONFLICT(case_object_id) " \
+                f"DO UPDATE SET last_case_comment_number = " \
+                f"MAX(last_case_comment_number, excluded.last_case_comment_number)"
+        return query
+
+    @classmethod
+    def get_backfill_case_comment_counters_query(cls) -> str:
+        query = f"INSERT INTO {CaseCommentRecord.counter_table_name()} (case_object_id, last_case_comment_number) " \
+                f"SELECT case_object_id, MAX(CAST(case_comment_number AS INTEGER)) " \
+                f"FROM {CaseCommentRecord.table_name()} WHERE case_object_id IS NOT NULL GROUP BY case_object_id " \
+                f"ON CONFLICT(case_object_id) " \
+                f"DO UPDATE SET last_case_comment_number = " \
+                f"MAX(last_case_comment_number, excluded.last_case_comment_number)"
         return query
 
     @classmethod
@@ -66,6 +110,8 @@ class CaseCommentRecord(BaseModel):
             case_comment_number=obj.case_comment_number,
             owner_id=obj.owner_id.to_json_str(),
             case_id=obj.case_id.to_json_str(),
+            owner_object_id=str(obj.owner_id.object_id),
+            case_object_id=str(obj.case_id.object_id),
             summary=obj.summary,
             description=obj.description,
             created_at=obj.created_at,
@@ -76,18 +122,7 @@ class CaseCommentRecord(BaseModel):
 
     @classmethod
     def from_db_row(cls, row: Dict) -> "CaseCommentRecord":
-        return CaseCommentRecord(
-            id=row["id"],
-            case_comment_number=row["case_comment_number"],
-            owner_id=row["owner_id"],
-            case_id=row["case_id"],
-            summary=row["summary"],
-            description=row.get("description", ""),
-            created_at=float(row["created_at"]),
-            updated_at=float(row["updated_at"]),
-            commit_at=float(row["commit_at"]),
-            object_type_name=row["object_type_name"]
-        )
+        return RecordCodec.for_record_class(CaseCommentRecord).decode(row)
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -95,69 +130,66 @@ class CaseCommentRecord(BaseModel):
         self.created_at = data.get("created_at", now)
         self.updated_at = data.get("updated_at", now)
         self.commit_at = data.get("commit_at", now)
+        # Records built from API or import data may only carry the JSON references
+        if self.owner_object_id is None:
+            self.owner_object_id = str(ObjectReference.from_json_string(self.owner_id).object_id)
+        if self.case_object_id is None:
+            self.case_object_id = str(ObjectReference.from_json_string(self.case_id).object_id)
         logger.debug(f"Creating case comment record: {self}")
 
     def insert_to_db(self, conn: Connection, cursor: Cursor) -> None:
-        # case_id = json.loads(self.case_id)['object_id']
-        max_case_comment_number: int = self.read_max_case_comment_number_for_case(conn, cursor, self.case_id)
-        self.case_comment_number = CaseComment.case_comment_number_from_number(max_case_comment_number + 1)
+        # A new comment claims the next number of the case in the same transaction as the insert, a comment that
+        # already has a number moves the counter past it
+        if self.case_comment_number:
+            CaseCommentRecord.advance_case_comment_counters(cursor, [self])
+        new_record = self.assign_case_comment_number(conn, cursor)
 
         now = time.time()
         self.commit_at = now
-        query = f"INSERT INTO {CaseCommentRecord.table_name()} ({CaseCommentRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.case_comment_number, self.owner_id, self.case_id, self.summary, self.description,
-             self.created_at, self.updated_at, self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(CaseCommentRecord).insert(cursor, self)
         conn.commit()
+        if new_record:
+            WorkflowTrigger.run_after_insert(self.object_type_name, self.convert_to_object())
 
-    def read_max_case_comment_number_for_case(self, conn: Connection, cursor: Cursor, case_id: str) -> int:
-        max_case_comment_number: int = 0
-        if not conn:
-            logger.error("Database connection not established. Cannot list table.")
-            return max_case_comment_number
-        try:
-            query = CaseCommentRecord.get_last_case_comment_number_for_case_query(case_id)
-            logger.debug(f'Running SQL query "{query}"')
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            logger.debug(f'Received rows: "{rows}"')
-            if len(rows) > 0:
-                row = dict(rows[0])
-                max_case_comment_number_value = row.get("max_case_comment_number", max_case_comment_number)
-                if max_case_comment_number_value is None:
-                    max_case_comment_number_value = max_case_comment_number
-                logger.info(
-                    f"Last case comment number in database is {max_case_comment_number_value} for case {case_id}.")
-                return max_case_comment_number_value
-            return max_case_comment_number
-        except sqlite3.OperationalError as e:
-            logger.error(f"Error: Table '{CaseCommentRecord.table_name()}' does not exist or SQL error. {e}")
-            return max_case_comment_number
-        except sqlite3.Error as e:
-            logger.error(f"Error listing table '{CaseCommentRecord.table_name()}': {e}")
-            return max_case_comment_number
-
-    def read_from_db_row(self, row: Dict[str, Any]) -> None:
-        self.id = str(row["id"])
-        self.case_comment_number = str(row["case_comment_number"])
-        self.owner_id = str(row["owner_id"])
-        self.case_id = str(row["case_id"])
-        self.summary = str(row["summary"])
-        self.description = str(row.get("description", ""))
-        self.created_at = float(row["created_at"])
-        self.updated_at = float(row["updated_at"])
-        self.commit_at = float(row["commit_at"])
-        self.object_type_name = row["object_type_name"]
+    def assign_case_comment_number(self, conn: Connection, cursor: Cursor) -> bool:
+        if self.case_comment_number:
+            return False
+        self.case_comment_number = CaseComment.case_comment_number_from_number(
+            CaseCommentRecord.next_case_comment_number_for_case(cursor, self.case_object_id))
+        return True
+
+    @classmethod
+    def next_case_comment_number_for_case(cls, cursor: Cursor, case_object_id: str) -> int:
+        query = CaseCommentRecord.get_next_case_comment_number_query()
+        logger.debug(f'Running SQL query "{query}" with case id "{case_object_id}"')
+        cursor.execute(query, (case_object_id,))
+        next_case_comment_number: int = int(cursor.fetchone()[0])
+        logger.info(f"Next case comment number is {next_case_comment_number} for case {case_object_id}.")
+        return next_case_comment_number
+
+    @classmethod
+    def advance_case_comment_counters(cls, cursor: Cursor, records: List["CaseCommentRecord"]) -> None:
+        """
+        Moves the per-case counters past comments that arrive with numbers already assigned, e.g. from a bulk import.
+        Comments without a number are skipped, they get theirs from the counter.
+        """
+        max_number_by_case: Dict[str, int] = {}
+        for record in records:
+            if not record.case_comment_number:
+                continue
+            number = int(record.case_comment_number)
+            max_number_by_case[record.case_object_id] = max(max_number_by_case.get(record.case_object_id, 0), number)
+        if max_number_by_case:
+            cursor.executemany(CaseCommentRecord.get_advance_case_comment_counter_query(),
+                               list(max_number_by_case.items()))
 
     def read_from_object(self, obj: CaseComment) -> None:
         self.id = str(obj.id)
         self.case_comment_number = obj.case_comment_number
         self.owner_id = obj.owner_id.to_json_str()
         self.case_id = obj.case_id.to_json_str()
+        self.owner_object_id = str(obj.owner_id.object_id)
+        self.case_object_id = str(obj.case_id.object_id)
         self.summary = obj.summary
         self.description = obj.description
         self.created_at = obj.created_at
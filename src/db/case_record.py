@@ -2,12 +2,15 @@ import logging
 import time
 import uuid
 from sqlite3 import Cursor, Connection
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, ClassVar
 
 from pydantic import BaseModel
 
+from src.core.eventbus.workflow_trigger import WorkflowTrigger
 from src.core.objects.case import Case
 from src.core.reference.object_reference import ObjectReference
+from src.db.record_codec import RecordCodec
+from src.db.sequence_allocator import SequenceAllocator
 
 logging.basicConfig()
 logger = logging.getLogger("CaseRecord")
@@ -19,12 +22,16 @@ class CaseRecord(BaseModel):
     case_number: str
     owner_id: str
     account_id: str
+    owner_object_id: Optional[str] = None
+    account_object_id: Optional[str] = None
     summary: str
     description: Optional[str] = None
     created_at: float = 0.0
     updated_at: float = 0.0
     commit_at: float = 0.0
     object_type_name: str
+    # Set by the database layer to take numbers from blocks reserved per process, see Database.init_number_sequences
+    number_allocator: ClassVar[Optional[SequenceAllocator]] = None
 
     @classmethod
     def table_name(cls) -> str:
@@ -37,6 +44,8 @@ class CaseRecord(BaseModel):
                 case_number TEXT UNIQUE NOT NULL,
                 owner_id TEXT NOT NULL,
                 account_id TEXT NOT NULL,
+                owner_object_id TEXT,
+                account_object_id TEXT,
                 summary TEXT NOT NULL,                
                 description TEXT,
                 created_at FLOAT,
@@ -47,15 +56,46 @@ class CaseRecord(BaseModel):
         '''
 
     @classmethod
-    def table_fields(cls) -> str:
-        return f'id, case_number, owner_id, account_id, summary, description, created_at, updated_at, commit_at, ' \
-               f'object_type_name'
+    def table_indexes(cls) -> [str]:
+        return [
+            f"CREATE INDEX IF NOT EXISTS idx_cases_created_at_id ON {CaseRecord.table_name()} (created_at, id)",
+            f"CREATE INDEX IF NOT EXISTS idx_cases_owner_object_id ON {CaseRecord.table_name()} (owner_object_id)",
+            f"CREATE INDEX IF NOT EXISTS idx_cases_account_object_id ON {CaseRecord.table_name()} (account_object_id)"
+        ]
+
+    @classmethod
+    def number_sequence_name(cls) -> str:
+        return "case_number"
 
     @classmethod
     def get_last_case_number_query(cls) -> str:
         query = f"SELECT MAX(CAST(case_number AS INTEGER)) AS max_case_number FROM {CaseRecord.table_name()}"
         return query
 
+    @classmethod
+    def reserve_case_number(cls) -> str:
+        """
+        Takes the next case number from the block of this process, reserving a new block on a short transaction of
+        its own when needed. Called ahead of a write transaction, like a group commit, so the insert writes no
+        sequence. Empty without an allocator, the insert assigns the number then.
+        """
+        if CaseRecord.number_allocator is None:
+            return ""
+        return Case.case_number_from_number(CaseRecord.number_allocator.next_value())
+
+    def assign_case_number(self, conn: Connection, cursor: Cursor) -> bool:
+        """
+        Gives a new case its number as it is inserted, so cases that are built but never stored use up no numbers.
+        """
+        if self.case_number:
+            return False
+        if CaseRecord.number_allocator is not None:
+            number = CaseRecord.number_allocator.next_value_for_insert(conn, cursor)
+        else:
+            number = SequenceAllocator.reserve(cursor, CaseRecord.number_sequence_name(), 1)
+        self.case_number = Case.case_number_from_number(number)
+        return True
+
     @classmethod
     def from_object(cls, obj: Case) -> "CaseRecord":
         return CaseRecord(
@@ -63,6 +103,8 @@ class CaseRecord(BaseModel):
             case_number=obj.case_number,
             owner_id=obj.owner_id.to_json_str(),
             account_id=obj.account_id.to_json_str(),
+            owner_object_id=str(obj.owner_id.object_id),
+            account_object_id=str(obj.account_id.object_id),
             summary=obj.summary,
             description=obj.description,
             created_at=obj.created_at,
@@ -73,18 +115,7 @@ class CaseRecord(BaseModel):
 
     @classmethod
     def from_db_row(cls, row: Dict) -> "CaseRecord":
-        return CaseRecord(
-            id=row["id"],
-            case_number=row["case_number"],
-            owner_id=row["owner_id"],
-            account_id=row["account_id"],
-            summary=row["summary"],
-            description=row.get("description", ""),
-            created_at=float(row["created_at"]),
-            updated_at=float(row["updated_at"]),
-            commit_at=float(row["commit_at"]),
-            object_type_name=row["object_type_name"]
-        )
+        return RecordCodec.for_record_class(CaseRecord).decode(row)
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -92,53 +123,38 @@ class CaseRecord(BaseModel):
         self.created_at = data.get("created_at", now)
         self.updated_at = data.get("updated_at", now)
         self.commit_at = data.get("commit_at", now)
+        # Records built from API or import data may only carry the JSON references
+        if self.owner_object_id is None:
+            self.owner_object_id = str(ObjectReference.from_json_string(self.owner_id).object_id)
+        if self.account_object_id is None:
+            self.account_object_id = str(ObjectReference.from_json_string(self.account_id).object_id)
         logger.debug(f"Creating case record: {self}")
 
     def insert_to_db(self, conn: Connection, cursor: Cursor) -> None:
+        new_record = self.assign_case_number(conn, cursor)
         now = time.time()
         self.commit_at = now
-        query = f"INSERT INTO {CaseRecord.table_name()} ({CaseRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.case_number, self.owner_id, self.account_id, self.summary, self.description, self.created_at,
-             self.updated_at, self.commit_at, self.object_type_name)
-        )
-        Case.last_case_number += 1
+        RecordCodec.for_record_class(CaseRecord).insert(cursor, self)
         conn.commit()
+        if new_record:
+            WorkflowTrigger.run_after_insert(self.object_type_name, self.convert_to_object())
 
     def insert_or_replace_to_db(self, conn: Connection, cursor: Cursor) -> None:
+        new_record = self.assign_case_number(conn, cursor)
         now = time.time()
         self.commit_at = now
-        query = f"INSERT OR REPLACE INTO {CaseRecord.table_name()} ({CaseRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.case_number, self.owner_id, self.account_id, self.summary, self.description, self.created_at,
-             self.updated_at, self.commit_at, self.object_type_name)
-        )
-        Case.last_case_number += 1
+        RecordCodec.for_record_class(CaseRecord).insert(cursor, self, replace=True)
         conn.commit()
-
-    def read_from_db_row(self, row: Dict[str, Any]) -> None:
-        self.id = str(row["id"])
-        self.case_number = str(row["case_number"])
-        self.owner_id = str(row["owner_id"])
-        self.account_id = str(row["account_id"])
-        self.summary = str(row["summary"])
-        self.description = str(row.get("description", ""))
-        self.created_at = float(row["created_at"])
-        self.updated_at = float(row["updated_at"])
-        self.commit_at = float(row["commit_at"])
-        self.object_type_name = row["object_type_name"]
+        if new_record:
+            WorkflowTrigger.run_after_insert(self.object_type_name, self.convert_to_object())
 
     def read_from_object(self, obj: Case) -> None:
         self.id = str(obj.id)
         self.case_number = obj.case_number
         self.owner_id = obj.owner_id.to_json_str()
         self.account_id = obj.account_id.to_json_str()
+        self.owner_object_id = str(obj.owner_id.object_id)
+        self.account_object_id = str(obj.account_id.object_id)
         self.summary = obj.summary
         self.description = obj.description
         self.created_at = obj.created_at
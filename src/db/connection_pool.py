@@ -0,0 +1,191 @@
+import logging
+import sqlite3
+import threading
+from sqlite3 import Connection, Cursor
+from typing import ClassVar, Dict, List, Optional
+
+from pydantic import BaseModel, PrivateAttr
+
+from src.db.query_templates import QueryTemplates
+from src.db.tuning_profile import TuningProfile
+
+logging.basicConfig()
+logger = logging.getLogger("ConnectionPool")
+logger.setLevel(logging.DEBUG)
+
+
+class PooledConnection:
+    """
+    Thin proxy around a pooled sqlite3 connection.
+    Behaves like the wrapped connection, except that close() hands the connection back to its pool.
+    """
+
+    def __init__(self, pool: "ConnectionPool", conn: Connection, generation: int):
+        self._pool = pool
+        self._conn = conn
+        # Pool generation at checkout, see ConnectionPool.close_all
+        self._generation = generation
+        self._released = False
+
+    @property
+    def raw_connection(self) -> Connection:
+        return self._conn
+
+    @property
+    def released(self) -> bool:
+        return self._released
+
+    def __getattr__(self, name: str):
+        if self._released:
+            raise sqlite3.ProgrammingError("Cannot operate on a connection that was returned to the pool.")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name: str, value) -> None:
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def cursor(self, *args, **kwargs) -> Cursor:
+        if self._released:
+            raise sqlite3.ProgrammingError("Cannot operate on a connection that was returned to the pool.")
+        return self._conn.cursor(*args, **kwargs)
+
+    def close(self) -> None:
+        # Closing twice is harmless, the connection is only handed back once
+        if not self._released:
+            self._released = True
+            self._pool.release(self._conn, self._generation)
+
+
+class ConnectionPool(BaseModel):
+    """
+    Bounded pool of long-lived sqlite3 connections to a single database file.
+    Every checkout is exclusive to the caller until it is closed, so a connection can be used from any thread or
+    task, but never by two of them at the same time.
+    """
+    db_name: str
+    max_size: int = 8
+    timeout: float = 10.0
+    tuning_profile: Optional[TuningProfile] = None
+    # Prepared statements kept per connection, enough for every QueryTemplates and record class query
+    cached_statements: int = 256
+    # Set once the Database schema was created and migrated through this pool
+    schema_initialized: bool = False
+    _idle: List[Connection] = PrivateAttr(default_factory=list)
+    _created: int = PrivateAttr(default=0)
+    # Incremented by close_all, connections checked out in an earlier generation are closed when released
+    _generation: int = PrivateAttr(default=0)
+    _condition: threading.Condition = PrivateAttr(default_factory=threading.Condition)
+    all_pools: ClassVar[Dict[str, "ConnectionPool"]] = {}
+    all_pools_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db_name: str, max_size: int = 8,
+                     tuning_profile: Optional[TuningProfile] = None) -> "ConnectionPool":
+        """
+        Returns the pool shared by every Database instance pointing to the same file.
+        The first caller decides the pool size and tuning profile.
+        """
+        with ConnectionPool.all_pools_lock:
+            pool = ConnectionPool.all_pools.get(db_name)
+            if pool is None:
+                pool = ConnectionPool(db_name=db_name, max_size=max_size, tuning_profile=tuning_profile)
+                ConnectionPool.all_pools[db_name] = pool
+                logger.info(f'Created connection pool for "{db_name}" with max size {max_size} and tuning profile '
+                            f'"{tuning_profile.name if tuning_profile is not None else "default"}"')
+            elif pool.max_size != max_size:
+                logger.warning(f'Connection pool for "{db_name}" already exists with max size {pool.max_size}, '
+                               f'not {max_size}')
+            return pool
+
+    def new_connection(self) -> Connection:
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row  # Allows accessing columns by name
+        if self.tuning_profile is not None:
+            self.tuning_profile.apply(conn)
+        logger.debug(f"Opened new pooled connection to database: {self.db_name}")
+        return conn
+
+    @classmethod
+    def is_healthy(cls, conn: Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Discarding unhealthy pooled connection: {e}")
+            return False
+
+    def discard(self, conn: Connection) -> None:
+        QueryTemplates.forget_connection(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._condition:
+            self._created -= 1
+            self._condition.notify()
+
+    def acquire(self) -> PooledConnection:
+        """
+        Checks out a connection, reusing an idle one if possible.
+        Blocks for up to `timeout` seconds when `max_size` connections are already checked out.
+        """
+        while True:
+            conn = None
+            with self._condition:
+                if not self._idle and self._created >= self.max_size:
+                    if not self._condition.wait_for(lambda: self._idle or self._created < self.max_size,
+                                                    timeout=self.timeout):
+                        raise sqlite3.OperationalError(
+                            f'Connection pool for "{self.db_name}" exhausted ({self.max_size} connections in use)')
+                generation = self._generation
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    self._created += 1
+            if conn is None:
+                try:
+                    conn = self.new_connection()
+                except sqlite3.Error:
+                    with self._condition:
+                        self._created -= 1
+                        self._condition.notify()
+                    raise
+                return PooledConnection(self, conn, generation)
+            if ConnectionPool.is_healthy(conn):
+                return PooledConnection(self, conn, generation)
+            self.discard(conn)
+
+    def release(self, conn: Connection, generation: int) -> None:
+        # Never hand an open transaction over to the next caller, same as closing an uncommitted connection
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Error rolling back pooled connection: {e}")
+            self.discard(conn)
+            return
+        with self._condition:
+            if generation == self._generation:
+                self._idle.append(conn)
+                self._condition.notify()
+                return
+        # Checked out before close_all, e.g. to a database file that was deleted since
+        self.discard(conn)
+
+    def close_all(self) -> None:
+        """
+        Closes every idle connection. Connections checked out at this time are closed when they are released, instead
+        of going back to the pool. The pool stays usable, later checkouts open new connections.
+        """
+        with self._condition:
+            self._generation += 1
+            idle = self._idle
+            self._idle = []
+            self._created -= len(idle)
+            self._condition.notify_all()
+        for conn in idle:
+            QueryTemplates.forget_connection(conn)
+            conn.close()
+        logger.debug(f'Closed {len(idle)} idle pooled connections to database: "{self.db_name}"')
@@ -1,25 +1,44 @@
 import logging
 import sqlite3
+import time
 import uuid
+from contextlib import contextmanager
 from pathlib import Path
 from sqlite3 import Connection, Cursor
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Iterator, Dict, Sequence, Tuple, ClassVar
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 from src.core.access.access_rule import AccessRule
+from src.core.access.access_type import AccessType
 from src.core.access.profile import Profile
 from src.core.access.user import User
 from src.core.base.data_object import DataObject
 from src.core.eventbus.workflow import Workflow
 from src.core.eventbus.workflow_step import WorkflowStep
-from src.core.eventbus.workflow_trigger import WorkflowTrigger
+from src.core.eventbus.workflow_trigger import WorkflowDispatchIndex, WorkflowTrigger
 from src.db.account_record import AccountRecord
 from src.db.case_comment_record import CaseCommentRecord
 from src.db.case_record import CaseRecord
+from src.db.connection_pool import ConnectionPool
+from src.db.field_projection import FieldProjection
+from src.db.full_text_search import FullTextSearch
+from src.db.page_cursor import PageCursor
+from src.db.permission_cache import PermissionCache
 from src.db.profile_record import ProfileRecord
+from src.db.query_templates import QueryTemplates
+from src.db.record_registry import RecordRegistry
+from src.db.row_filter import RowFilter
+from src.db.schema_migrations import SchemaMigrations
+from src.db.search_cursor import SearchCursor
+from src.db.sequence_allocator import SequenceAllocator
+from src.db.trusted_row_decoder import TrustedRowDecoder
+from src.db.tuning_profile import TuningProfile
+from src.db.unit_of_work import UnitOfWork
+from src.db.user_cache import UserCache
 from src.db.user_record import UserRecord
 from src.db.workflow_record import WorkflowRecord
+from src.db.workflow_run_queue import WorkflowRunQueue
 from src.db.workflow_step_record import WorkflowStepRecord
 from src.db.workflow_trigger_record import WorkflowTriggerRecord
 
@@ -30,18 +49,39 @@ logger.setLevel(logging.DEBUG)
 
 class Database(BaseModel):
     db_name: str
+    pool_size: int = 8
+    # One of TuningProfile.all_profile_names, applied to every new connection
+    tuning_profile_name: str = "balanced"
+    # Ids per query of check_access_many
+    check_access_many_batch_size: ClassVar[int] = 256
+    _pool: ConnectionPool = PrivateAttr()
 
     def __init__(self, **data):
         super().__init__(**data)
         logger.info(f"Initializing database at {self.db_name}")
-        [conn, cursor] = self.connect()
-        self.init_db_schema(conn, cursor)
-        conn.close()
+        # Connections are pooled per database file and shared by all Database instances pointing to it
+        self._pool = ConnectionPool.for_database(self.db_name, self.pool_size,
+                                                 TuningProfile.from_name(self.tuning_profile_name))
+        # Schema creation and migrations run once per database file and process
+        if not self._pool.schema_initialized:
+            [conn, cursor] = self.connect()
+            self.init_db_schema(conn, cursor)
+
+    @property
+    def pool(self) -> ConnectionPool:
+        return self._pool
 
     def connect(self) -> [Connection, Cursor]:
+        """
+        Checks out a connection from the pool, together with a new cursor.
+        Closing the returned connection hands it back to the pool.
+        Inside a transaction() block, returns the connection of the active unit of work instead.
+        """
+        unit_of_work = UnitOfWork.current(self.db_name)
+        if unit_of_work is not None:
+            return [unit_of_work.connection, unit_of_work.connection.cursor()]
         try:
-            conn = sqlite3.connect(self.db_name)
-            conn.row_factory = sqlite3.Row  # Allows accessing columns by name
+            conn = self._pool.acquire()
             cursor = conn.cursor()
             logger.debug(f"Connected to database: {self.db_name}")
         except sqlite3.Error as e:
@@ -49,8 +89,62 @@ class Database(BaseModel):
             raise
         return [conn, cursor]
 
+    @contextmanager
+    def transaction(self) -> Iterator[List]:
+        """
+        Unit of work scope: yields [conn, cursor] and commits everything written inside the block once at the end,
+        or rolls it all back on an exception.
+        Every connect() made inside the block, including by other Database instances for the same file, joins the same
+        transaction. Nested transaction() blocks join the outer one. Keep the block short, it holds the write lock
+        from its first write until the end: slow work like triggered workflows goes to after_commit() hooks or to
+        WorkflowExecutor.
+        """
+        unit_of_work = UnitOfWork.current(self.db_name)
+        if unit_of_work is not None:
+            yield [unit_of_work.connection, unit_of_work.connection.cursor()]
+            return
+        [pooled_conn, _] = self.connect()
+        unit_of_work = UnitOfWork(self.db_name, pooled_conn)
+        token = UnitOfWork.current_unit_of_work.set(unit_of_work)
+        try:
+            yield [unit_of_work.connection, unit_of_work.connection.cursor()]
+            unit_of_work.commit()
+        except BaseException:
+            unit_of_work.rollback()
+            raise
+        finally:
+            UnitOfWork.current_unit_of_work.reset(token)
+            pooled_conn.close()
+
+    def report_settings(self, conn: Connection, cursor: Cursor) -> dict:
+        """
+        Logs and returns the tuning profile and pragma values in effect on the given connection.
+        """
+        tuning_profile = self._pool.tuning_profile
+        settings = TuningProfile.read_active_settings(conn)
+        settings["cached_statements"] = self._pool.cached_statements
+        logger.info(f'Database "{self.db_name}" tuning profile '
+                    f'"{tuning_profile.name if tuning_profile is not None else "default"}", '
+                    f'pool size {self._pool.max_size}, active settings: {settings}')
+        return settings
+
+    def report_statement_cache(self) -> Dict[str, Any]:
+        """
+        Logs and returns an estimate of how often template queries were served from the per-connection statement
+        cache, see QueryTemplates.statement_cache_stats.
+        """
+        stats = QueryTemplates.statement_cache_stats()
+        logger.info(f'Database "{self.db_name}" statement cache (estimated): {stats}')
+        return stats
+
     def delete_if_exists(self) -> None:
         file_path = Path(self.db_name)
+        # Idle pooled connections would keep the deleted file alive
+        self._pool.close_all()
+        self._pool.schema_initialized = False
+        SequenceAllocator.reset_all(self.db_name)
+        PermissionCache.reset_all(self.db_name)
+        UserCache.reset_all(self.db_name)
         if file_path.exists():
             logger.debug(f'Deleting database: "{self.db_name}"')
             file_path.unlink()
@@ -59,16 +153,26 @@ class Database(BaseModel):
 
     def init_db_schema(self, conn: Connection, cursor: Cursor) -> None:
         # Create tables
-        self.create_table(conn, cursor, AccountRecord.table_definition())
-        self.create_table(conn, cursor, CaseRecord.table_definition())
-        self.create_table(conn, cursor, CaseCommentRecord.table_definition())
-        self.create_table(conn, cursor, UserRecord.table_definition())
-        self.create_table(conn, cursor, ProfileRecord.table_definition())
-        self.create_table(conn, cursor, WorkflowRecord.table_definition())
-        self.create_table(conn, cursor, WorkflowStepRecord.table_definition())
-        self.create_table(conn, cursor, WorkflowTriggerRecord.table_definition())
+        for record_type in RecordRegistry.record_types():
+            self.create_table(conn, cursor, record_type.table_definition())
+        self.create_table(conn, cursor, SequenceAllocator.table_definition())
+        self.create_table(conn, cursor, CaseCommentRecord.counter_table_definition())
+        self.create_table(conn, cursor, PermissionCache.table_definition())
+        self.create_table(conn, cursor, WorkflowRunQueue.table_definition())
+        PermissionCache.create_version_triggers(cursor)
+        FullTextSearch.create_search_indexes(cursor)
+        conn.commit()
+
+        # Bring tables created by older versions up to date before indexing new columns
+        SchemaMigrations.migrate(conn, cursor)
+
+        # Create indexes
+        for record_type in RecordRegistry.record_types():
+            self.create_indexes(conn, cursor, record_type.table_indexes())
+        self.create_indexes(conn, cursor, WorkflowRunQueue.table_indexes())
 
         conn.commit()
+        self._pool.schema_initialized = True
         conn.close()
 
     def create_table(self, conn: Connection, cursor: Cursor, table_name):
@@ -76,9 +180,14 @@ class Database(BaseModel):
             CREATE TABLE IF NOT EXISTS {table_name}
         ''')
 
-    def get_table_row(self, conn: Connection, cursor: Cursor, table_name: str, id: uuid.UUID) -> [dict]:
+    def create_indexes(self, conn: Connection, cursor: Cursor, index_definitions: List[str]):
+        for index_definition in index_definitions:
+            cursor.execute(index_definition)
+
+    def get_table_row(self, conn: Connection, cursor: Cursor, table_name: str, id: uuid.UUID,
+                      row_filter: Optional[RowFilter] = None) -> [dict]:
         """
-        Reads one record from the specified table, based on the id field.
+        Reads one record from the specified table, based on the id field, if the row filter selects it.
         Returns a list of dictionaries, where each dictionary represents a row.
         """
         if not conn:
@@ -86,9 +195,11 @@ class Database(BaseModel):
             return []
 
         try:
-            query = f"SELECT * FROM {table_name} WHERE id='{str(id)}'"
-            logger.debug(f'Running SQL query "{query}"')
-            cursor.execute(query)
+            params: List[Any] = [str(id)]
+            if row_filter is not None:
+                params.extend(row_filter.params)
+            QueryTemplates.execute(cursor, QueryTemplates.select_by_id(table_name, Database.row_filter_sql(row_filter)),
+                                   params)
             rows = cursor.fetchall()
             logger.debug(f'Received rows: "{rows}"')
             # Convert sqlite3.Row objects to dictionaries for easier handling
@@ -100,9 +211,13 @@ class Database(BaseModel):
             logger.error(f"Error listing table '{table_name}': {e}")
             return []
 
-    def list_table_rows(self, conn: Connection, cursor: Cursor, table_name: str, where: Optional[str] = None) -> [dict]:
+    def list_table_rows(self, conn: Connection, cursor: Cursor, table_name: str,
+                        filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None,
+                        after: Optional[PageCursor] = None, row_filter: Optional[RowFilter] = None) -> [dict]:
         """
-        Lists all records from the specified table.
+        Lists records from the specified table, optionally only the ones whose columns equal the given filter values.
+        With a row filter, only the rows it selects.
+        With a limit, returns at most one page of rows in (created_at, id) order, starting after the given cursor.
         Returns a list of dictionaries, where each dictionary represents a row.
         """
         if not conn:
@@ -110,11 +225,17 @@ class Database(BaseModel):
             return []
 
         try:
-            query = f"SELECT * FROM {table_name}"
-            if where is not None:
-                query = f"{query} WHERE {where}"
-            logger.debug(f'Running SQL query "{query}"')
-            cursor.execute(query)
+            filter_columns = tuple(sorted(filters)) if filters else ()
+            params: List[Any] = [filters[column] for column in filter_columns]
+            if row_filter is not None:
+                params.extend(row_filter.params)
+            if after is not None:
+                params.extend([after.created_at, after.id])
+            if limit is not None:
+                params.append(int(limit))
+            query = QueryTemplates.select_rows(table_name, filter_columns, after=after is not None,
+                                               limit=limit is not None, row_filter=Database.row_filter_sql(row_filter))
+            QueryTemplates.execute(cursor, query, params)
             rows = cursor.fetchall()
             logger.debug(f'Received rows: "{rows}"')
             # Convert sqlite3.Row objects to dictionaries for easier handling
@@ -126,65 +247,141 @@ class Database(BaseModel):
             logger.error(f"Error listing table '{table_name}': {e}")
             return []
 
-    def read_max_case_number(self, conn: Connection, cursor: Cursor) -> int:
-        max_case_number: int = 0
+    def iter_table_rows(self, conn: Connection, cursor: Cursor, table_name: str, after: Optional[PageCursor] = None,
+                        batch_size: int = 500, row_filter: Optional[RowFilter] = None,
+                        projection: Optional[FieldProjection] = None) -> Iterator[dict]:
+        """
+        Streams all records from the specified table in (created_at, id) order, starting after the given cursor.
+        With a row filter, only the rows it selects, with a projection, only its columns.
+        Rows are fetched in batches of batch_size, so memory use does not grow with the table size.
+        """
         if not conn:
             logger.error("Database connection not established. Cannot list table.")
-            return max_case_number
+            return
 
         try:
-            query = CaseRecord.get_last_case_number_query()
-            logger.debug(f'Running SQL query "{query}"')
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            logger.debug(f'Received rows: "{rows}"')
-            if len(rows) > 0:
-                row = dict(rows[0])
-                max_case_number_value = row.get("max_case_number", max_case_number)
-                if max_case_number_value is None:
-                    max_case_number_value = max_case_number
-                logger.info(f"Last case number in database is {max_case_number_value}.")
-                return max_case_number_value
-            return max_case_number
+            params: List[Any] = list(row_filter.params) if row_filter is not None else []
+            if after is not None:
+                params.extend([after.created_at, after.id])
+            query = QueryTemplates.select_rows(table_name, after=after is not None, ordered=True,
+                                               row_filter=Database.row_filter_sql(row_filter),
+                                               columns=Database.projection_columns(projection))
+            logger.debug(f"Streaming with batch size {batch_size}")
+            QueryTemplates.execute(cursor, query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
         except sqlite3.OperationalError as e:
-            logger.error(f"Error: Table '{CaseRecord.table_name()}' does not exist or SQL error. {e}")
-            return max_case_number
+            logger.error(f"Error: Table '{table_name}' does not exist or SQL error. {e}")
         except sqlite3.Error as e:
-            logger.error(f"Error listing table '{CaseRecord.table_name()}': {e}")
-            return max_case_number
+            logger.error(f"Error listing table '{table_name}': {e}")
 
-    def read_max_account_number(self, conn: Connection, cursor: Cursor) -> int:
-        max_account_number: int = 0
-        if not conn:
-            logger.error("Database connection not established. Cannot list table.")
-            return max_account_number
+    def iter_readable_rows(self, conn: Connection, cursor: Cursor, table_name: str, object_type_str: str,
+                           user: Optional[User], after: Optional[PageCursor] = None,
+                           batch_size: int = 500) -> Iterator[dict]:
+        """
+        Streams the rows of the specified table, by applying user based access rules, without hidden fields.
+        Yields nothing if the user has no access to the object type.
+        """
+        if not self.check_access(conn, cursor, object_type_str, user):
+            logger.error(f'User "{user.username}" trying to access object type "{object_type_str}", '
+                         f'but does not have access.')
+            return
+        row_filter = self.access_row_filter(conn, cursor, object_type_str, user)
+        projection = self.access_projection(conn, cursor, object_type_str, user)
+        yield from self.iter_table_rows(conn, cursor, table_name, after, batch_size, row_filter, projection)
 
+    def insert_records(self, conn: Connection, cursor: Cursor, records: List[Any], replace: bool = False,
+                       commit: bool = True) -> int:
+        """
+        Inserts many records in a single transaction, with one executemany per record type.
+        With replace, existing rows with the same id are overwritten (upsert).
+        Case and account number sequences and per-case comment counters are first advanced past the numbers records
+        arrive with, e.g. from an import, then new records without a number get theirs, all in the same transaction.
+        Without an event dispatcher, the CREATE triggers of these new records run once they are inserted.
+        Returns the number of inserted records.
+        """
+        if not records:
+            return 0
+        # Group by record type, keeping the first-seen order of the types
+        records_by_class: Dict[type, List[Any]] = {}
+        for record in records:
+            records_by_class.setdefault(type(record), []).append(record)
+        now = time.time()
+        new_records: List[Any] = []
         try:
-            query = AccountRecord.get_last_account_number_query()
-            logger.debug(f'Running SQL query "{query}"')
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            logger.debug(f'Received rows: "{rows}"')
-            if len(rows) > 0:
-                row = dict(rows[0])
-                max_account_number_value = row.get("max_account_number", max_account_number)
-                if max_account_number_value is None:
-                    max_account_number_value = max_account_number
-                logger.info(f"Last account number in database is {max_account_number_value}.")
-                return max_account_number_value
-            return max_account_number
-        except sqlite3.OperationalError as e:
-            logger.error(f"Error: Table '{AccountRecord.table_name()}' does not exist or SQL error. {e}")
-            return max_account_number
+            Database.advance_number_sequences(cursor, records)
+            for (record_class, class_records) in records_by_class.items():
+                record_type = RecordRegistry.for_record_class(record_class)
+                query = record_type.insert_or_replace_query if replace else record_type.insert_query
+                logger.debug(f'Running SQL query "{query}" for {len(class_records)} records')
+                for record in class_records:
+                    record.commit_at = now
+                new_records.extend(Database.assign_numbers(conn, cursor, class_records))
+                cursor.executemany(query, [record_type.encode(record) for record in class_records])
+            if commit:
+                conn.commit()
         except sqlite3.Error as e:
-            logger.error(f"Error listing table '{AccountRecord.table_name()}': {e}")
-            return max_account_number
+            logger.error(f"Error inserting {len(records)} records: {e}")
+            conn.rollback()
+            raise
+        for record in new_records:
+            WorkflowTrigger.run_after_insert(record.object_type_name, record.convert_to_object())
+        return len(records)
+
+    @classmethod
+    def assign_numbers(cls, conn: Connection, cursor: Cursor, records: List[Any]) -> List[Any]:
+        # New cases, accounts and case comments get their numbers as they are inserted, imported ones keep theirs.
+        # Returns the records that got a new number.
+        new_records: List[Any] = []
+        for record in records:
+            if isinstance(record, CaseRecord):
+                new_record = record.assign_case_number(conn, cursor)
+            elif isinstance(record, AccountRecord):
+                new_record = record.assign_account_number(conn, cursor)
+            elif isinstance(record, CaseCommentRecord):
+                new_record = record.assign_case_comment_number(conn, cursor)
+            else:
+                new_record = False
+            if new_record:
+                new_records.append(record)
+        return new_records
+
+    @classmethod
+    def advance_number_sequences(cls, cursor: Cursor, records: List[Any]) -> None:
+        # Only numbers records arrive with, new records get theirs afterwards
+        case_numbers = [int(record.case_number) for record in records
+                        if isinstance(record, CaseRecord) and record.case_number]
+        if case_numbers:
+            SequenceAllocator.advance_past(cursor, CaseRecord.number_sequence_name(), max(case_numbers))
+        account_numbers = [int(record.account_number) for record in records
+                           if isinstance(record, AccountRecord) and record.account_number]
+        if account_numbers:
+            SequenceAllocator.advance_past(cursor, AccountRecord.number_sequence_name(), max(account_numbers))
+        case_comment_records = [record for record in records if isinstance(record, CaseCommentRecord)]
+        if case_comment_records:
+            CaseCommentRecord.advance_case_comment_counters(cursor, case_comment_records)
+
+    def init_number_sequences(self) -> None:
+        """
+        Makes new cases and accounts take their numbers from the database sequences, so several server processes
+        never hand out the same number.
+        """
+        CaseRecord.number_allocator = SequenceAllocator.for_sequence(self.db_name, CaseRecord.number_sequence_name())
+        AccountRecord.number_allocator = SequenceAllocator.for_sequence(self.db_name,
+                                                                        AccountRecord.number_sequence_name())
 
     def read_objects(self, conn: Connection, cursor: Cursor, table_name: str, object_type_str: str,
-                     user: Optional[User]) -> [DataObject]:
+                     user: Optional[User], limit: Optional[int] = None,
+                     after: Optional[PageCursor] = None) -> [DataObject]:
         """
-        Read all records from the specified table, by applying user based access rules.
-        Returns object of the given type.
+        Read records from the specified table, by applying user based access rules.
+        With a limit, reads one page in (created_at, id) order, starting after the given cursor.
+        Returns object of the given type. Records are complete, hidden fields are left out by the read_trusted_* reads
+        that serve API responses.
         """
         if not conn:
             logger.error("Database connection not established. Cannot list table.")
@@ -194,33 +391,113 @@ class Database(BaseModel):
         allow_access = self.check_access(conn, cursor, object_type_str, user)
         # Read from DB
         if allow_access:
-            rows = self.list_table_rows(conn, cursor, table_name)
-            if rows is not None and len(rows) > 0:
-                if object_type_str == "Case":
-                    return [CaseRecord.from_db_row(row) for row in rows]
-                elif object_type_str == "CaseComment":
-                    return [CaseCommentRecord.from_db_row(row) for row in rows]
-                elif object_type_str == "Account":
-                    return [AccountRecord.from_db_row(row) for row in rows]
-                elif object_type_str == "User":
-                    return [UserRecord.from_db_row(row) for row in rows]
-                elif object_type_str == "Profile":
-                    return [ProfileRecord.from_db_row(row) for row in rows]
-                elif object_type_str == "Workflow":
-                    return [WorkflowRecord.from_db_row(row) for row in rows]
-                elif object_type_str == "WorkflowStep":
-                    return [WorkflowStepRecord.from_db_row(row) for row in rows]
-                elif object_type_str == "WorkflowTrigger":
-                    return [WorkflowTriggerRecord.from_db_row(row) for row in rows]
-                else:
-                    # Unexpected object type
-                    logger.error(f'Unexpected object type "{object_type_str}".')
+            record_type = RecordRegistry.for_object_type(object_type_str)
+            if record_type is None:
                 return []
+            row_filter = self.access_row_filter(conn, cursor, object_type_str, user)
+            rows = self.list_table_rows(conn, cursor, table_name, limit=limit, after=after, row_filter=row_filter)
+            if rows is not None and len(rows) > 0:
+                return [record_type.decode(row) for row in rows]
+            return []
         else:
             logger.error(f'User "{user.username}" trying to access object type "{object_type_str}", '
                            f'but does not have access.')
             return []
 
+    def read_trusted_rows(self, conn: Connection, cursor: Cursor, table_name: str, object_type_str: str,
+                          user: Optional[User], target_class: type, limit: Optional[int] = None,
+                          after: Optional[PageCursor] = None,
+                          filters: Optional[Dict[str, Any]] = None) -> Tuple[Optional[TrustedRowDecoder], List[tuple]]:
+        """
+        Same rows and access check as read_objects, as plain tuples together with the decoder that turns them into
+        target_class, a record or API record class, without validation. See TrustedRowDecoder.
+        Only the columns visible to the user are selected, hidden fields are missing from the decoded values.
+        Filters are equality conditions on columns, e.g. {"id": ...}.
+        """
+        if not conn:
+            logger.error("Database connection not established. Cannot list table.")
+            return (None, [])
+        if not self.check_access(conn, cursor, object_type_str, user):
+            logger.error(f'User "{user.username}" trying to access object type "{object_type_str}", '
+                         f'but does not have access.')
+            return (None, [])
+        row_filter = self.access_row_filter(conn, cursor, object_type_str, user)
+        projection = self.access_projection(conn, cursor, object_type_str, user)
+        filters = filters or {}
+        try:
+            params: List[Any] = list(filters.values())
+            if row_filter is not None:
+                params.extend(row_filter.params)
+            if after is not None:
+                params.extend([after.created_at, after.id])
+            if limit is not None:
+                params.append(int(limit))
+            query = QueryTemplates.select_rows(table_name, tuple(filters.keys()), after=after is not None,
+                                               limit=limit is not None, row_filter=Database.row_filter_sql(row_filter),
+                                               columns=Database.projection_columns(projection))
+            # Plain tuples instead of sqlite3.Row, the decoder knows the column positions
+            tuple_cursor = conn.cursor()
+            tuple_cursor.row_factory = None
+            QueryTemplates.execute(tuple_cursor, query, params)
+            rows = tuple_cursor.fetchall()
+            decoder = TrustedRowDecoder.for_columns(target_class,
+                                                    [column[0] for column in tuple_cursor.description])
+            return (decoder, rows)
+        except sqlite3.OperationalError as e:
+            logger.error(f"Error: Table '{table_name}' does not exist or SQL error. {e}")
+            return (None, [])
+        except sqlite3.Error as e:
+            logger.error(f"Error listing table '{table_name}': {e}")
+            return (None, [])
+
+    def read_trusted_objects(self, conn: Connection, cursor: Cursor, table_name: str, object_type_str: str,
+                             user: Optional[User], target_class: type, limit: Optional[int] = None,
+                             after: Optional[PageCursor] = None) -> List[Any]:
+        [decoder, rows] = self.read_trusted_rows(conn, cursor, table_name, object_type_str, user, target_class, limit,
+                                                 after)
+        return decoder.decode_all(rows) if decoder is not None else []
+
+    def read_trusted_values(self, conn: Connection, cursor: Cursor, table_name: str, object_type_str: str,
+                            user: Optional[User], target_class: type, limit: Optional[int] = None,
+                            after: Optional[PageCursor] = None) -> List[Dict[str, Any]]:
+        """
+        Like read_trusted_objects, but returns the field values as dictionaries, ready to be serialized as JSON.
+        """
+        [decoder, rows] = self.read_trusted_rows(conn, cursor, table_name, object_type_str, user, target_class, limit,
+                                                 after)
+        return decoder.decode_all_values(rows) if decoder is not None else []
+
+    def read_trusted_value_by_id(self, conn: Connection, cursor: Cursor, table_name: str, object_type_str: str,
+                                 object_id: uuid.UUID, user: Optional[User],
+                                 target_class: type) -> Optional[Dict[str, Any]]:
+        """
+        Like read_trusted_values, for the object of the given id. None if it does not exist or is not accessible.
+        """
+        [decoder, rows] = self.read_trusted_rows(conn, cursor, table_name, object_type_str, user, target_class,
+                                                 filters={"id": str(object_id)})
+        return decoder.decode_values(rows[0]) if decoder is not None and rows else None
+
+    def search(self, conn: Connection, cursor: Cursor, text: str, user: Optional[User], limit: int,
+               after: Optional[SearchCursor] = None) -> List[Dict[str, Any]]:
+        """
+        Full text search in the rows and the visible fields the user has access to, see FullTextSearch.
+        Returns the ranked hits as dictionaries, ready to be serialized as JSON.
+        """
+        object_type_names = [search_index.object_type_name for search_index in FullTextSearch.search_indexes()
+                             if self.check_access(conn, cursor, search_index.object_type_name, user)]
+        if not object_type_names:
+            return []
+        row_filters: Dict[str, RowFilter] = {}
+        projections: Dict[str, FieldProjection] = {}
+        for object_type_name in object_type_names:
+            row_filter = self.access_row_filter(conn, cursor, object_type_name, user)
+            if row_filter is not None:
+                row_filters[object_type_name] = row_filter
+            projection = self.access_projection(conn, cursor, object_type_name, user)
+            if projection is not None:
+                projections[object_type_name] = projection
+        return FullTextSearch.search(cursor, text, object_type_names, limit, after, row_filters, projections)
+
     def read_object_by_id(self, conn: Connection, cursor: Cursor, table_name: str, object_type_str: str,
                           object_id: uuid.UUID, user: Optional[User]) -> Any:
         """
@@ -234,27 +511,13 @@ class Database(BaseModel):
         allow_access = self.check_access(conn, cursor, object_type_str, user)
         # Read from DB
         if allow_access:
-            rows = self.get_table_row(conn, cursor, table_name, object_id)
-            if rows is not None and len(rows) > 0:
-                row = rows[0]
-                if object_type_str == "Case":
-                    return CaseRecord.from_db_row(row)
-                elif object_type_str == "Account":
-                    return AccountRecord.from_db_row(row)
-                elif object_type_str == "User":
-                    return UserRecord.from_db_row(row)
-                elif object_type_str == "Profile":
-                    return ProfileRecord.from_db_row(row)
-                elif object_type_str == "Workflow":
-                    return WorkflowRecord.from_db_row(row)
-                elif object_type_str == "WorkflowStep":
-                    return WorkflowStepRecord.from_db_row(row)
-                elif object_type_str == "WorkflowTrigger":
-                    return WorkflowTriggerRecord.from_db_row(row)
-                else:
-                    # Unexpected object type
-                    logger.warning(f'Unexpected object type "{object_type_str}".')
+            record_type = RecordRegistry.for_object_type(object_type_str)
+            if record_type is None:
                 return None
+            row_filter = self.access_row_filter(conn, cursor, object_type_str, user)
+            rows = self.get_table_row(conn, cursor, table_name, object_id, row_filter)
+            if rows is not None and len(rows) > 0:
+                return record_type.decode(rows[0])
             else:
                 # No rows
                 logger.warning(f'No object of id "{object_id}" and type "{object_type_str}" found.')
@@ -278,15 +541,27 @@ class Database(BaseModel):
 
     def init_workflows_and_triggers(self, conn: Connection, cursor: Cursor) -> None:
         workflow_steps = self.get_workflow_steps(conn, cursor)
+        # Step code is compiled here once, not on every run of a workflow
+        for workflow_step in workflow_steps:
+            try:
+                workflow_step.compiled_code()
+            except SyntaxError as e:
+                logger.error(f'Syntax error in workflow step "{workflow_step.workflow_step_name}" '
+                             f'line {e.lineno}: {e.msg}')
         workflows = self.get_workflows(conn, cursor)
         workflow_triggers = self.get_workflow_triggers(conn, cursor)
+        # Steps and workflows are resolved through dicts by id, not by scanning the lists
+        workflow_steps_by_id = {str(workflow_step.id): workflow_step for workflow_step in workflow_steps}
         for workflow in workflows:
-            workflow.load_steps_from_all_steps(workflow_steps)
+            workflow.load_steps_by_id(workflow_steps_by_id)
+        workflows_by_id = {str(workflow.id): workflow for workflow in workflows}
         for workflow_trigger in workflow_triggers:
-            workflow_trigger.load_workflows_from_all_workflows(workflows)
+            workflow_trigger.load_workflows_by_id(workflows_by_id)
         Workflow.all_workflows = workflows
         WorkflowStep.all_workflow_steps = workflow_steps
         WorkflowTrigger.all_workflow_triggers = workflow_triggers
+        # Replaced as a whole, running triggers keep using the index they started with
+        WorkflowTrigger.dispatch_index = WorkflowDispatchIndex.build(workflow_triggers)
 
     def get_workflows(self, conn: Connection, cursor: Cursor) -> List[Workflow]:
         workflow_records: List[WorkflowRecord] = self.read_objects(conn, cursor, WorkflowRecord.table_name(),
@@ -323,16 +598,88 @@ class Database(BaseModel):
             return []
         return workflow_triggers
 
-    def check_access(self, conn: Connection, cursor: Cursor, object_type_str: str, user: User):
-        allow_access = AccessRule.object_type_accessible_to_all(object_type_str)
-        access_rules: List[AccessRule] = []
-        if user is not None:
-            all_profiles = self.get_profiles(conn, cursor)
-            all_profiles_dict = {profile.id: profile for profile in all_profiles}
-            for profile_id in user.profile_ids.object_ids:
-                found_profile = all_profiles_dict[profile_id]
-                access_rules.extend(found_profile.access_rules)
-            data_object_types: List[str] = [access_rule.data_object_type for access_rule in access_rules]
-            if data_object_types.__contains__(object_type_str):
-                allow_access = True
-        return allow_access
+    def read_user_by_username(self, conn: Connection, cursor: Cursor, username: str) -> Optional[User]:
+        """
+        The user with the given username, or None. Cached, see UserCache.
+        """
+        return UserCache.user_by_username(cursor, self.db_name, username)
+
+    def check_access(self, conn: Connection, cursor: Cursor, object_type_str: str, user: User,
+                     access_type: Optional[AccessType] = None) -> bool:
+        """
+        Whether the user has an access rule for the object type, with all bits of access_type when given.
+        Uses the user's compiled permissions, see PermissionCache.
+        """
+        if AccessRule.object_type_accessible_to_all(object_type_str):
+            return True
+        if user is None:
+            return False
+        return PermissionCache.permissions_for(cursor, self.db_name, user).allows(object_type_str, access_type)
+
+    def check_access_many(self, conn: Connection, cursor: Cursor, user: Optional[User],
+                          object_ids: Sequence[Tuple[str, Any]],
+                          access_type: Optional[AccessType] = None) -> List[bool]:
+        """
+        Whether the user may access each of the given (object type, object id) pairs, in the same order.
+        The user's permissions are resolved once, then each object type is checked with one indexed query per
+        check_access_many_batch_size ids, selecting the ids that exist and pass the type's row filter.
+        """
+        allowed: List[bool] = [False] * len(object_ids)
+        positions_by_type: Dict[str, Dict[str, List[int]]] = {}
+        for (position, (object_type_str, object_id)) in enumerate(object_ids):
+            positions_by_type.setdefault(object_type_str, {}).setdefault(str(object_id), []).append(position)
+        permissions = PermissionCache.permissions_for(cursor, self.db_name, user) if user is not None else None
+        batch_size = Database.check_access_many_batch_size
+        for (object_type_str, positions_by_id) in positions_by_type.items():
+            record_type = RecordRegistry.for_object_type(object_type_str)
+            if record_type is None:
+                continue
+            row_filter: Optional[RowFilter] = None
+            if not AccessRule.object_type_accessible_to_all(object_type_str):
+                if permissions is None or not permissions.allows(object_type_str, access_type):
+                    continue
+                row_filter = permissions.row_filter(object_type_str)
+            # Every batch is padded to the same size, so all of them run the same prepared statement
+            query = QueryTemplates.select_ids_in(record_type.table_name, batch_size,
+                                                 Database.row_filter_sql(row_filter))
+            ids = list(positions_by_id.keys())
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                params: List[Any] = batch + [batch[-1]] * (batch_size - len(batch))
+                if row_filter is not None:
+                    params.extend(row_filter.params)
+                QueryTemplates.execute(cursor, query, params)
+                for row in cursor.fetchall():
+                    for position in positions_by_id[row[0]]:
+                        allowed[position] = True
+        return allowed
+
+    def access_row_filter(self, conn: Connection, cursor: Cursor, object_type_str: str,
+                          user: Optional[User]) -> Optional[RowFilter]:
+        """
+        The condition selecting the rows of the object type the user may access, compiled from the row predicates of
+        the user's access rules. None when all rows are accessible. Only meaningful after check_access allowed the
+        object type.
+        """
+        if AccessRule.object_type_accessible_to_all(object_type_str) or user is None:
+            return None
+        return PermissionCache.permissions_for(cursor, self.db_name, user).row_filter(object_type_str)
+
+    def access_projection(self, conn: Connection, cursor: Cursor, object_type_str: str,
+                          user: Optional[User]) -> Optional[FieldProjection]:
+        """
+        The columns of the object type the user may see, compiled from the hidden fields of the user's access rules.
+        None when all fields are visible.
+        """
+        if AccessRule.object_type_accessible_to_all(object_type_str) or user is None:
+            return None
+        return PermissionCache.permissions_for(cursor, self.db_name, user).projection(object_type_str)
+
+    @classmethod
+    def row_filter_sql(cls, row_filter: Optional[RowFilter]) -> str:
+        return row_filter.sql if row_filter is not None else ""
+
+    @classmethod
+    def projection_columns(cls, projection: Optional[FieldProjection]) -> Tuple[str, ...]:
+        # No columns select all of them
+        return projection.columns if projection is not None else ()
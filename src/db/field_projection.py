@@ -0,0 +1,41 @@
+import logging
+from typing import ClassVar, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from src.db.record_registry import RecordRegistry
+
+logging.basicConfig()
+logger = logging.getLogger("FieldProjection")
+logger.setLevel(logging.DEBUG)
+
+
+class FieldProjection(BaseModel):
+    """
+    Columns of one table a user may see, compiled from the hidden fields of the user's access rules.
+    A field is hidden only if every rule for the object type hides it, a field visible through one rule is visible.
+    Reads select only `columns`, so hidden fields never leave the database and are missing from the responses.
+    """
+    # Needed for reading and paging, never hidden
+    always_visible_columns: ClassVar[Tuple[str, ...]] = ("id", "created_at", "object_type_name")
+    columns: Tuple[str, ...]
+    hidden_columns: Tuple[str, ...]
+
+    @classmethod
+    def compile(cls, object_type_name: str, rules_hidden_fields: List[List[str]]) -> Optional["FieldProjection"]:
+        """
+        Returns None when all columns are visible.
+        """
+        record_type = RecordRegistry.for_object_type(object_type_name)
+        if record_type is None or not rules_hidden_fields:
+            return None
+        hidden = set(rules_hidden_fields[0])
+        for hidden_fields in rules_hidden_fields[1:]:
+            hidden &= set(hidden_fields)
+        for field_name in sorted(hidden - set(record_type.columns)):
+            logger.error(f'Hidden field "{field_name}" is not a column of "{object_type_name}", ignoring it')
+        hidden = (hidden & set(record_type.columns)) - set(FieldProjection.always_visible_columns)
+        if not hidden:
+            return None
+        return FieldProjection(columns=tuple(column for column in record_type.columns if column not in hidden),
+                               hidden_columns=tuple(column for column in record_type.columns if column in hidden))
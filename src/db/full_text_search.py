@@ -0,0 +1,173 @@
+import logging
+from sqlite3 import Cursor
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from src.db.case_comment_record import CaseCommentRecord
+from src.db.case_record import CaseRecord
+from src.db.field_projection import FieldProjection
+from src.db.query_templates import QueryTemplates
+from src.db.row_filter import RowFilter
+from src.db.search_cursor import SearchCursor
+
+logging.basicConfig()
+logger = logging.getLogger("FullTextSearch")
+logger.setLevel(logging.DEBUG)
+
+
+class SearchIndex(BaseModel):
+    """
+    FTS5 index over the text columns of one table. The index uses the table as external content: it only stores the
+    terms, snippets are cut from the table rows, found through their rowid.
+    Triggers on the table keep the index in sync with every insert, insert or replace, update and delete.
+    """
+    object_type_name: str
+    table_name: str
+    text_columns: Tuple[str, ...]
+    number_column: str
+    # Column with the id of the case a hit belongs to
+    case_id_column: str
+
+    def search_table_name(self) -> str:
+        return f"{self.table_name}Search"
+
+    def table_definition(self) -> str:
+        return f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.search_table_name()} " \
+               f"USING fts5({', '.join(self.text_columns)}, content='{self.table_name}', " \
+               f"tokenize='unicode61 remove_diacritics 2')"
+
+    def trigger_definitions(self) -> List[str]:
+        search_table = self.search_table_name()
+        columns = ", ".join(self.text_columns)
+        new_values = ", ".join(f"new.{column}" for column in self.text_columns)
+        old_values = ", ".join(f"old.{column}" for column in self.text_columns)
+        return [
+            # INSERT OR REPLACE does not fire delete triggers, so the replaced row is removed from the index up front
+            f"CREATE TRIGGER IF NOT EXISTS {search_table}BeforeInsert BEFORE INSERT ON {self.table_name} BEGIN "
+            f"INSERT INTO {search_table} ({search_table}, rowid, {columns}) "
+            f"SELECT 'delete', rowid, {columns} FROM {self.table_name} WHERE id = new.id; END",
+            f"CREATE TRIGGER IF NOT EXISTS {search_table}AfterInsert AFTER INSERT ON {self.table_name} BEGIN "
+            f"INSERT INTO {search_table} (rowid, {columns}) VALUES (new.rowid, {new_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {search_table}AfterUpdate AFTER UPDATE OF {columns} ON {self.table_name} "
+            f"BEGIN "
+            f"INSERT INTO {search_table} ({search_table}, rowid, {columns}) "
+            f"VALUES ('delete', old.rowid, {old_values}); "
+            f"INSERT INTO {search_table} (rowid, {columns}) VALUES (new.rowid, {new_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {search_table}AfterDelete AFTER DELETE ON {self.table_name} BEGIN "
+            f"INSERT INTO {search_table} ({search_table}, rowid, {columns}) "
+            f"VALUES ('delete', old.rowid, {old_values}); END",
+        ]
+
+    def visible_text_columns(self, hidden_columns: Tuple[str, ...] = ()) -> Tuple[str, ...]:
+        return tuple(column for column in self.text_columns if column not in hidden_columns)
+
+    def match_in_columns(self, match: str, hidden_columns: Tuple[str, ...] = ()) -> str:
+        # Terms in hidden columns must not find a row, the match is limited to the visible ones
+        if not hidden_columns:
+            return match
+        return f"{{{' '.join(self.visible_text_columns(hidden_columns))}}} : ({match})"
+
+    def search_query(self, after: bool, row_filter: str = "", hidden_columns: Tuple[str, ...] = ()) -> str:
+        # bm25() is lower for better matches, ties are broken by id for a stable order across pages
+        search_table = self.search_table_name()
+        table = self.table_name
+        # Without hidden columns the snippet comes from the best matching column, otherwise from the first visible one
+        snippet_column = self.text_columns.index(self.visible_text_columns(hidden_columns)[0]) if hidden_columns else -1
+        number = "NULL" if self.number_column in hidden_columns else f"{table}.{self.number_column}"
+        case_id = "NULL" if self.case_id_column in hidden_columns else f"{table}.{self.case_id_column}"
+        query = f"SELECT '{self.object_type_name}' AS object_type_name, {table}.id AS id, " \
+                f"{number} AS number, {case_id} AS case_id, " \
+                f"snippet({search_table}, {snippet_column}, '<mark>', '</mark>', '...', 16) AS snippet, " \
+                f"bm25({search_table}) AS rank " \
+                f"FROM {search_table} JOIN {table} ON {table}.rowid = {search_table}.rowid " \
+                f"WHERE {search_table} MATCH ?"
+        if row_filter:
+            query += f" AND {row_filter}"
+        if after:
+            query += f" AND (bm25({search_table}) > ? OR (bm25({search_table}) = ? AND {table}.id > ?))"
+        return query + f" ORDER BY rank, {table}.id LIMIT ?"
+
+
+class FullTextSearch:
+    """
+    Ranked full text search over cases and case comments with SQLite FTS5.
+    Each indexed table is searched through its own index and the ranked hits are merged, so every query only
+    touches the index entries of its terms, no matter how many rows the tables have.
+    The indexes map hits to rows by rowid, which VACUUM may renumber; rebuild_all() brings them back in line.
+    """
+    all_search_indexes: ClassVar[List[SearchIndex]] = [
+        SearchIndex(object_type_name="Case", table_name=CaseRecord.table_name(),
+                    text_columns=("summary", "description"), number_column="case_number", case_id_column="id"),
+        SearchIndex(object_type_name="CaseComment", table_name=CaseCommentRecord.table_name(),
+                    text_columns=("summary", "description"), number_column="case_comment_number",
+                    case_id_column="case_object_id"),
+    ]
+
+    @classmethod
+    def search_indexes(cls) -> List[SearchIndex]:
+        return FullTextSearch.all_search_indexes
+
+    @classmethod
+    def create_search_indexes(cls, cursor: Cursor) -> None:
+        for search_index in FullTextSearch.search_indexes():
+            cursor.execute(search_index.table_definition())
+            for trigger_definition in search_index.trigger_definitions():
+                cursor.execute(trigger_definition)
+
+    @classmethod
+    def rebuild_all(cls, cursor: Cursor) -> None:
+        """
+        Re-indexes every row of the indexed tables.
+        """
+        for search_index in FullTextSearch.search_indexes():
+            search_table = search_index.search_table_name()
+            cursor.execute(f"INSERT INTO {search_table} ({search_table}) VALUES ('rebuild')")
+            logger.info(f'Rebuilt full text search index "{search_table}"')
+
+    @classmethod
+    def match_expression(cls, text: str) -> Optional[str]:
+        """
+        Turns free text into an FTS5 query matching rows with all of its words.
+        Every word is quoted, so user input can never be an FTS5 syntax error.
+        """
+        words = text.split()
+        if not words:
+            return None
+        return " ".join('"' + word.replace('"', '""') + '"' for word in words)
+
+    @classmethod
+    def search(cls, cursor: Cursor, text: str, object_type_names: List[str], limit: int,
+               after: Optional[SearchCursor] = None,
+               row_filters: Optional[Dict[str, RowFilter]] = None,
+               projections: Optional[Dict[str, FieldProjection]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns up to `limit` hits in the given object types, best match first, after the given position.
+        Hits of object types with a row filter are limited to the rows it selects, those with a field projection are
+        only found and shown through their visible columns.
+        Each hit has object_type_name, id, number, case_id, snippet and rank.
+        """
+        match = FullTextSearch.match_expression(text)
+        if match is None:
+            return []
+        hits: List[Dict[str, Any]] = []
+        for search_index in FullTextSearch.search_indexes():
+            if search_index.object_type_name not in object_type_names:
+                continue
+            row_filter = (row_filters or {}).get(search_index.object_type_name)
+            projection = (projections or {}).get(search_index.object_type_name)
+            hidden_columns = projection.hidden_columns if projection is not None else ()
+            if not search_index.visible_text_columns(hidden_columns):
+                continue
+            params: List[Any] = [search_index.match_in_columns(match, hidden_columns)]
+            if row_filter is not None:
+                params.extend(row_filter.params)
+            if after is not None:
+                params.extend([after.rank, after.rank, after.id])
+            params.append(limit)
+            query = search_index.search_query(after is not None, row_filter.sql if row_filter is not None else "",
+                                              hidden_columns)
+            QueryTemplates.execute(cursor, query, params)
+            hits.extend(dict(row) for row in cursor.fetchall())
+        hits.sort(key=lambda hit: (hit["rank"], hit["id"]))
+        return hits[:limit]
@@ -0,0 +1,111 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlite3 import Connection, Cursor
+from typing import Any, Callable, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+
+from src.db.database import Database
+from src.db.unit_of_work import UnitOfWork
+
+logging.basicConfig()
+logger = logging.getLogger("GroupCommitWriter")
+logger.setLevel(logging.DEBUG)
+
+WriteWork = Callable[[Connection, Cursor], Any]
+
+
+class GroupCommitWriter(BaseModel):
+    """
+    Single writer for one database: write work from any number of callers is queued and run by one thread.
+    Whatever arrives within `batch_window_seconds` of the first queued write, up to `max_batch_size` writes, runs in
+    one unit of work that takes the SQLite write lock up front (BEGIN IMMEDIATE) and commits once for the group.
+    Each write runs in its own savepoint, a failing write only discards its own changes and fails its own future.
+    Callers get their result once the group commit is done, or the commit error if it fails.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    db: Database
+    max_batch_size: int = 64
+    batch_window_seconds: float = 0.002
+    # (work, future) pairs, None stops the writer
+    _queue: "queue.Queue[Optional[Tuple[WriteWork, Future]]]" = PrivateAttr(default_factory=queue.Queue)
+    _thread: threading.Thread = PrivateAttr()
+    committed_groups: int = 0
+    committed_writes: int = 0
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._thread = threading.Thread(target=self.run_writer, name=f"writer-{self.db.db_name}", daemon=True)
+        self._thread.start()
+        logger.info(f'Writer for "{self.db.db_name}" started, up to {self.max_batch_size} writes per commit')
+
+    def submit(self, work: WriteWork) -> Future:
+        """
+        Queues work(conn, cursor) for the writer thread, the returned future resolves after its group commit.
+        """
+        future: Future = Future()
+        self._queue.put((work, future))
+        return future
+
+    def stop(self) -> None:
+        """
+        Writes everything queued so far, then stops the writer thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def run_writer(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            group = [first]
+            deadline = time.monotonic() + self.batch_window_seconds
+            while len(group) < self.max_batch_size:
+                try:
+                    # Take what is already queued without waiting, then wait until the window closes
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+            self.write_group(group)
+        logger.info(f'Writer for "{self.db.db_name}" stopped after {self.committed_writes} writes in '
+                     f'{self.committed_groups} commits')
+
+    def write_group(self, group: List[Tuple[WriteWork, Future]]) -> None:
+        done: List[Tuple[Future, Any]] = []
+        try:
+            with self.db.transaction() as [conn, cursor]:
+                unit_of_work = UnitOfWork.current(self.db.db_name)
+                conn.execute("BEGIN IMMEDIATE")
+                for (work, future) in group:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with unit_of_work.savepoint():
+                            result = work(conn, cursor)
+                    except Exception as e:
+                        logger.error(f"Error in queued write, rolled back to its savepoint: {e}")
+                        future.set_exception(e)
+                        continue
+                    done.append((future, result))
+        except Exception as e:
+            logger.error(f'Error committing a group of {len(group)} writes to "{self.db.db_name}": {e}')
+            for (_, future) in group:
+                if future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+        self.committed_groups += 1
+        self.committed_writes += len(done)
+        logger.debug(f'Committed {len(done)} of {len(group)} queued writes to "{self.db.db_name}" at once')
+        for (future, result) in done:
+            future.set_result(result)
@@ -0,0 +1,46 @@
+import base64
+import binascii
+import json
+import logging
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+logging.basicConfig()
+logger = logging.getLogger("PageCursor")
+logger.setLevel(logging.DEBUG)
+
+
+class PageCursor(BaseModel):
+    """
+    Keyset pagination position: the (created_at, id) pair of the last row of a page.
+    Handed to API clients as an opaque url-safe token.
+    """
+    created_at: float
+    id: str
+
+    @classmethod
+    def from_record(cls, record: Any) -> "PageCursor":
+        return PageCursor(created_at=float(record.created_at), id=str(record.id))
+
+    @classmethod
+    def from_db_row(cls, row: Any) -> "PageCursor":
+        return PageCursor(created_at=float(row["created_at"]), id=str(row["id"]))
+
+    @classmethod
+    def from_token(cls, token: Optional[str]) -> Optional["PageCursor"]:
+        """
+        Decodes a token created by to_token. Raises ValueError for malformed tokens.
+        """
+        if token is None or token == "":
+            return None
+        try:
+            padded_token = token + "=" * (-len(token) % 4)
+            [created_at, object_id] = json.loads(base64.urlsafe_b64decode(padded_token.encode("ascii")))
+            return PageCursor(created_at=float(created_at), id=str(object_id))
+        except (ValueError, TypeError, binascii.Error) as e:
+            raise ValueError(f'Invalid page cursor "{token}"') from e
+
+    def to_token(self) -> str:
+        payload = json.dumps([self.created_at, self.id], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("ascii")).decode("ascii").rstrip("=")
@@ -0,0 +1,155 @@
+import json
+import logging
+import threading
+from sqlite3 import Cursor
+from typing import ClassVar, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from src.core.access.access_type import AccessType
+from src.core.access.row_predicate import RowPredicate
+from src.core.access.user import User
+from src.db.field_projection import FieldProjection
+from src.db.profile_record import ProfileRecord
+from src.db.row_filter import RowFilter
+from src.db.user_record import UserRecord
+
+logging.basicConfig()
+logger = logging.getLogger("PermissionCache")
+logger.setLevel(logging.DEBUG)
+
+
+class UserPermissions(BaseModel):
+    """
+    What one user may do, compiled from the access rules of all their profiles: the AccessType bits per object type,
+    for object types where only some rows are accessible, the condition selecting them, and for object types with
+    hidden fields, the columns to select.
+    """
+    user_id: str
+    access_masks: Dict[str, int] = {}
+    row_filters: Dict[str, RowFilter] = {}
+    projections: Dict[str, FieldProjection] = {}
+
+    def allows(self, object_type_name: str, access_type: Optional[AccessType] = None) -> bool:
+        mask = self.access_masks.get(object_type_name)
+        if mask is None:
+            return False
+        # Without an access type, any rule for the object type gives access
+        return access_type is None or mask & access_type.value == access_type.value
+
+    def row_filter(self, object_type_name: str) -> Optional[RowFilter]:
+        # None when every row of the object type is accessible
+        return self.row_filters.get(object_type_name)
+
+    def projection(self, object_type_name: str) -> Optional[FieldProjection]:
+        # None when every field of the object type is visible
+        return self.projections.get(object_type_name)
+
+
+class PermissionCache:
+    """
+    Compiled UserPermissions per database and user.
+    Triggers on Users and Profiles count every change in the CacheVersions table, whichever process or code path
+    makes it, and the cache is dropped as soon as it sees a new count. Checking the cache costs one primary key read
+    of that count, a dict lookup and a bit test.
+    """
+    access_version_name: ClassVar[str] = "access"
+    all_permissions: ClassVar[Dict[str, Dict[str, UserPermissions]]] = {}
+    cached_versions: ClassVar[Dict[str, int]] = {}
+    lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def table_name(cls) -> str:
+        return "CacheVersions"
+
+    @classmethod
+    def table_definition(cls) -> str:
+        return f'''{PermissionCache.table_name()} (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        '''
+
+    @classmethod
+    def create_version_triggers(cls, cursor: Cursor) -> None:
+        cursor.execute(f"INSERT OR IGNORE INTO {PermissionCache.table_name()} (name, version) VALUES (?, 0)",
+                       (PermissionCache.access_version_name,))
+        for table_name in [UserRecord.table_name(), ProfileRecord.table_name()]:
+            for event in ["INSERT", "UPDATE", "DELETE"]:
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table_name}AccessVersionAfter{event.capitalize()} "
+                               f"AFTER {event} ON {table_name} BEGIN "
+                               f"UPDATE {PermissionCache.table_name()} SET version = version + 1 "
+                               f"WHERE name = '{PermissionCache.access_version_name}'; END")
+
+    @classmethod
+    def read_version(cls, cursor: Cursor) -> int:
+        cursor.execute(f"SELECT version FROM {PermissionCache.table_name()} WHERE name = ?",
+                       (PermissionCache.access_version_name,))
+        row = cursor.fetchone()
+        return int(row[0]) if row is not None else 0
+
+    @classmethod
+    def permissions_for(cls, cursor: Cursor, db_name: str, user: User) -> UserPermissions:
+        version = PermissionCache.read_version(cursor)
+        user_id = str(user.id)
+        with PermissionCache.lock:
+            if PermissionCache.cached_versions.get(db_name) != version:
+                PermissionCache.all_permissions[db_name] = {}
+                PermissionCache.cached_versions[db_name] = version
+            permissions = PermissionCache.all_permissions[db_name].get(user_id)
+        if permissions is not None:
+            return permissions
+        permissions = PermissionCache.compile(cursor, user)
+        # Uncommitted changes of an open transaction may still be rolled back, only cache committed state
+        if not cursor.connection.in_transaction:
+            with PermissionCache.lock:
+                if PermissionCache.cached_versions.get(db_name) == version:
+                    PermissionCache.all_permissions[db_name][user_id] = permissions
+        return permissions
+
+    @classmethod
+    def compile(cls, cursor: Cursor, user: User) -> UserPermissions:
+        """
+        Reads the access rules of the user's profiles and combines their AccessType bits, row predicates and hidden
+        fields per object type.
+        """
+        profile_ids: List[str] = [str(profile_id) for profile_id in user.profile_ids.object_ids] \
+            if user.profile_ids is not None else []
+        access_masks: Dict[str, int] = {}
+        rules_predicates: Dict[str, List[List[RowPredicate]]] = {}
+        rules_hidden_fields: Dict[str, List[List[str]]] = {}
+        if profile_ids:
+            placeholders = ", ".join(["?"] * len(profile_ids))
+            cursor.execute(f"SELECT id, access_rules FROM {ProfileRecord.table_name()} WHERE id IN ({placeholders})",
+                           profile_ids)
+            rows = cursor.fetchall()
+            if len(rows) < len(set(profile_ids)):
+                logger.warning(f'User "{user.username}" has profiles that do not exist')
+            for row in rows:
+                for access_rule in json.loads(row[1] or "[]"):
+                    object_type_name = access_rule["data_object_type"]
+                    access_type = AccessType.from_str(access_rule["access_type"])
+                    access_masks[object_type_name] = access_masks.get(object_type_name, 0) | access_type.value
+                    rules_predicates.setdefault(object_type_name, []).append(
+                        [RowPredicate(**row_predicate) for row_predicate in access_rule.get("row_predicates") or []])
+                    rules_hidden_fields.setdefault(object_type_name, []).append(access_rule.get("hidden_fields") or [])
+        row_filters: Dict[str, RowFilter] = {}
+        for (object_type_name, predicates) in rules_predicates.items():
+            row_filter = RowFilter.compile(object_type_name, predicates, str(user.id))
+            if row_filter is not None:
+                row_filters[object_type_name] = row_filter
+        projections: Dict[str, FieldProjection] = {}
+        for (object_type_name, hidden_fields) in rules_hidden_fields.items():
+            projection = FieldProjection.compile(object_type_name, hidden_fields)
+            if projection is not None:
+                projections[object_type_name] = projection
+        logger.debug(f'Compiled permissions of user "{user.username}": {access_masks}, row filters: {row_filters}, '
+                     f'projections: {projections}')
+        return UserPermissions(user_id=str(user.id), access_masks=access_masks, row_filters=row_filters,
+                               projections=projections)
+
+    @classmethod
+    def reset_all(cls, db_name: str) -> None:
+        with PermissionCache.lock:
+            PermissionCache.all_permissions.pop(db_name, None)
+            PermissionCache.cached_versions.pop(db_name, None)
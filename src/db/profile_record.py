@@ -3,12 +3,13 @@ import logging
 import time
 import uuid
 from sqlite3 import Cursor, Connection
-from typing import Dict, Any, List
+from typing import Dict, List
 
 from pydantic import BaseModel
 
 from src.core.access.access_rule import AccessRule
 from src.core.access.profile import Profile
+from src.db.record_codec import RecordCodec
 
 logging.basicConfig()
 logger = logging.getLogger("ProfileRecord")
@@ -42,8 +43,10 @@ class ProfileRecord(BaseModel):
         '''
 
     @classmethod
-    def table_fields(cls) -> str:
-        return f'id, name, access_rules, created_at, updated_at, commit_at, object_type_name'
+    def table_indexes(cls) -> [str]:
+        return [
+            f"CREATE INDEX IF NOT EXISTS idx_profiles_created_at_id ON {ProfileRecord.table_name()} (created_at, id)"
+        ]
 
     @classmethod
     def from_json_to_list(cls, profiles_json_str: str, all_profiles: List[Profile]) -> List[Profile]:
@@ -67,15 +70,7 @@ class ProfileRecord(BaseModel):
 
     @classmethod
     def from_db_row(cls, row: Dict) -> "ProfileRecord":
-        return ProfileRecord(
-            id=row["id"],
-            name=row["name"],
-            access_rules=row.get("access_rules", ""),
-            created_at=float(row["created_at"]),
-            updated_at=float(row["updated_at"]),
-            commit_at=float(row["commit_at"]),
-            object_type_name=row["object_type_name"]
-        )
+        return RecordCodec.for_record_class(ProfileRecord).decode(row)
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -88,38 +83,15 @@ class ProfileRecord(BaseModel):
     def insert_to_db(self, conn: Connection, cursor: Cursor) -> None:
         now = time.time()
         self.commit_at = now
-        query = f"INSERT INTO {ProfileRecord.table_name()} ({ProfileRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.name, self.access_rules, self.created_at, self.updated_at, self.commit_at,
-             self.object_type_name)
-        )
+        RecordCodec.for_record_class(ProfileRecord).insert(cursor, self)
         conn.commit()
 
     def insert_or_replace_to_db(self, conn: Connection, cursor: Cursor):
         now = time.time()
         self.commit_at = now
-        query = f"INSERT OR REPLACE INTO {ProfileRecord.table_name()} ({ProfileRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.name, self.access_rules, self.created_at, self.updated_at, self.commit_at,
-             self.object_type_name)
-        )
+        RecordCodec.for_record_class(ProfileRecord).insert(cursor, self, replace=True)
         conn.commit()
 
-    def read_from_db_row(self, row: Dict[str, Any]):
-        self.id = str(row["id"])
-        self.name = row["name"]
-        self.access_rules = json.dumps([access_rule.to_json_dict() for access_rule in row.get("access_rules", [])])
-        self.created_at = float(row["created_at"])
-        self.updated_at = float(row["updated_at"])
-        self.commit_at = float(row["commit_at"])
-        self.object_type_name = row["object_type_name"]
-
     def read_from_object(self, obj: Profile) -> None:
         self.id = str(obj.id)
         self.name = obj.name
@@ -0,0 +1,126 @@
+import logging
+import re
+import threading
+from sqlite3 import Cursor
+from typing import Any, ClassVar, Dict, Sequence, Set, Tuple
+
+logging.basicConfig()
+logger = logging.getLogger("QueryTemplates")
+logger.setLevel(logging.DEBUG)
+
+
+class QueryTemplates:
+    """
+    Fixed SQL texts for the generic table operations of Database, with every value passed as a bound parameter.
+    The same operation on the same table always produces the identical SQL string, so each pooled connection parses
+    it once and afterwards reuses the prepared statement from its statement cache (sqlite3 cached_statements).
+    Table and column names cannot be bound, they are checked to be plain identifiers instead.
+    """
+    identifier_pattern: ClassVar[re.Pattern] = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+    all_templates: ClassVar[Dict[Tuple, str]] = {}
+    # Statements seen per raw connection, a statement run again on the same connection counts as a cache hit. This
+    # only estimates sqlite3's own statement cache, which evicts statements and also holds non-template statements
+    seen_statements: ClassVar[Dict[int, Set[str]]] = {}
+    statement_cache_hits: ClassVar[int] = 0
+    statement_cache_misses: ClassVar[int] = 0
+    lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def identifier(cls, name: str) -> str:
+        if not QueryTemplates.identifier_pattern.match(name):
+            raise ValueError(f'Invalid table or column name "{name}"')
+        return name
+
+    @classmethod
+    def select_list(cls, columns: Tuple[str, ...]) -> str:
+        return ", ".join(QueryTemplates.identifier(column) for column in columns) if columns else "*"
+
+    @classmethod
+    def select_by_id(cls, table_name: str, row_filter: str = "", columns: Tuple[str, ...] = ()) -> str:
+        # Bound parameters: the id, then the parameters of the access row filter
+        key = ("select_by_id", table_name, row_filter, columns)
+        query = QueryTemplates.all_templates.get(key)
+        if query is None:
+            query = f"SELECT {QueryTemplates.select_list(columns)} FROM {QueryTemplates.identifier(table_name)} " \
+                    f"WHERE id = ?"
+            if row_filter:
+                query = f"{query} AND {row_filter}"
+            QueryTemplates.all_templates[key] = query
+        return query
+
+    @classmethod
+    def select_ids_in(cls, table_name: str, id_count: int, row_filter: str = "") -> str:
+        # Bound parameters: id_count ids, then the parameters of the access row filter
+        key = ("select_ids_in", table_name, id_count, row_filter)
+        query = QueryTemplates.all_templates.get(key)
+        if query is None:
+            query = f"SELECT id FROM {QueryTemplates.identifier(table_name)} " \
+                    f"WHERE id IN ({', '.join(['?'] * id_count)})"
+            if row_filter:
+                query = f"{query} AND {row_filter}"
+            QueryTemplates.all_templates[key] = query
+        return query
+
+    @classmethod
+    def select_rows(cls, table_name: str, filter_columns: Tuple[str, ...] = (), after: bool = False,
+                    ordered: bool = False, limit: bool = False, row_filter: str = "",
+                    columns: Tuple[str, ...] = ()) -> str:
+        """
+        SELECT of the given columns, or *, with equality filters on the given filter columns, in this order of bound
+        parameters:
+        the filter values, the parameters of the access row filter, created_at and id of the page cursor if `after`,
+        then the limit if `limit`.
+        The row filter is the SQL of a RowFilter, compiled from access rules, never from request input.
+        """
+        key = ("select_rows", table_name, filter_columns, after, ordered, limit, row_filter, columns)
+        query = QueryTemplates.all_templates.get(key)
+        if query is None:
+            query = f"SELECT {QueryTemplates.select_list(columns)} FROM {QueryTemplates.identifier(table_name)}"
+            conditions = [f"{QueryTemplates.identifier(column)} = ?" for column in filter_columns]
+            if row_filter:
+                conditions.append(row_filter)
+            if after:
+                conditions.append("(created_at, id) > (?, ?)")
+            if conditions:
+                query = f"{query} WHERE {' AND '.join(conditions)}"
+            if ordered or after or limit:
+                query = f"{query} ORDER BY created_at, id"
+            if limit:
+                query = f"{query} LIMIT ?"
+            QueryTemplates.all_templates[key] = query
+        return query
+
+    @classmethod
+    def execute(cls, cursor: Cursor, query: str, params: Sequence[Any] = ()) -> Cursor:
+        """
+        Runs a template query and counts estimated statement cache hits per connection.
+        """
+        with QueryTemplates.lock:
+            seen = QueryTemplates.seen_statements.setdefault(id(cursor.connection), set())
+            if query in seen:
+                QueryTemplates.statement_cache_hits += 1
+            else:
+                seen.add(query)
+                QueryTemplates.statement_cache_misses += 1
+        logger.debug(f'Running SQL query "{query}" with parameters {list(params)}')
+        return cursor.execute(query, params)
+
+    @classmethod
+    def statement_cache_stats(cls) -> Dict[str, Any]:
+        """
+        Estimated statement cache hits and misses of template queries: a template run again on the same connection
+        counts as a hit, even if sqlite3 evicted it from its cache in between. Not sqlite3's measured hit rate.
+        """
+        with QueryTemplates.lock:
+            hits = QueryTemplates.statement_cache_hits
+            misses = QueryTemplates.statement_cache_misses
+            templates = len(QueryTemplates.all_templates)
+        total = hits + misses
+        return {"estimated_hits": hits, "estimated_misses": misses,
+                "estimated_hit_rate": round(hits / total, 4) if total else 0.0, "templates": templates}
+
+    @classmethod
+    def forget_connection(cls, conn: Any) -> None:
+        # A closed connection takes its statement cache with it
+        with QueryTemplates.lock:
+            QueryTemplates.seen_statements.pop(id(conn), None)
@@ -0,0 +1,74 @@
+import logging
+import operator
+import threading
+from sqlite3 import Cursor
+from typing import Any, Callable, ClassVar, Dict, Mapping, Tuple
+
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+
+logging.basicConfig()
+logger = logging.getLogger("RecordCodec")
+logger.setLevel(logging.DEBUG)
+
+
+class RecordCodec(BaseModel):
+    """
+    The columns of a record class, its insert statements and its row codec, all built once from the fields of the
+    record model. A field of the record model is a column of its table, so a new column only needs the field and the
+    table definition (and a schema migration for existing databases).
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    record_class: type
+    table_name: str
+    columns: Tuple[str, ...]
+    insert_query: str
+    insert_or_replace_query: str
+    _column_values: Callable[[Any], Any] = PrivateAttr()
+    all_codecs: ClassVar[Dict[type, "RecordCodec"]] = {}
+    all_codecs_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._column_values = operator.attrgetter(*self.columns)
+
+    @classmethod
+    def for_record_class(cls, record_class: type) -> "RecordCodec":
+        """
+        Returns the codec of the record class, built once per process.
+        """
+        codec = RecordCodec.all_codecs.get(record_class)
+        if codec is None:
+            with RecordCodec.all_codecs_lock:
+                codec = RecordCodec.all_codecs.get(record_class)
+                if codec is None:
+                    codec = RecordCodec.from_record_class(record_class)
+                    RecordCodec.all_codecs[record_class] = codec
+        return codec
+
+    @classmethod
+    def from_record_class(cls, record_class: type) -> "RecordCodec":
+        table_name = record_class.table_name()
+        columns = tuple(record_class.model_fields)
+        column_list = ", ".join(columns)
+        values = ", ".join(["?"] * len(columns))
+        return RecordCodec(record_class=record_class,
+                           table_name=table_name,
+                           columns=columns,
+                           insert_query=f"INSERT INTO {table_name} ({column_list}) VALUES ({values})",
+                           insert_or_replace_query=f"INSERT OR REPLACE INTO {table_name} ({column_list}) "
+                                                   f"VALUES ({values})")
+
+    def encode(self, record: Any) -> tuple:
+        # Column values in `columns` order
+        values = self._column_values(record)
+        return values if isinstance(values, tuple) else (values,)
+
+    def decode(self, row: Mapping[str, Any]) -> Any:
+        # Columns missing from the row, e.g. in import data, take the defaults of the record model
+        row_columns = row.keys()
+        return self.record_class(**{column: row[column] for column in self.columns if column in row_columns})
+
+    def insert(self, cursor: Cursor, record: Any, replace: bool = False) -> None:
+        query = self.insert_or_replace_query if replace else self.insert_query
+        logger.debug(f'Running SQL query "{query}"')
+        cursor.execute(query, self.encode(record))
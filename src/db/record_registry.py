@@ -0,0 +1,94 @@
+import logging
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
+
+from src.db.account_record import AccountRecord
+from src.db.case_comment_record import CaseCommentRecord
+from src.db.case_record import CaseRecord
+from src.db.profile_record import ProfileRecord
+from src.db.record_codec import RecordCodec
+from src.db.user_record import UserRecord
+from src.db.workflow_record import WorkflowRecord
+from src.db.workflow_step_record import WorkflowStepRecord
+from src.db.workflow_trigger_record import WorkflowTriggerRecord
+
+logging.basicConfig()
+logger = logging.getLogger("RecordRegistry")
+logger.setLevel(logging.DEBUG)
+
+
+class RecordType(BaseModel):
+    """
+    Everything the database layer needs to store one object type: its record class, table, columns, the prebuilt
+    insert statements and the row codec (decode a database row into a record, encode a record into column values).
+    The columns, statements and codec are those of the RecordCodec of the record class, which its own inserts use too.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    object_type_name: str
+    record_class: type
+    table_name: str
+    columns: Tuple[str, ...]
+    insert_query: str
+    insert_or_replace_query: str
+    decode: Callable[[Any], Any]
+    encode: Callable[[Any], tuple]
+
+    @classmethod
+    def from_record_class(cls, object_type_name: str, record_class: type) -> "RecordType":
+        codec = RecordCodec.for_record_class(record_class)
+        return RecordType(object_type_name=object_type_name,
+                          record_class=record_class,
+                          table_name=codec.table_name,
+                          columns=codec.columns,
+                          insert_query=codec.insert_query,
+                          insert_or_replace_query=codec.insert_or_replace_query,
+                          decode=codec.decode,
+                          encode=codec.encode)
+
+    def table_definition(self) -> str:
+        return self.record_class.table_definition()
+
+    def table_indexes(self) -> List[str]:
+        return self.record_class.table_indexes()
+
+
+class RecordRegistry:
+    """
+    All stored object types, keyed by object type name. A new object type only needs a record class and a
+    register() call below, Database looks everything else up here.
+    """
+    all_record_types: ClassVar[Dict[str, RecordType]] = {}
+    record_types_by_class: ClassVar[Dict[type, RecordType]] = {}
+
+    @classmethod
+    def register(cls, object_type_name: str, record_class: type) -> RecordType:
+        record_type = RecordType.from_record_class(object_type_name, record_class)
+        RecordRegistry.all_record_types[object_type_name] = record_type
+        RecordRegistry.record_types_by_class[record_class] = record_type
+        return record_type
+
+    @classmethod
+    def for_object_type(cls, object_type_name: str) -> Optional[RecordType]:
+        record_type = RecordRegistry.all_record_types.get(object_type_name)
+        if record_type is None:
+            logger.error(f'Unexpected object type "{object_type_name}".')
+        return record_type
+
+    @classmethod
+    def for_record_class(cls, record_class: type) -> Optional[RecordType]:
+        return RecordRegistry.record_types_by_class.get(record_class)
+
+    @classmethod
+    def record_types(cls) -> List[RecordType]:
+        return list(RecordRegistry.all_record_types.values())
+
+
+RecordRegistry.register("Account", AccountRecord)
+RecordRegistry.register("Case", CaseRecord)
+RecordRegistry.register("CaseComment", CaseCommentRecord)
+RecordRegistry.register("User", UserRecord)
+RecordRegistry.register("Profile", ProfileRecord)
+RecordRegistry.register("Workflow", WorkflowRecord)
+RecordRegistry.register("WorkflowStep", WorkflowStepRecord)
+RecordRegistry.register("WorkflowTrigger", WorkflowTriggerRecord)
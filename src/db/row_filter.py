@@ -0,0 +1,62 @@
+import logging
+from typing import Any, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from src.core.access.row_predicate import RowPredicate
+from src.db.record_registry import RecordRegistry
+
+logging.basicConfig()
+logger = logging.getLogger("RowFilter")
+logger.setLevel(logging.DEBUG)
+
+
+class RowFilter(BaseModel):
+    """
+    SQL condition with bound parameters selecting the rows of one table a user may access, compiled from the row
+    predicates of the user's access rules. Columns are qualified with the table name, so the condition also works in
+    joins. Predicates on indexed reference columns (owner_object_id, account_object_id, ...) are index lookups.
+    """
+    sql: str
+    params: Tuple[Any, ...] = ()
+
+    @classmethod
+    def compile(cls, object_type_name: str, rules_predicates: List[List[RowPredicate]],
+                user_id: str) -> Optional["RowFilter"]:
+        """
+        Rows accessible through any of the rules, each rule given by its predicates that all have to hold.
+        Returns None when a rule without predicates makes every row accessible.
+        """
+        if not rules_predicates or any(not predicates for predicates in rules_predicates):
+            return None
+        rule_conditions: List[str] = []
+        params: List[Any] = []
+        for predicates in rules_predicates:
+            conditions: List[str] = []
+            for row_predicate in predicates:
+                condition = RowFilter.compile_predicate(object_type_name, row_predicate, user_id, params)
+                conditions.append(condition)
+            rule_conditions.append(f"({' AND '.join(conditions)})")
+        return RowFilter(sql=f"({' OR '.join(rule_conditions)})", params=tuple(params))
+
+    @classmethod
+    def compile_predicate(cls, object_type_name: str, row_predicate: RowPredicate, user_id: str,
+                          params: List[Any]) -> str:
+        value = user_id if row_predicate.value == RowPredicate.USER_ID else row_predicate.value
+        record_type = RecordRegistry.for_object_type(object_type_name)
+        if record_type is None or row_predicate.column not in record_type.columns:
+            logger.error(f'Row predicate on unknown column "{row_predicate.column}" of "{object_type_name}", '
+                         f'no rows are accessible through it')
+            return "0"
+        column = f"{record_type.table_name}.{row_predicate.column}"
+        if row_predicate.through_object_type is None:
+            params.append(value)
+            return f"{column} = ?"
+        through_record_type = RecordRegistry.for_object_type(row_predicate.through_object_type)
+        if through_record_type is None or row_predicate.through_column not in through_record_type.columns:
+            logger.error(f'Row predicate on unknown column "{row_predicate.through_column}" of '
+                         f'"{row_predicate.through_object_type}", no rows are accessible through it')
+            return "0"
+        params.append(value)
+        return f"{column} IN (SELECT id FROM {through_record_type.table_name} " \
+               f"WHERE {through_record_type.table_name}.{row_predicate.through_column} = ?)"
@@ -0,0 +1,101 @@
+import logging
+from sqlite3 import Connection, Cursor
+from typing import Callable, List, Tuple
+
+from src.db.account_record import AccountRecord
+from src.db.case_comment_record import CaseCommentRecord
+from src.db.case_record import CaseRecord
+from src.db.full_text_search import FullTextSearch
+from src.db.sequence_allocator import SequenceAllocator
+
+logging.basicConfig()
+logger = logging.getLogger("SchemaMigrations")
+logger.setLevel(logging.DEBUG)
+
+
+class SchemaMigrations:
+    """
+    Ordered schema migrations for databases created by older versions.
+    The applied version is tracked in PRAGMA user_version. Every migration is idempotent, because fresh databases
+    already get the latest table definitions before the migrations run.
+    """
+
+    @classmethod
+    def all_migrations(cls) -> List[Tuple[int, str, Callable[[Connection, Cursor], None]]]:
+        return [
+            (1, "Typed reference id columns for cases, case comments and accounts",
+             SchemaMigrations.migrate_typed_reference_columns),
+            (2, "Case and account number sequences", SchemaMigrations.migrate_number_sequences),
+            (3, "Per-case comment number counters", SchemaMigrations.migrate_case_comment_counters),
+            (4, "Full text search indexes for cases and case comments", SchemaMigrations.migrate_full_text_search),
+        ]
+
+    @classmethod
+    def latest_version(cls) -> int:
+        return max(version for (version, _, _) in SchemaMigrations.all_migrations())
+
+    @classmethod
+    def read_version(cls, cursor: Cursor) -> int:
+        cursor.execute("PRAGMA user_version")
+        return int(cursor.fetchone()[0])
+
+    @classmethod
+    def migrate(cls, conn: Connection, cursor: Cursor) -> None:
+        current_version = SchemaMigrations.read_version(cursor)
+        for (version, description, migration) in SchemaMigrations.all_migrations():
+            if version <= current_version:
+                continue
+            logger.info(f'Applying schema migration {version}: "{description}"')
+            migration(conn, cursor)
+            # PRAGMA does not accept bound parameters, version is always an int from the list above
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+            current_version = version
+
+    @classmethod
+    def column_exists(cls, cursor: Cursor, table_name: str, column_name: str) -> bool:
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        return any(row["name"] == column_name for row in cursor.fetchall())
+
+    @classmethod
+    def add_column_if_missing(cls, cursor: Cursor, table_name: str, column_name: str, column_definition: str) -> None:
+        if not SchemaMigrations.column_exists(cursor, table_name, column_name):
+            logger.info(f'Adding column "{column_name}" to table "{table_name}"')
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_definition}")
+
+    @classmethod
+    def backfill_reference_column(cls, cursor: Cursor, table_name: str, column_name: str,
+                                  reference_column_name: str) -> None:
+        # Copy the referenced id out of the ObjectReference JSON string
+        cursor.execute(f"UPDATE {table_name} SET {column_name} = json_extract({reference_column_name}, '$.object_id') "
+                       f"WHERE {column_name} IS NULL")
+        logger.info(f'Backfilled {cursor.rowcount} rows of "{table_name}.{column_name}"')
+
+    @classmethod
+    def migrate_typed_reference_columns(cls, conn: Connection, cursor: Cursor) -> None:
+        for (table_name, column_name, reference_column_name) in [
+            (CaseRecord.table_name(), "owner_object_id", "owner_id"),
+            (CaseRecord.table_name(), "account_object_id", "account_id"),
+            (CaseCommentRecord.table_name(), "owner_object_id", "owner_id"),
+            (CaseCommentRecord.table_name(), "case_object_id", "case_id"),
+            (AccountRecord.table_name(), "owner_object_id", "owner_id"),
+        ]:
+            SchemaMigrations.add_column_if_missing(cursor, table_name, column_name, "TEXT")
+            SchemaMigrations.backfill_reference_column(cursor, table_name, column_name, reference_column_name)
+
+    @classmethod
+    def migrate_number_sequences(cls, conn: Connection, cursor: Cursor) -> None:
+        # The last full scan of the number columns, later numbers come from the Sequences table
+        SequenceAllocator.seed(cursor, CaseRecord.number_sequence_name(), CaseRecord.get_last_case_number_query())
+        SequenceAllocator.seed(cursor, AccountRecord.number_sequence_name(),
+                               AccountRecord.get_last_account_number_query())
+
+    @classmethod
+    def migrate_case_comment_counters(cls, conn: Connection, cursor: Cursor) -> None:
+        cursor.execute(CaseCommentRecord.get_backfill_case_comment_counters_query())
+        logger.info(f'Backfilled {cursor.rowcount} rows of "{CaseCommentRecord.counter_table_name()}"')
+
+    @classmethod
+    def migrate_full_text_search(cls, conn: Connection, cursor: Cursor) -> None:
+        # The search indexes and their triggers already exist, index the rows written before them
+        FullTextSearch.rebuild_all(cursor)
@@ -0,0 +1,42 @@
+import base64
+import binascii
+import json
+import logging
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+logging.basicConfig()
+logger = logging.getLogger("SearchCursor")
+logger.setLevel(logging.DEBUG)
+
+
+class SearchCursor(BaseModel):
+    """
+    Keyset pagination position in ranked search hits: the (rank, id) pair of the last hit of a page.
+    Handed to API clients as an opaque url-safe token, like PageCursor.
+    """
+    rank: float
+    id: str
+
+    @classmethod
+    def from_db_row(cls, row: Any) -> "SearchCursor":
+        return SearchCursor(rank=float(row["rank"]), id=str(row["id"]))
+
+    @classmethod
+    def from_token(cls, token: Optional[str]) -> Optional["SearchCursor"]:
+        """
+        Decodes a token created by to_token. Raises ValueError for malformed tokens.
+        """
+        if token is None or token == "":
+            return None
+        try:
+            padded_token = token + "=" * (-len(token) % 4)
+            [rank, object_id] = json.loads(base64.urlsafe_b64decode(padded_token.encode("ascii")))
+            return SearchCursor(rank=float(rank), id=str(object_id))
+        except (ValueError, TypeError, binascii.Error) as e:
+            raise ValueError(f'Invalid search cursor "{token}"') from e
+
+    def to_token(self) -> str:
+        payload = json.dumps([self.rank, self.id], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("ascii")).decode("ascii").rstrip("=")
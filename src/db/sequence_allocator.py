@@ -0,0 +1,132 @@
+import logging
+import sqlite3
+import threading
+from sqlite3 import Connection, Cursor
+from typing import ClassVar, Dict, Tuple
+
+from pydantic import BaseModel, PrivateAttr
+
+from src.db.connection_pool import ConnectionPool
+from src.db.unit_of_work import UnitOfWork
+
+logging.basicConfig()
+logger = logging.getLogger("SequenceAllocator")
+logger.setLevel(logging.DEBUG)
+
+
+class SequenceAllocator(BaseModel):
+    """
+    Hands out increasing numbers for a named sequence, such as case and account numbers.
+    Numbers are reserved from the Sequences table in blocks of `block_size` (hi/lo), with a single atomic UPDATE that
+    is committed right away, so several server processes never hand out the same number. Numbers of a block that is
+    not used up before the process exits are skipped, never reused.
+    """
+    db_name: str
+    sequence_name: str
+    block_size: int = 50
+    _next_value: int = PrivateAttr(default=0)
+    _high_value: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    all_allocators: ClassVar[Dict[Tuple[str, str], "SequenceAllocator"]] = {}
+    all_allocators_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def table_name(cls) -> str:
+        return "Sequences"
+
+    @classmethod
+    def table_definition(cls) -> str:
+        return f"{SequenceAllocator.table_name()} (name TEXT PRIMARY KEY, next_value INTEGER NOT NULL)"
+
+    @classmethod
+    def for_sequence(cls, db_name: str, sequence_name: str, block_size: int = 50) -> "SequenceAllocator":
+        """
+        Returns the allocator shared by the whole process for the given database file and sequence.
+        """
+        with SequenceAllocator.all_allocators_lock:
+            allocator = SequenceAllocator.all_allocators.get((db_name, sequence_name))
+            if allocator is None:
+                allocator = SequenceAllocator(db_name=db_name, sequence_name=sequence_name, block_size=block_size)
+                SequenceAllocator.all_allocators[(db_name, sequence_name)] = allocator
+            return allocator
+
+    @classmethod
+    def reset_all(cls, db_name: str) -> None:
+        # Drops the reserved blocks, for example after the database file was deleted
+        with SequenceAllocator.all_allocators_lock:
+            for allocator in SequenceAllocator.all_allocators.values():
+                if allocator.db_name == db_name:
+                    with allocator._lock:
+                        allocator._next_value = 0
+                        allocator._high_value = 0
+
+    @classmethod
+    def seed(cls, cursor: Cursor, sequence_name: str, max_query: str) -> None:
+        """
+        Creates the sequence row if missing, continuing after the value returned by max_query.
+        """
+        cursor.execute(f"INSERT OR IGNORE INTO {SequenceAllocator.table_name()} (name, next_value) "
+                       f"SELECT ?, COALESCE(({max_query}), 0) + 1", (sequence_name,))
+
+    @classmethod
+    def advance_past(cls, cursor: Cursor, sequence_name: str, value: int) -> None:
+        """
+        Makes sure the sequence never hands out `value` or anything below it again.
+        Used when records arrive with numbers already assigned, for example from a bulk import.
+        """
+        cursor.execute(f"INSERT INTO {SequenceAllocator.table_name()} (name, next_value) VALUES (?, ?) "
+                       f"ON CONFLICT(name) DO UPDATE SET next_value = MAX(next_value, excluded.next_value)",
+                       (sequence_name, int(value) + 1))
+
+    @classmethod
+    def reserve(cls, cursor: Cursor, sequence_name: str, count: int) -> int:
+        """
+        Reserves `count` numbers of a sequence on the connection of the cursor and returns the first one.
+        """
+        query = f"UPDATE {SequenceAllocator.table_name()} SET next_value = next_value + ? WHERE name = ? " \
+                f"RETURNING next_value"
+        cursor.execute(query, (count, sequence_name))
+        row = cursor.fetchone()
+        if row is None:
+            SequenceAllocator.advance_past(cursor, sequence_name, 0)
+            cursor.execute(query, (count, sequence_name))
+            row = cursor.fetchone()
+        return int(row[0]) - count
+
+    def reserve_block(self) -> None:
+        pooled_conn = ConnectionPool.for_database(self.db_name).acquire()
+        try:
+            cursor = pooled_conn.cursor()
+            first_value = SequenceAllocator.reserve(cursor, self.sequence_name, self.block_size)
+            pooled_conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f'Error reserving numbers for sequence "{self.sequence_name}": {e}')
+            raise
+        finally:
+            pooled_conn.close()
+        self._next_value = first_value
+        self._high_value = first_value + self.block_size
+        logger.debug(f'Reserved "{self.sequence_name}" numbers {self._next_value} to {self._high_value - 1}')
+
+    def next_value(self) -> int:
+        unit_of_work = UnitOfWork.current(self.db_name)
+        if unit_of_work is not None and unit_of_work.pooled_connection.in_transaction:
+            # The unit of work already holds the write lock, a second connection would wait for it forever.
+            # Reserve a single number inside the unit of work instead, it is given back if the work is rolled back.
+            return SequenceAllocator.reserve(unit_of_work.connection.cursor(), self.sequence_name, 1)
+        with self._lock:
+            if self._next_value >= self._high_value:
+                self.reserve_block()
+            value = self._next_value
+            self._next_value += 1
+            return value
+
+    def next_value_for_insert(self, conn: Connection, cursor: Cursor) -> int:
+        """
+        Next number for a row about to be inserted on `conn`. If that connection already holds the write lock, the
+        number is reserved on it instead of from a block, because reserving a block on a second connection would wait
+        for that lock. Writers that hold the lock take their numbers ahead, see CaseRecord.reserve_case_number.
+        """
+        if conn.in_transaction:
+            return SequenceAllocator.reserve(cursor, self.sequence_name, 1)
+        return self.next_value()
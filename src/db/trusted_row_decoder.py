@@ -0,0 +1,82 @@
+import logging
+import threading
+from typing import Any, ClassVar, Dict, List, Sequence, Tuple
+
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+
+logging.basicConfig()
+logger = logging.getLogger("TrustedRowDecoder")
+logger.setLevel(logging.DEBUG)
+
+
+class TrustedRowDecoder(BaseModel):
+    """
+    Builds records or API records straight from plain tuple rows of our own tables, with model_construct instead of
+    validation, and without the intermediate live object.
+    Only for rows written by this application: the columns already have the field types (TEXT for str fields,
+    FLOAT for float fields), so the only conversion left is float() for numbers SQLite returns as int.
+    Rows with a NULL in a required field are decoded through the validating from_db_row instead, when all fields are
+    selected. With some columns left out by a field projection, the values hold only the selected fields.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    target_class: type
+    columns: Tuple[str, ...]
+    # (field name, column position, is float) in model field order
+    _field_positions: List[Tuple[str, int, bool]] = PrivateAttr(default_factory=list)
+    _required_positions: List[int] = PrivateAttr(default_factory=list)
+    _all_fields_selected: bool = PrivateAttr(default=True)
+    all_decoders: ClassVar[Dict[Tuple[type, Tuple[str, ...]], "TrustedRowDecoder"]] = {}
+    all_decoders_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        column_positions = {column: position for (position, column) in enumerate(self.columns)}
+        for (field_name, field_info) in self.target_class.model_fields.items():
+            position = column_positions.get(field_name)
+            if position is None:
+                if field_info.is_required():
+                    self._all_fields_selected = False
+                continue
+            self._field_positions.append((field_name, position, field_info.annotation is float))
+            if field_info.is_required():
+                self._required_positions.append(position)
+
+    @classmethod
+    def for_columns(cls, target_class: type, columns: Sequence[str]) -> "TrustedRowDecoder":
+        """
+        Returns the decoder for the given model class and result columns, built once per process.
+        """
+        key = (target_class, tuple(columns))
+        decoder = TrustedRowDecoder.all_decoders.get(key)
+        if decoder is None:
+            with TrustedRowDecoder.all_decoders_lock:
+                decoder = TrustedRowDecoder.all_decoders.get(key)
+                if decoder is None:
+                    decoder = TrustedRowDecoder(target_class=target_class, columns=tuple(columns))
+                    TrustedRowDecoder.all_decoders[key] = decoder
+        return decoder
+
+    def decode_values(self, row: Sequence[Any]) -> Dict[str, Any]:
+        """
+        Field values of one row, as the target model would hold them, for serializing without building the model.
+        """
+        for position in self._required_positions:
+            if row[position] is None and self._all_fields_selected:
+                logger.warning(f'NULL in required column "{self.columns[position]}", validating the row instead')
+                return self.target_class.from_db_row(dict(zip(self.columns, row))).model_dump()
+        values: Dict[str, Any] = {}
+        for (field_name, position, is_float) in self._field_positions:
+            value = row[position]
+            if is_float:
+                value = float(value) if value is not None else 0.0
+            values[field_name] = value
+        return values
+
+    def decode(self, row: Sequence[Any]) -> Any:
+        return self.target_class.model_construct(**self.decode_values(row))
+
+    def decode_all(self, rows: Sequence[Sequence[Any]]) -> List[Any]:
+        return [self.decode(row) for row in rows]
+
+    def decode_all_values(self, rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+        return [self.decode_values(row) for row in rows]
@@ -0,0 +1,78 @@
+import logging
+from sqlite3 import Connection
+from typing import ClassVar, Dict, Any, List
+
+from pydantic import BaseModel
+
+logging.basicConfig()
+logger = logging.getLogger("TuningProfile")
+logger.setLevel(logging.DEBUG)
+
+
+class TuningProfile(BaseModel):
+    """
+    Named set of SQLite pragmas applied to every new database connection.
+    """
+    name: str
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    busy_timeout_ms: int = 5000
+    mmap_size: int = 0
+    # Negative values are in KiB, positive values in pages, same as PRAGMA cache_size
+    cache_size: int = -2000
+    temp_store: str = "DEFAULT"
+    all_profile_names: ClassVar[List[str]] = ["durable", "balanced", "throughput"]
+
+    @classmethod
+    def durable(cls) -> "TuningProfile":
+        # Every commit is synced to disk, WAL only removes reader/writer blocking
+        return TuningProfile(name="durable", journal_mode="WAL", synchronous="FULL", busy_timeout_ms=5000,
+                             mmap_size=0, cache_size=-2000, temp_store="DEFAULT")
+
+    @classmethod
+    def balanced(cls) -> "TuningProfile":
+        # WAL with NORMAL sync never corrupts the database, but the last commits may be lost on power failure
+        return TuningProfile(name="balanced", journal_mode="WAL", synchronous="NORMAL", busy_timeout_ms=5000,
+                             mmap_size=128 * 1024 * 1024, cache_size=-16000, temp_store="MEMORY")
+
+    @classmethod
+    def throughput(cls) -> "TuningProfile":
+        # No syncing at all, only for bulk loads and disposable databases
+        return TuningProfile(name="throughput", journal_mode="WAL", synchronous="OFF", busy_timeout_ms=10000,
+                             mmap_size=512 * 1024 * 1024, cache_size=-64000, temp_store="MEMORY")
+
+    @classmethod
+    def from_name(cls, name: str) -> "TuningProfile":
+        if name == "durable":
+            return TuningProfile.durable()
+        elif name == "balanced":
+            return TuningProfile.balanced()
+        elif name == "throughput":
+            return TuningProfile.throughput()
+        raise ValueError(f'Unknown database tuning profile "{name}", expected one of '
+                         f'{TuningProfile.all_profile_names}')
+
+    def pragma_statements(self) -> List[str]:
+        return [
+            f"PRAGMA journal_mode={self.journal_mode}",
+            f"PRAGMA synchronous={self.synchronous}",
+            f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}",
+            f"PRAGMA mmap_size={int(self.mmap_size)}",
+            f"PRAGMA cache_size={int(self.cache_size)}",
+            f"PRAGMA temp_store={self.temp_store}",
+        ]
+
+    def apply(self, conn: Connection) -> None:
+        for statement in self.pragma_statements():
+            conn.execute(statement).fetchall()
+
+    @classmethod
+    def read_active_settings(cls, conn: Connection) -> Dict[str, Any]:
+        """
+        Reads back the pragma values in effect on the given connection.
+        """
+        settings: Dict[str, Any] = {}
+        for pragma in ["journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "temp_store"]:
+            row = conn.execute(f"PRAGMA {pragma}").fetchone()
+            settings[pragma] = row[0] if row is not None else None
+        return settings
@@ -0,0 +1,137 @@
+import logging
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlite3 import Cursor
+from typing import Callable, Iterator, List, Optional
+
+from src.db.connection_pool import PooledConnection
+
+logging.basicConfig()
+logger = logging.getLogger("UnitOfWork")
+logger.setLevel(logging.DEBUG)
+
+
+class TransactionConnection:
+    """
+    Connection handle given out inside a unit of work.
+    Behaves like the pooled connection, except that commit() and close() are deferred to the end of the unit of work,
+    so record classes calling conn.commit() after every insert all end up in the same transaction.
+    """
+
+    def __init__(self, unit_of_work: "UnitOfWork"):
+        self._unit_of_work = unit_of_work
+
+    def __getattr__(self, name: str):
+        return getattr(self._unit_of_work.pooled_connection, name)
+
+    def cursor(self, *args, **kwargs) -> Cursor:
+        return self._unit_of_work.pooled_connection.cursor(*args, **kwargs)
+
+    def commit(self) -> None:
+        self._unit_of_work.deferred_commit_count += 1
+
+    def rollback(self) -> None:
+        # A rollback anywhere inside the unit of work discards all of it, or all of the innermost savepoint
+        if self._unit_of_work.savepoints:
+            self._unit_of_work.rollback_to_savepoint()
+            return
+        self._unit_of_work.rollback_only = True
+        self._unit_of_work.pooled_connection.rollback()
+
+    def close(self) -> None:
+        # The connection goes back to the pool when the unit of work ends
+        pass
+
+
+class UnitOfWork:
+    """
+    Buffers all writes to one database made within a `with Database.transaction()` block, including writes from
+    nested Database instances for the same file, and commits them once at the end.
+    The active unit of work is tracked per thread and per asyncio task with a context variable.
+    Work that may only start once the writes are committed, like triggered workflows, is registered with after_commit().
+    """
+    current_unit_of_work: ContextVar[Optional["UnitOfWork"]] = ContextVar("current_unit_of_work", default=None)
+
+    def __init__(self, db_name: str, pooled_connection: PooledConnection):
+        self.db_name = db_name
+        self.pooled_connection = pooled_connection
+        self.connection = TransactionConnection(self)
+        self.deferred_commit_count: int = 0
+        self.rollback_only: bool = False
+        # Names of the open savepoints, innermost last
+        self.savepoints: List[str] = []
+        # Run once the unit of work is committed, dropped if the writes they belong to are rolled back
+        self.after_commit_hooks: List[Callable[[], None]] = []
+        # Number of after commit hooks when each open savepoint was started
+        self.savepoint_hook_counts: List[int] = []
+
+    @classmethod
+    def current(cls, db_name: str) -> Optional["UnitOfWork"]:
+        unit_of_work = UnitOfWork.current_unit_of_work.get()
+        if unit_of_work is not None and unit_of_work.db_name == db_name:
+            return unit_of_work
+        return None
+
+    def after_commit(self, hook: Callable[[], None]) -> None:
+        self.after_commit_hooks.append(hook)
+
+    @contextmanager
+    def savepoint(self) -> Iterator[None]:
+        """
+        Nested scope inside the unit of work: an exception, or a conn.rollback(), inside the block discards only the
+        writes made inside the block, the rest of the unit of work carries on.
+        """
+        name = f"unit_of_work_{len(self.savepoints)}"
+        self.pooled_connection.execute(f"SAVEPOINT {name}")
+        self.savepoints.append(name)
+        self.savepoint_hook_counts.append(len(self.after_commit_hooks))
+        try:
+            yield
+        except BaseException:
+            self.rollback_to_savepoint()
+            raise
+        finally:
+            self.savepoints.pop()
+            self.savepoint_hook_counts.pop()
+            if self.pooled_connection.in_transaction:
+                self.pooled_connection.execute(f"RELEASE {name}")
+
+    def rollback_to_savepoint(self) -> None:
+        name = self.savepoints[-1]
+        del self.after_commit_hooks[self.savepoint_hook_counts[-1]:]
+        if not self.pooled_connection.in_transaction:
+            # SQLite already rolled back the whole transaction on a severe error
+            self.rollback_only = True
+            return
+        self.pooled_connection.execute(f"ROLLBACK TO {name}")
+        logger.debug(f'Rolled back savepoint "{name}" of unit of work on "{self.db_name}"')
+
+    def commit(self) -> None:
+        if self.rollback_only:
+            logger.warning(f'Unit of work on "{self.db_name}" was rolled back, nothing to commit')
+            return
+        try:
+            self.pooled_connection.commit()
+        except sqlite3.Error as e:
+            logger.error(f'Error committing unit of work on "{self.db_name}": {e}')
+            self.pooled_connection.rollback()
+            raise
+        logger.debug(f'Committed unit of work on "{self.db_name}" replacing {self.deferred_commit_count} commits')
+        hooks = self.after_commit_hooks
+        self.after_commit_hooks = []
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                # The writes are committed, a failing hook must not turn them into an error
+                logger.error(f'Error in after commit hook of unit of work on "{self.db_name}": {e}')
+
+    def rollback(self) -> None:
+        self.rollback_only = True
+        self.after_commit_hooks = []
+        try:
+            self.pooled_connection.rollback()
+        except sqlite3.Error as e:
+            logger.error(f'Error rolling back unit of work on "{self.db_name}": {e}')
+        logger.debug(f'Rolled back unit of work on "{self.db_name}"')
@@ -0,0 +1,58 @@
+import logging
+import threading
+from sqlite3 import Cursor
+from typing import ClassVar, Dict, Optional
+
+from src.core.access.user import User
+from src.db.permission_cache import PermissionCache
+from src.db.query_templates import QueryTemplates
+from src.db.user_record import UserRecord
+
+logging.basicConfig()
+logger = logging.getLogger("UserCache")
+logger.setLevel(logging.DEBUG)
+
+
+class UserCache:
+    """
+    Users by username per database, read through the unique username index and kept until Users or Profiles change.
+    Shares the access version of PermissionCache, so adding a user or changing their profiles is seen at once, also
+    when another process makes the change. Unknown usernames are not cached, so at most one entry per user is kept.
+    """
+    all_users: ClassVar[Dict[str, Dict[str, Optional[User]]]] = {}
+    cached_versions: ClassVar[Dict[str, int]] = {}
+    lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def user_by_username(cls, cursor: Cursor, db_name: str, username: str) -> Optional[User]:
+        version = PermissionCache.read_version(cursor)
+        with UserCache.lock:
+            if UserCache.cached_versions.get(db_name) != version:
+                UserCache.all_users[db_name] = {}
+                UserCache.cached_versions[db_name] = version
+            users = UserCache.all_users[db_name]
+            if username in users:
+                return users[username]
+        user = UserCache.read_user(cursor, username)
+        # Uncommitted changes of an open transaction may still be rolled back, only cache committed state
+        if user is not None and not cursor.connection.in_transaction:
+            with UserCache.lock:
+                if UserCache.cached_versions.get(db_name) == version:
+                    UserCache.all_users[db_name][username] = user
+        return user
+
+    @classmethod
+    def read_user(cls, cursor: Cursor, username: str) -> Optional[User]:
+        # Usernames are UNIQUE, this is a lookup in the index of that constraint
+        query = QueryTemplates.select_rows(UserRecord.table_name(), ("username",))
+        QueryTemplates.execute(cursor, query, [username])
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return UserRecord.from_db_row(dict(row)).convert_to_object()
+
+    @classmethod
+    def reset_all(cls, db_name: str) -> None:
+        with UserCache.lock:
+            UserCache.all_users.pop(db_name, None)
+            UserCache.cached_versions.pop(db_name, None)
@@ -2,12 +2,13 @@ import logging
 import time
 import uuid
 from sqlite3 import Cursor, Connection
-from typing import Dict, Any
+from typing import Dict
 
 from pydantic import BaseModel
 
 from src.core.access.user import User
 from src.core.reference.object_reference_list import ObjectReferenceList
+from src.db.record_codec import RecordCodec
 
 logging.basicConfig()
 logger = logging.getLogger("UserRecord")
@@ -45,8 +46,10 @@ class UserRecord(BaseModel):
         '''
 
     @classmethod
-    def table_fields(cls) -> str:
-        return f'id, username, fullname, password_hash, profile_ids, created_at, updated_at, commit_at, object_type_name'
+    def table_indexes(cls) -> [str]:
+        return [
+            f"CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON {UserRecord.table_name()} (created_at, id)"
+        ]
 
     @classmethod
     def from_object(cls, obj: User) -> "UserRecord":
@@ -67,17 +70,7 @@ class UserRecord(BaseModel):
 
     @classmethod
     def from_db_row(cls, row: Dict) -> "UserRecord":
-        return UserRecord(
-            id=row["id"],
-            username=row["username"],
-            fullname=row["fullname"],
-            password_hash=row["password_hash"],
-            profile_ids=row.get("profile_ids", ""),
-            created_at=float(row["created_at"]),
-            updated_at=float(row["updated_at"]),
-            commit_at=float(row["commit_at"]),
-            object_type_name=row["object_type_name"]
-        )
+        return RecordCodec.for_record_class(UserRecord).decode(row)
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -90,40 +83,15 @@ class UserRecord(BaseModel):
     def insert_to_db(self, conn: Connection, cursor: Cursor) -> None:
         now = time.time()
         self.commit_at = now
-        query = f"INSERT INTO {UserRecord.table_name()} ({UserRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.username, self.fullname, self.password_hash, self.profile_ids, self.created_at, self.updated_at,
-             self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(UserRecord).insert(cursor, self)
         conn.commit()
 
     def insert_or_replace_to_db(self, conn: Connection, cursor: Cursor):
         now = time.time()
         self.commit_at = now
-        query = f"INSERT OR REPLACE INTO {UserRecord.table_name()} ({UserRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.username, self.fullname, self.password_hash, self.profile_ids, self.created_at, self.updated_at,
-             self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(UserRecord).insert(cursor, self, replace=True)
         conn.commit()
 
-    def read_from_db_row(self, row: Dict[str, Any]) -> None:
-        self.id = str(row["id"])
-        self.username = row["username"]
-        self.fullname = row["fullname"]
-        self.password_hash = row["password_hash"]
-        self.profile_ids = row.get("profile_ids", "")
-        self.created_at = float(row["created_at"])
-        self.updated_at = float(row["updated_at"])
-        self.commit_at = float(row["commit_at"])
-        self.object_type_name = row["object_type_name"]
-
     def read_from_object(self, obj: User) -> None:
         profile_ids = "{}"
         if obj.profile_ids is not None:
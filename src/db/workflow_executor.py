@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+import uuid
+from sqlite3 import Connection, Cursor
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+
+from src.core.base.data_object import DataObject
+from src.core.eventbus.workflow_trigger import WorkflowTrigger
+from src.db.database import Database
+from src.db.record_registry import RecordRegistry
+from src.db.unit_of_work import UnitOfWork
+from src.db.workflow_run_queue import WorkflowRun, WorkflowRunQueue
+
+logging.basicConfig()
+logger = logging.getLogger("WorkflowExecutor")
+logger.setLevel(logging.DEBUG)
+
+
+class WorkflowExecutor(BaseModel):
+    """
+    Runs triggered workflows in the background, so creating an object returns as soon as it is stored.
+    An event queues one run per matching (trigger, workflow) in WorkflowRunQueue, in the unit of work that stores the
+    sender object, and wakes the workers once that unit of work commits. Queued runs survive a restart of the process.
+    `max_concurrency` worker threads claim due runs. Workflow steps run outside of any unit of work and commit their
+    own writes one by one, so no step holds the write lock while it waits on a mail server or an HTTP call.
+    Runs are at-least-once: a run that fails, or whose worker stops, is run again from its first step, including the
+    steps that already wrote or sent something. Workflow steps should be safe to repeat.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    db: Database
+    max_concurrency: int = 4
+    # Longest wait for new runs, also picks up runs queued by other processes
+    poll_interval_seconds: float = 1.0
+    completed_runs: int = 0
+    failed_attempts: int = 0
+    _threads: List[threading.Thread] = PrivateAttr(default_factory=list)
+    _wake_up: threading.Condition = PrivateAttr(default_factory=threading.Condition)
+    _stopping: bool = PrivateAttr(default=False)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        for number in range(self.max_concurrency):
+            thread = threading.Thread(target=self.run_worker, name=f"workflow-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f'Workflow executor for "{self.db.db_name}" started, up to {self.max_concurrency} runs at once')
+
+    def install(self) -> None:
+        """
+        Makes this executor run all triggered workflows from now on, see WorkflowTrigger.dispatch_event.
+        """
+        WorkflowTrigger.event_dispatcher = self.dispatch_event
+
+    def dispatch_event(self, workflow_trigger_object_type_name: str, workflow_trigger_event_type: str,
+                       sender_object: DataObject) -> None:
+        matching = WorkflowTrigger.matching_workflows(workflow_trigger_object_type_name, workflow_trigger_event_type)
+        if not matching:
+            return
+        # Joins the unit of work storing the sender object, if there is one
+        with self.db.transaction() as [conn, cursor]:
+            for (workflow_trigger, workflow) in matching:
+                WorkflowRunQueue.enqueue(cursor, str(workflow_trigger.id), str(workflow.id),
+                                         workflow_trigger_object_type_name, str(sender_object.id))
+            UnitOfWork.current(self.db.db_name).after_commit(self.wake_up)
+
+    def wake_up(self) -> None:
+        with self._wake_up:
+            self._wake_up.notify_all()
+
+    def run_worker(self) -> None:
+        while not self._stopping:
+            wait_seconds = self.poll_interval_seconds
+            try:
+                workflow_run = self.claim()
+                if workflow_run is not None:
+                    self.run_workflow_run(workflow_run)
+                    continue
+                wait_seconds = self.seconds_until_due()
+            except Exception as e:
+                logger.error(f'Error taking workflow runs from "{self.db.db_name}": {e}')
+            with self._wake_up:
+                if not self._stopping:
+                    self._wake_up.wait(wait_seconds)
+
+    def claim(self) -> Optional[WorkflowRun]:
+        [conn, cursor] = self.db.connect()
+        try:
+            workflow_run = WorkflowRunQueue.claim(cursor)
+            conn.commit()
+            return workflow_run
+        finally:
+            conn.close()
+
+    def seconds_until_due(self) -> float:
+        [conn, cursor] = self.db.connect()
+        try:
+            next_due_at = WorkflowRunQueue.next_due_at(cursor)
+        finally:
+            conn.close()
+        if next_due_at is None:
+            return self.poll_interval_seconds
+        return min(self.poll_interval_seconds, max(0.0, next_due_at - time.time()))
+
+    def run_workflow_run(self, workflow_run: WorkflowRun) -> None:
+        try:
+            if workflow_run.attempts > workflow_run.max_attempts:
+                raise RuntimeError(f"Lease ran out {workflow_run.attempts} times, the worker stopped every time")
+            dispatch_index = WorkflowTrigger.dispatch_index
+            workflow_trigger = dispatch_index.triggers_by_id.get(workflow_run.workflow_trigger_id)
+            if workflow_trigger is None:
+                raise LookupError(f'No workflow trigger of id "{workflow_run.workflow_trigger_id}"')
+            workflow = dispatch_index.workflows_by_id.get(workflow_run.workflow_id)
+            if workflow is None:
+                raise LookupError(f'No workflow of id "{workflow_run.workflow_id}" for the trigger')
+            [conn, cursor] = self.db.connect()
+            try:
+                sender_object = self.read_sender_object(conn, cursor, workflow_run)
+            finally:
+                conn.close()
+            workflow.run_workflow(sender_object, workflow_trigger)
+            with self.db.transaction() as [conn, cursor]:
+                WorkflowRunQueue.complete(cursor, workflow_run)
+            with self._wake_up:
+                self.completed_runs += 1
+        except Exception as e:
+            with self.db.transaction() as [conn, cursor]:
+                state = WorkflowRunQueue.fail(cursor, workflow_run, str(e))
+            with self._wake_up:
+                self.failed_attempts += 1
+            logger.error(f'Workflow run "{workflow_run.id}" failed on attempt {workflow_run.attempts} of '
+                         f'{workflow_run.max_attempts}, now {state}: {e}')
+
+    def read_sender_object(self, conn: Connection, cursor: Cursor, workflow_run: WorkflowRun) -> DataObject:
+        record_type = RecordRegistry.for_object_type(workflow_run.sender_object_type_name)
+        if record_type is None:
+            raise LookupError(f'Unknown sender object type "{workflow_run.sender_object_type_name}"')
+        rows = self.db.get_table_row(conn, cursor, record_type.table_name, uuid.UUID(workflow_run.sender_object_id))
+        if not rows:
+            raise LookupError(f'No {workflow_run.sender_object_type_name} of id "{workflow_run.sender_object_id}"')
+        return record_type.decode(rows[0]).convert_to_object()
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until no run is running or due, runs waiting for a retry do not count.
+        Returns False if the timeout passed first.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            [conn, cursor] = self.db.connect()
+            try:
+                if WorkflowRunQueue.count_due_or_running(cursor) == 0:
+                    return True
+            finally:
+                conn.close()
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    def shutdown(self) -> None:
+        """
+        Stops the workers after their current run. Runs still queued are picked up again after the next start.
+        """
+        if WorkflowTrigger.event_dispatcher == self.dispatch_event:
+            WorkflowTrigger.event_dispatcher = None
+        with self._wake_up:
+            self._stopping = True
+            self._wake_up.notify_all()
+        for thread in self._threads:
+            thread.join()
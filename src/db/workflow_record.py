@@ -2,13 +2,14 @@ import logging
 import time
 import uuid
 from sqlite3 import Cursor, Connection
-from typing import Dict, Any
+from typing import Dict
 
 from pydantic import BaseModel
 
 from src.core.eventbus.workflow import Workflow
 from src.core.reference.object_reference import ObjectReference
 from src.core.reference.object_reference_list import ObjectReferenceList
+from src.db.record_codec import RecordCodec
 
 logging.basicConfig()
 logger = logging.getLogger("WorkflowRecord")
@@ -44,8 +45,11 @@ class WorkflowRecord(BaseModel):
         '''
 
     @classmethod
-    def table_fields(cls) -> str:
-        return f'id, owner_id, workflow_name, workflow_step_ids, created_at, updated_at, commit_at, object_type_name'
+    def table_indexes(cls) -> [str]:
+        return [
+            f"CREATE INDEX IF NOT EXISTS idx_workflows_created_at_id ON {WorkflowRecord.table_name()} "
+            f"(created_at, id)"
+        ]
 
     @classmethod
     def from_object(cls, obj: Workflow) -> "WorkflowRecord":
@@ -65,16 +69,7 @@ class WorkflowRecord(BaseModel):
 
     @classmethod
     def from_db_row(cls, row: Dict) -> "WorkflowRecord":
-        return WorkflowRecord(
-            id=row["id"],
-            owner_id=row["owner_id"],
-            workflow_name=row["workflow_name"],
-            workflow_step_ids=row.get("workflow_step_ids", ""),
-            created_at=float(row["created_at"]),
-            updated_at=float(row["updated_at"]),
-            commit_at=float(row["commit_at"]),
-            object_type_name=row["object_type_name"]
-        )
+        return RecordCodec.for_record_class(WorkflowRecord).decode(row)
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -87,39 +82,15 @@ class WorkflowRecord(BaseModel):
     def insert_to_db(self, conn: Connection, cursor: Cursor) -> None:
         now = time.time()
         self.commit_at = now
-        query = f"INSERT INTO {WorkflowRecord.table_name()} ({WorkflowRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.owner_id, self.workflow_name, self.workflow_step_ids, self.created_at, self.updated_at,
-             self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(WorkflowRecord).insert(cursor, self)
         conn.commit()
 
     def insert_or_replace_to_db(self, conn: Connection, cursor: Cursor):
         now = time.time()
         self.commit_at = now
-        query = f"INSERT OR REPLACE INTO {WorkflowRecord.table_name()} ({WorkflowRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.owner_id, self.workflow_name, self.workflow_step_ids, self.created_at, self.updated_at,
-             self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(WorkflowRecord).insert(cursor, self, replace=True)
         conn.commit()
 
-    def read_from_db_row(self, row: Dict[str, Any]) -> None:
-        self.id = str(row["id"])
-        self.owner_id = str(row["owner_id"])
-        self.workflow_name = row["workflow_name"]
-        self.workflow_step_ids = row.get("workflow_step_ids", "")
-        self.created_at = float(row["created_at"])
-        self.updated_at = float(row["updated_at"])
-        self.commit_at = float(row["commit_at"])
-        self.object_type_name = row["object_type_name"]
-
     def read_from_object(self, obj: Workflow) -> None:
         workflow_step_ids = "{}"
         if obj.profile_ids is not None:
@@ -0,0 +1,189 @@
+import logging
+import time
+import uuid
+from sqlite3 import Cursor
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+logging.basicConfig()
+logger = logging.getLogger("WorkflowRunQueue")
+logger.setLevel(logging.DEBUG)
+
+
+class WorkflowRun(BaseModel):
+    """
+    One queued run of a workflow for the event of a sender object, as stored in the WorkflowRuns table.
+    """
+    id: str
+    workflow_trigger_id: str
+    workflow_id: str
+    sender_object_type_name: str
+    sender_object_id: str
+    state: str
+    attempts: int = 0
+    max_attempts: int
+    # When the run is due, or for a running run, when its lease runs out
+    next_run_at: float
+    last_error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+    @classmethod
+    def from_db_row(cls, row: Dict[str, Any]) -> "WorkflowRun":
+        return WorkflowRun(**row)
+
+
+class WorkflowRunQueue:
+    """
+    Durable queue of workflow runs in the WorkflowRuns table.
+    Runs are inserted in the transaction that stores the sender object, so no event is lost or run for an object that
+    was rolled back. Workers, in this or any other process, claim a due run with one atomic UPDATE that also leases it
+    for `lease_seconds`. A run whose worker died with it is claimed again when the lease runs out.
+    Runs are therefore at-least-once, and completing or failing a run only counts for the attempt that holds the lease.
+    Failed runs are retried with exponential backoff, after `max_attempts` they are parked in the dead state until
+    they are retried by hand.
+    """
+    PENDING: ClassVar[str] = "pending"
+    RUNNING: ClassVar[str] = "running"
+    DONE: ClassVar[str] = "done"
+    DEAD: ClassVar[str] = "dead"
+    all_states: ClassVar[Tuple[str, ...]] = (PENDING, RUNNING, DONE, DEAD)
+    max_attempts: ClassVar[int] = 5
+    base_backoff_seconds: ClassVar[float] = 1.0
+    max_backoff_seconds: ClassVar[float] = 300.0
+    lease_seconds: ClassVar[float] = 300.0
+
+    @classmethod
+    def table_name(cls) -> str:
+        return "WorkflowRuns"
+
+    @classmethod
+    def table_definition(cls) -> str:
+        return f'''{WorkflowRunQueue.table_name()} (
+                id TEXT PRIMARY KEY,
+                workflow_trigger_id TEXT NOT NULL,
+                workflow_id TEXT NOT NULL,
+                sender_object_type_name TEXT NOT NULL,
+                sender_object_id TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                max_attempts INTEGER NOT NULL,
+                next_run_at FLOAT NOT NULL,
+                last_error TEXT,
+                created_at FLOAT NOT NULL,
+                updated_at FLOAT NOT NULL
+            )
+        '''
+
+    @classmethod
+    def table_indexes(cls) -> List[str]:
+        return [
+            # Finding the next due run, and listing the runs of one state
+            f"CREATE INDEX IF NOT EXISTS idx_workflow_runs_state_next_run_at ON {WorkflowRunQueue.table_name()} "
+            f"(state, next_run_at)"
+        ]
+
+    @classmethod
+    def enqueue(cls, cursor: Cursor, workflow_trigger_id: str, workflow_id: str, sender_object_type_name: str,
+                sender_object_id: str) -> str:
+        now = time.time()
+        run_id = str(uuid.uuid4())
+        cursor.execute(f"INSERT INTO {WorkflowRunQueue.table_name()} (id, workflow_trigger_id, workflow_id, "
+                       f"sender_object_type_name, sender_object_id, state, attempts, max_attempts, next_run_at, "
+                       f"created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?)",
+                       (run_id, workflow_trigger_id, workflow_id, sender_object_type_name, sender_object_id,
+                        WorkflowRunQueue.PENDING, WorkflowRunQueue.max_attempts, now, now, now))
+        return run_id
+
+    @classmethod
+    def claim(cls, cursor: Cursor) -> Optional[WorkflowRun]:
+        """
+        Takes the run that is due first, or None. The caller commits right away, so other workers see the lease.
+        """
+        now = time.time()
+        cursor.execute(f"UPDATE {WorkflowRunQueue.table_name()} SET state = ?, attempts = attempts + 1, "
+                       f"next_run_at = ?, updated_at = ? "
+                       f"WHERE id = (SELECT id FROM {WorkflowRunQueue.table_name()} "
+                       f"WHERE state IN (?, ?) AND next_run_at <= ? ORDER BY next_run_at LIMIT 1) RETURNING *",
+                       (WorkflowRunQueue.RUNNING, now + WorkflowRunQueue.lease_seconds, now,
+                        WorkflowRunQueue.PENDING, WorkflowRunQueue.RUNNING, now))
+        row = cursor.fetchone()
+        return WorkflowRun.from_db_row(dict(row)) if row is not None else None
+
+    @classmethod
+    def complete(cls, cursor: Cursor, workflow_run: WorkflowRun) -> bool:
+        """
+        Marks a claimed run done. False if its lease ran out and the run was claimed again meanwhile.
+        """
+        cursor.execute(f"UPDATE {WorkflowRunQueue.table_name()} SET state = ?, last_error = NULL, updated_at = ? "
+                       f"WHERE id = ? AND state = ? AND attempts = ?",
+                       (WorkflowRunQueue.DONE, time.time(), workflow_run.id, WorkflowRunQueue.RUNNING,
+                        workflow_run.attempts))
+        return cursor.rowcount > 0
+
+    @classmethod
+    def fail(cls, cursor: Cursor, workflow_run: WorkflowRun, error: str) -> str:
+        """
+        Schedules the next attempt of a failed run, or parks it as dead. Returns the new state, or the state of the
+        claimed run if its lease ran out meanwhile.
+        """
+        now = time.time()
+        if workflow_run.attempts >= workflow_run.max_attempts:
+            state = WorkflowRunQueue.DEAD
+            next_run_at = now
+        else:
+            state = WorkflowRunQueue.PENDING
+            next_run_at = now + WorkflowRunQueue.backoff_seconds(workflow_run.attempts)
+        cursor.execute(f"UPDATE {WorkflowRunQueue.table_name()} SET state = ?, next_run_at = ?, last_error = ?, "
+                       f"updated_at = ? WHERE id = ? AND state = ? AND attempts = ?",
+                       (state, next_run_at, error, now, workflow_run.id, WorkflowRunQueue.RUNNING,
+                        workflow_run.attempts))
+        return state if cursor.rowcount > 0 else workflow_run.state
+
+    @classmethod
+    def backoff_seconds(cls, attempts: int) -> float:
+        # 1, 2, 4, 8, ... seconds after the first, second, third, ... failed attempt
+        return min(WorkflowRunQueue.max_backoff_seconds, WorkflowRunQueue.base_backoff_seconds * 2 ** (attempts - 1))
+
+    @classmethod
+    def next_due_at(cls, cursor: Cursor) -> Optional[float]:
+        cursor.execute(f"SELECT MIN(next_run_at) FROM {WorkflowRunQueue.table_name()} WHERE state IN (?, ?)",
+                       (WorkflowRunQueue.PENDING, WorkflowRunQueue.RUNNING))
+        row = cursor.fetchone()
+        return float(row[0]) if row is not None and row[0] is not None else None
+
+    @classmethod
+    def count_due_or_running(cls, cursor: Cursor) -> int:
+        cursor.execute(f"SELECT COUNT(*) FROM {WorkflowRunQueue.table_name()} "
+                       f"WHERE state = ? OR (state = ? AND next_run_at <= ?)",
+                       (WorkflowRunQueue.RUNNING, WorkflowRunQueue.PENDING, time.time()))
+        return int(cursor.fetchone()[0])
+
+    @classmethod
+    def list_runs(cls, cursor: Cursor, state: Optional[str], limit: int) -> List[WorkflowRun]:
+        # Most recently changed first
+        if state is None:
+            cursor.execute(f"SELECT * FROM {WorkflowRunQueue.table_name()} ORDER BY updated_at DESC LIMIT ?",
+                           (limit,))
+        else:
+            cursor.execute(f"SELECT * FROM {WorkflowRunQueue.table_name()} WHERE state = ? "
+                           f"ORDER BY updated_at DESC LIMIT ?", (state, limit))
+        return [WorkflowRun.from_db_row(dict(row)) for row in cursor.fetchall()]
+
+    @classmethod
+    def read_run(cls, cursor: Cursor, run_id: str) -> Optional[WorkflowRun]:
+        cursor.execute(f"SELECT * FROM {WorkflowRunQueue.table_name()} WHERE id = ?", (run_id,))
+        row = cursor.fetchone()
+        return WorkflowRun.from_db_row(dict(row)) if row is not None else None
+
+    @classmethod
+    def retry_dead(cls, cursor: Cursor, run_id: str) -> bool:
+        """
+        Puts a dead run back in the queue with a fresh set of attempts. False if there is no dead run of that id.
+        """
+        now = time.time()
+        cursor.execute(f"UPDATE {WorkflowRunQueue.table_name()} SET state = ?, attempts = 0, next_run_at = ?, "
+                       f"updated_at = ? WHERE id = ? AND state = ?",
+                       (WorkflowRunQueue.PENDING, now, now, run_id, WorkflowRunQueue.DEAD))
+        return cursor.rowcount > 0
@@ -2,12 +2,13 @@ import logging
 import time
 import uuid
 from sqlite3 import Cursor, Connection
-from typing import Dict, Any
+from typing import Dict
 
 from pydantic import BaseModel
 
 from src.core.eventbus.workflow_step import WorkflowStep
 from src.core.reference.object_reference import ObjectReference
+from src.db.record_codec import RecordCodec
 
 logging.basicConfig()
 logger = logging.getLogger("WorkflowRecord")
@@ -43,9 +44,11 @@ class WorkflowStepRecord(BaseModel):
         '''
 
     @classmethod
-    def table_fields(cls) -> str:
-        return f'id, owner_id, workflow_step_name, workflow_step_code, created_at, updated_at, commit_at, ' \
-               f'object_type_name'
+    def table_indexes(cls) -> [str]:
+        return [
+            f"CREATE INDEX IF NOT EXISTS idx_workflow_steps_created_at_id ON {WorkflowStepRecord.table_name()} "
+            f"(created_at, id)"
+        ]
 
     @classmethod
     def from_object(cls, obj: WorkflowStep) -> "WorkflowStepRecord":
@@ -63,16 +66,7 @@ class WorkflowStepRecord(BaseModel):
 
     @classmethod
     def from_db_row(cls, row: Dict) -> "WorkflowStepRecord":
-        return WorkflowStepRecord(
-            id=row["id"],
-            owner_id=row["owner_id"],
-            workflow_step_name=row["workflow_step_name"],
-            workflow_step_code=row.get("workflow_step_code", ""),
-            created_at=float(row["created_at"]),
-            updated_at=float(row["updated_at"]),
-            commit_at=float(row["commit_at"]),
-            object_type_name=row["object_type_name"]
-        )
+        return RecordCodec.for_record_class(WorkflowStepRecord).decode(row)
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -85,39 +79,15 @@ class WorkflowStepRecord(BaseModel):
     def insert_to_db(self, conn: Connection, cursor: Cursor) -> None:
         now = time.time()
         self.commit_at = now
-        query = f"INSERT INTO {WorkflowStepRecord.table_name()} ({WorkflowStepRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.owner_id, self.workflow_step_name, self.workflow_step_code, self.created_at, self.updated_at,
-             self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(WorkflowStepRecord).insert(cursor, self)
         conn.commit()
 
     def insert_or_replace_to_db(self, conn: Connection, cursor: Cursor):
         now = time.time()
         self.commit_at = now
-        query = f"INSERT OR REPLACE INTO {WorkflowStepRecord.table_name()} ({WorkflowStepRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.owner_id, self.workflow_step_name, self.workflow_step_code, self.created_at, self.updated_at,
-             self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(WorkflowStepRecord).insert(cursor, self, replace=True)
         conn.commit()
 
-    def read_from_db_row(self, row: Dict[str, Any]) -> None:
-        self.id = str(row["id"])
-        self.owner_id = str(row["owner_id"])
-        self.workflow_step_name = row["workflow_step_name"]
-        self.workflow_step_code = row.get("workflow_step_code", "")
-        self.created_at = float(row["created_at"])
-        self.updated_at = float(row["updated_at"])
-        self.commit_at = float(row["commit_at"])
-        self.object_type_name = row["object_type_name"]
-
     def read_from_object(self, obj: WorkflowStep) -> None:
         self.id = str(obj.id)
         self.owner_id = obj.owner_id.to_json_str()
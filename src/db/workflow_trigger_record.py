@@ -2,12 +2,13 @@ import logging
 import time
 import uuid
 from sqlite3 import Cursor, Connection
-from typing import Dict, Any
+from typing import Dict
 
 from pydantic import BaseModel
 
 from src.core.eventbus.workflow_trigger import WorkflowTrigger
 from src.core.reference.object_reference import ObjectReference
+from src.db.record_codec import RecordCodec
 
 logging.basicConfig()
 logger = logging.getLogger("WorkflowRecord")
@@ -45,9 +46,11 @@ class WorkflowTriggerRecord(BaseModel):
         '''
 
     @classmethod
-    def table_fields(cls) -> str:
-        return f'id, owner_id, workflow_trigger_object_type_name, workflow_trigger_event_type, workflow_to_run_id, ' \
-               f'created_at, updated_at, commit_at, object_type_name'
+    def table_indexes(cls) -> [str]:
+        return [
+            f"CREATE INDEX IF NOT EXISTS idx_workflow_triggers_created_at_id ON {WorkflowTriggerRecord.table_name()} "
+            f"(created_at, id)"
+        ]
 
     @classmethod
     def from_object(cls, obj: WorkflowTrigger) -> "WorkflowTriggerRecord":
@@ -65,17 +68,7 @@ class WorkflowTriggerRecord(BaseModel):
 
     @classmethod
     def from_db_row(cls, row: Dict) -> "WorkflowTriggerRecord":
-        return WorkflowTriggerRecord(
-            id=row["id"],
-            owner_id=row["owner_id"],
-            workflow_trigger_object_type_name=row["workflow_trigger_object_type_name"],
-            workflow_trigger_event_type=row.get("workflow_trigger_event_type", ""),
-            workflow_to_run_id=row.get("workflow_to_run_id", ""),
-            created_at=float(row["created_at"]),
-            updated_at=float(row["updated_at"]),
-            commit_at=float(row["commit_at"]),
-            object_type_name=row["object_type_name"]
-        )
+        return RecordCodec.for_record_class(WorkflowTriggerRecord).decode(row)
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -88,40 +81,15 @@ class WorkflowTriggerRecord(BaseModel):
     def insert_to_db(self, conn: Connection, cursor: Cursor) -> None:
         now = time.time()
         self.commit_at = now
-        query = f"INSERT INTO {WorkflowTriggerRecord.table_name()} ({WorkflowTriggerRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.owner_id, self.workflow_trigger_object_type_name, self.workflow_trigger_event_type,
-             self.workflow_to_run_id, self.created_at, self.updated_at, self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(WorkflowTriggerRecord).insert(cursor, self)
         conn.commit()
 
     def insert_or_replace_to_db(self, conn: Connection, cursor: Cursor):
         now = time.time()
         self.commit_at = now
-        query = f"INSERT OR REPLACE INTO {WorkflowTriggerRecord.table_name()} ({WorkflowTriggerRecord.table_fields()}) " \
-                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
-        logger.debug(f'Running SQL query "{query}"')
-        cursor.execute(
-            query,
-            (self.id, self.owner_id, self.workflow_trigger_object_type_name, self.workflow_trigger_event_type,
-             self.workflow_to_run_id, self.created_at, self.updated_at, self.commit_at, self.object_type_name)
-        )
+        RecordCodec.for_record_class(WorkflowTriggerRecord).insert(cursor, self, replace=True)
         conn.commit()
 
-    def read_from_db_row(self, row: Dict[str, Any]) -> None:
-        self.id = str(row["id"])
-        self.owner_id = str(row["owner_id"])
-        self.workflow_trigger_object_type_name = row["workflow_trigger_object_type_name"]
-        self.workflow_trigger_event_type = row.get("workflow_trigger_event_type", "")
-        self.workflow_to_run_id = row.get("workflow_to_run_id", "")
-        self.created_at = float(row["created_at"])
-        self.updated_at = float(row["updated_at"])
-        self.commit_at = float(row["commit_at"])
-        self.object_type_name = row["object_type_name"]
-
     def read_from_object(self, obj: WorkflowTrigger) -> None:
         self.id = str(obj.id)
         self.owner_id = obj.owner_id.to_json_str()
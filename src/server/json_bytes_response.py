@@ -0,0 +1,35 @@
+import json
+import logging
+from typing import Any
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logging.basicConfig()
+logger = logging.getLogger("JsonBytesResponse")
+logger.setLevel(logging.DEBUG)
+
+
+class JsonBytesResponse(Response):
+    """
+    JSON response for content that already has the shape of the route's response_model, such as field values decoded
+    from our own rows. Returning a Response makes FastAPI skip the response_model validation and serialization,
+    while the route keeps response_model for the OpenAPI schema.
+    Uses orjson when it is installed, the standard json module otherwise.
+    """
+    media_type = "application/json"
+
+    @classmethod
+    def dumps(cls, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return JsonBytesResponse.dumps(content)
@@ -1,10 +1,13 @@
 import logging
+import threading
 import uuid
-from typing import List, Optional
+from sqlite3 import Connection, Cursor
+from typing import List, Optional, Any, Iterator
 
 import uvicorn
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
 from fastapi import Path as FastAPIPath
+from fastapi.responses import StreamingResponse
 from nicegui import ui
 
 from src.api.account_api_record import AccountApiRecord
@@ -14,8 +17,10 @@ from src.api.requests.account_create_request_api_record import AccountCreateRequ
 from src.api.requests.case_comment_create_request_api_record import CaseCommentCreateRequestApiRecord
 from src.api.requests.case_create_request_api_record import CaseCreateRequestApiRecord
 from src.api.requests.workflow_step_update_request_api_record import WorkflowStepUpdateRequestApiRecord
+from src.api.search_hit_api_record import SearchHitApiRecord
 from src.api.user_api_record import UserApiRecord
 from src.api.workflow_api_record import WorkflowApiRecord
+from src.api.workflow_run_api_record import WorkflowRunApiRecord
 from src.api.workflow_step_api_record import WorkflowStepApiRecord
 from src.api.workflow_trigger_api_record import WorkflowTriggerApiRecord
 from src.core.access.user import User
@@ -26,13 +31,20 @@ from src.core.objects.account import Account
 from src.core.objects.case import Case
 from src.core.objects.case_comment import CaseComment
 from src.db.account_record import AccountRecord
+from src.db.async_database import AsyncDatabase
 from src.db.case_comment_record import CaseCommentRecord
 from src.db.case_record import CaseRecord
 from src.db.database import Database
+from src.db.page_cursor import PageCursor
+from src.db.search_cursor import SearchCursor
+from src.db.trusted_row_decoder import TrustedRowDecoder
 from src.db.user_record import UserRecord
+from src.db.workflow_executor import WorkflowExecutor
+from src.db.workflow_run_queue import WorkflowRun, WorkflowRunQueue
 from src.db.workflow_record import WorkflowRecord
 from src.db.workflow_step_record import WorkflowStepRecord
 from src.db.workflow_trigger_record import WorkflowTriggerRecord
+from src.server.json_bytes_response import JsonBytesResponse
 from src.ui import create_case_page, create_case_comment_page, workflow_editor_page, landing_page
 
 logging.basicConfig()
@@ -41,9 +53,24 @@ logger.setLevel(logging.DEBUG)
 
 app = FastAPI()
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Triggered workflows running at the same time, off the request path
+WORKFLOW_CONCURRENCY = 4
+# Database threads of async handlers
+DATABASE_THREADS = 8
+# NDJSON responses streaming at the same time, each holds a connection while it runs, more wait for their turn
+NDJSON_STREAMS = 4
+# Every holder of a connection gets its own: database threads, the group commit writer, workflow workers, streams
+GROUP_COMMIT_WRITERS = 1
+CONNECTION_POOL_SIZE = DATABASE_THREADS + GROUP_COMMIT_WRITERS + WORKFLOW_CONCURRENCY + NDJSON_STREAMS
+
 
 class Server:
     db: Database
+    async_db: AsyncDatabase
+    workflow_executor: WorkflowExecutor
+    ndjson_streams: threading.BoundedSemaphore
 
     def __init__(self):
         logger.info("Initializing server")
@@ -86,232 +113,353 @@ class Server:
 
         self.router.add_api_route("/api/run/workflows/{workflow_id}", self.run_workflow_by_id,
                                   response_model=WorkflowApiRecord, methods=["GET"])
+        # Queued runs of triggered workflows, dead runs can be put back in the queue
+        self.router.add_api_route("/api/workflow_runs", self.get_workflow_runs_api_record,
+                                  response_model=List[WorkflowRunApiRecord], methods=["GET"])
+        self.router.add_api_route("/api/workflow_runs/{workflow_run_id}/retry", self.retry_workflow_run_by_id,
+                                  response_model=WorkflowRunApiRecord, methods=["POST"])
 
         self.router.add_api_route("/api/case", self.create_case, response_model=CaseApiRecord, methods=["POST"])
         self.router.add_api_route("/api/case_comment", self.create_case_comment, response_model=CaseCommentApiRecord,
                                   methods=["POST"])
         self.router.add_api_route("/api/account", self.create_account, response_model=AccountApiRecord,
                                   methods=["POST"])
+        # SEARCH
+        self.router.add_api_route("/api/search", self.search, response_model=List[SearchHitApiRecord], methods=["GET"])
+        # Diagnostics
+        self.router.add_api_route("/api/db/statement_cache", self.get_statement_cache_stats, methods=["GET"])
 
         logger.info(f"Done initializing server with {len(self.router.routes)} API routes defined")
 
     def init_db(self):
         # Connect to database
-        self.db = Database(db_name="database/crm.db")
+        self.db = Database(db_name="database/crm.db", pool_size=CONNECTION_POOL_SIZE, tuning_profile_name="balanced")
         [db_conn, db_cursor] = self.db.connect()
         self.db.init_db_schema(db_conn, db_cursor)
         # Reconnect after init_db_schema closes the db connection
         [db_conn, db_cursor] = self.db.connect()
+        self.db.report_settings(db_conn, db_cursor)
         # Initialize workflow related object from database
         self.db.init_workflows_and_triggers(db_conn, db_cursor)
 
-        # Grab the maximum case number from database
-        # This is synced once per session, rest is incremented in memory per construction
-        Case.last_case_number = self.db.read_max_case_number(db_conn, db_cursor)
-
-        # Grab the maximum account number from database
-        # This is synced once per session, rest is incremented in memory per construction
-        Account.last_account_number = self.db.read_max_account_number(db_conn, db_cursor)
-
-    async def get_cases_api_record(self) -> List[CaseApiRecord]:
-        [db_conn, db_cursor] = self.db.connect()
+        # Case and account numbers come from database sequences, reserved in blocks per server process
+        self.db.init_number_sequences()
+        db_conn.close()
+        # Async handlers run their database work on a thread pool, off the event loop
+        self.async_db = AsyncDatabase(db=self.db, reserved_connections=CONNECTION_POOL_SIZE - DATABASE_THREADS)
+        self.ndjson_streams = threading.BoundedSemaphore(NDJSON_STREAMS)
+        # Create requests return once the object is stored, its triggers are queued with it and run in the background,
+        # outside of the request's unit of work, so they never hold the write lock a create request waits for
+        self.workflow_executor = WorkflowExecutor(db=self.db, max_concurrency=WORKFLOW_CONCURRENCY)
+        self.workflow_executor.install()
+
+    async def get_statement_cache_stats(self) -> dict:
+        return self.db.report_statement_cache()
+
+    @classmethod
+    def parse_page_cursor(cls, after: Optional[str]) -> Optional[PageCursor]:
+        try:
+            return PageCursor.from_token(after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @classmethod
+    def set_next_page_cursor(cls, response: Response, records: List[Any], limit: int) -> None:
+        # A full page means there may be more records after it
+        if records and len(records) >= limit:
+            last_record = records[-1]
+            page_cursor = PageCursor.from_db_row(last_record) if isinstance(last_record, dict) \
+                else PageCursor.from_record(last_record)
+            response.headers["X-Next-Cursor"] = page_cursor.to_token()
+
+    @classmethod
+    def parse_search_cursor(cls, after: Optional[str]) -> Optional[SearchCursor]:
+        try:
+            return SearchCursor.from_token(after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @classmethod
+    def wants_ndjson(cls, request: Request) -> bool:
+        return "application/x-ndjson" in request.headers.get("accept", "")
+
+    def stream_ndjson(self, table_name: str, object_type_str: str, user: Optional[User],
+                      after_cursor: Optional[PageCursor], api_record_class: Any) -> StreamingResponse:
+        """
+        Streams all readable rows of a table as newline delimited JSON, one API record per line.
+        Rows are read in batches on a connection held only while the stream is running, so memory use stays constant.
+        """
+        def ndjson_lines() -> Iterator[bytes]:
+            # Streams take turns on the connections set aside for them, never the ones of the database threads
+            with self.ndjson_streams:
+                [db_conn, db_cursor] = self.db.connect()
+                decoder: Optional[TrustedRowDecoder] = None
+                try:
+                    for row in self.db.iter_readable_rows(db_conn, db_cursor, table_name, object_type_str, user,
+                                                          after_cursor):
+                        if decoder is None:
+                            decoder = TrustedRowDecoder.for_columns(api_record_class, tuple(row.keys()))
+                        yield JsonBytesResponse.dumps(decoder.decode_values(tuple(row.values()))) + b"\n"
+                finally:
+                    db_conn.close()
+
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    async def get_cases_api_record(
+            self,
+            request: Request,
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum records per page"),
+            after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+    ) -> List[CaseApiRecord]:
+        after_cursor: Optional[PageCursor] = Server.parse_page_cursor(after)
         username = "admin"
         user: Optional[User] = await self.get_user(username)
         if user is None:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"User '{username}' not found.")
         else:
-            case_records: List[CaseRecord] = self.db.read_objects(db_conn, db_cursor, CaseRecord.table_name(), "Case",
-                                                                  user)
-            cases: List[Case] = [case_record.convert_to_object() for case_record in case_records]
-            case_api_records: List[CaseApiRecord] = [CaseApiRecord.from_object(_case) for _case in cases]
-            if not case_api_records:
-                db_conn.close()
+            if Server.wants_ndjson(request):
+                return self.stream_ndjson(CaseRecord.table_name(), "Case", user, after_cursor, CaseApiRecord)
+            # Field values straight from our own rows, serialized without building or validating models
+            case_values: List[dict] = await self.async_db.read_trusted_values(
+                CaseRecord.table_name(), "Case", user, CaseApiRecord, limit, after_cursor)
+            if not case_values and after_cursor is None:
                 raise HTTPException(status_code=404, detail=f"No cases found.")
-            db_conn.close()
-            return case_api_records
+            json_response = JsonBytesResponse(case_values)
+            Server.set_next_page_cursor(json_response, case_values, limit)
+            return json_response
 
-    async def get_case_comments_api_record(self) -> List[CaseCommentApiRecord]:
-        [db_conn, db_cursor] = self.db.connect()
+    async def get_case_comments_api_record(
+            self,
+            request: Request,
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum records per page"),
+            after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+    ) -> List[CaseCommentApiRecord]:
+        after_cursor: Optional[PageCursor] = Server.parse_page_cursor(after)
         username = "admin"
         user: Optional[User] = await self.get_user(username)
         if user is None:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"User '{username}' not found.")
         else:
-            case_comment_records: List[CaseCommentRecord] = self.db.read_objects(
-                db_conn, db_cursor, CaseCommentRecord.table_name(), "CaseComment", user)
-            case_comments: List[CaseComment] = \
-                [case_comment_record.convert_to_object() for case_comment_record in case_comment_records]
-            case_comment_api_records: List[CaseCommentApiRecord] = \
-                [CaseCommentApiRecord.from_object(case_comment) for case_comment in case_comments]
-            if not case_comment_api_records:
-                db_conn.close()
+            if Server.wants_ndjson(request):
+                return self.stream_ndjson(CaseCommentRecord.table_name(), "CaseComment", user, after_cursor,
+                                          CaseCommentApiRecord)
+            # Field values straight from our own rows, serialized without building or validating models
+            case_comment_values: List[dict] = await self.async_db.read_trusted_values(
+                CaseCommentRecord.table_name(), "CaseComment", user, CaseCommentApiRecord, limit,
+                after_cursor)
+            if not case_comment_values and after_cursor is None:
                 raise HTTPException(status_code=404, detail=f"No case comments found.")
-            db_conn.close()
-            return case_comment_api_records
+            json_response = JsonBytesResponse(case_comment_values)
+            Server.set_next_page_cursor(json_response, case_comment_values, limit)
+            return json_response
 
     async def create_case(self, create_case_request: CaseCreateRequestApiRecord) -> CaseApiRecord:
-        [db_conn, db_cursor] = self.db.connect()
-        # TODO: Validate existence of owner_id and account_id in the database/live
-        # TODO: Validate user access rules for create case
-        # Create live case object
-        case1: Case = create_case_request.create_case()
-        # Commit to database
-        case_record: CaseRecord = CaseRecord.from_object(case1)
-        case_record.insert_to_db(db_conn, db_cursor)
-        # Get the up-to-date database version of the object into memory object
-        case1 = case_record.convert_to_object()
-        case_api_record: CaseApiRecord = CaseApiRecord.from_object(case1)
-        return case_api_record
+        # The new record and the runs of its triggered workflows are stored in the next group commit. The workflow
+        # executor runs them afterwards, so the response does not wait for the workflow steps.
+        # Numbers come from the block of this process, taken before the group commit, so the write transaction
+        # does not write the sequence
+        case_number: str = await self.async_db.run_blocking(CaseRecord.reserve_case_number)
+
+        def create(db_conn: Connection, db_cursor: Cursor) -> Any:
+            # TODO: Validate existence of owner_id and account_id in the database/live
+            # TODO: Validate user access rules for create case
+            # Create live case object
+            case1: Case = create_case_request.create_case()
+            # Commit to database
+            case_record: CaseRecord = CaseRecord.from_object(case1)
+            case_record.case_number = case_number
+            case_record.insert_to_db(db_conn, db_cursor)
+            # Get the up-to-date database version of the object into memory object
+            case1 = case_record.convert_to_object()
+            case_api_record: CaseApiRecord = CaseApiRecord.from_object(case1)
+            return case_api_record
+
+        return await self.async_db.write(create)
 
     async def create_case_comment(self, create_case_comment_request: CaseCommentCreateRequestApiRecord) -> \
             CaseCommentApiRecord:
-        [db_conn, db_cursor] = self.db.connect()
-        # TODO: Validate existence of owner_id and account_id in the database/live
-        # TODO: Validate user access rules for create case comment
-        # Create live case comment object
-        comment1: CaseComment = create_case_comment_request.create_case_comment()
-        # Commit to database
-        case_comment_record: CaseCommentRecord = CaseCommentRecord.from_object(comment1)
-        case_comment_record.insert_to_db(db_conn, db_cursor)
-        # Get the up-to-date database version of the object into memory object
-        comment1 = case_comment_record.convert_to_object()
-        case_comment_api_record: CaseCommentApiRecord = CaseCommentApiRecord.from_object(comment1)
-        return case_comment_api_record
+        # The new record and the runs of its triggered workflows are stored in the next group commit. The workflow
+        # executor runs them afterwards, so the response does not wait for the workflow steps.
+        def create(db_conn: Connection, db_cursor: Cursor) -> Any:
+            # TODO: Validate existence of owner_id and account_id in the database/live
+            # TODO: Validate user access rules for create case comment
+            # Create live case comment object
+            comment1: CaseComment = create_case_comment_request.create_case_comment()
+            # Commit to database
+            case_comment_record: CaseCommentRecord = CaseCommentRecord.from_object(comment1)
+            case_comment_record.insert_to_db(db_conn, db_cursor)
+            # Get the up-to-date database version of the object into memory object
+            comment1 = case_comment_record.convert_to_object()
+            case_comment_api_record: CaseCommentApiRecord = CaseCommentApiRecord.from_object(comment1)
+            return case_comment_api_record
+
+        return await self.async_db.write(create)
 
     async def create_account(self, create_account_request: AccountCreateRequestApiRecord) -> AccountApiRecord:
-        [db_conn, db_cursor] = self.db.connect()
-        # TODO: Validate existence of owner_id in the database/live
-        # TODO: Validate user access rules for create account
-        # Create live account object
-        account1: Account = create_account_request.create_account()
-        # Commit to databasse
-        account_record: AccountRecord = AccountRecord.from_object(account1)
-        account_record.insert_to_db(db_conn, db_cursor)
-        # Get the up-to-date database version of the object into memory object
-        account1 = account_record.convert_to_object()
-        account_api_record: AccountApiRecord = AccountApiRecord.from_object(account1)
-        return account_api_record
-
-    async def get_accounts_api_record(self) -> List[AccountApiRecord]:
-        [db_conn, db_cursor] = self.db.connect()
+        # The new record and the runs of its triggered workflows are stored in the next group commit. The workflow
+        # executor runs them afterwards, so the response does not wait for the workflow steps.
+        # Numbers come from the block of this process, taken before the group commit, so the write transaction
+        # does not write the sequence
+        account_number: str = await self.async_db.run_blocking(AccountRecord.reserve_account_number)
+
+        def create(db_conn: Connection, db_cursor: Cursor) -> Any:
+            # TODO: Validate existence of owner_id in the database/live
+            # TODO: Validate user access rules for create account
+            # Create live account object
+            account1: Account = create_account_request.create_account()
+            # Commit to databasse
+            account_record: AccountRecord = AccountRecord.from_object(account1)
+            account_record.account_number = account_number
+            account_record.insert_to_db(db_conn, db_cursor)
+            # Get the up-to-date database version of the object into memory object
+            account1 = account_record.convert_to_object()
+            account_api_record: AccountApiRecord = AccountApiRecord.from_object(account1)
+            return account_api_record
+
+        return await self.async_db.write(create)
+
+    async def get_accounts_api_record(
+            self,
+            request: Request,
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum records per page"),
+            after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+    ) -> List[AccountApiRecord]:
+        after_cursor: Optional[PageCursor] = Server.parse_page_cursor(after)
         username = "admin"
         user: Optional[User] = await self.get_user(username)
         if user is None:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"User '{username}' not found.")
         else:
-            account_records: List[AccountRecord] = self.db.read_objects(db_conn, db_cursor, AccountRecord.table_name(),
-                                                                        "Account", user)
-            accounts: List[Account] = [account_record.convert_to_object() for account_record in account_records]
-            account_api_records: List[AccountApiRecord] = [AccountApiRecord.from_object(account) for account in
-                                                           accounts]
-            if not account_api_records:
-                db_conn.close()
+            if Server.wants_ndjson(request):
+                return self.stream_ndjson(AccountRecord.table_name(), "Account", user, after_cursor, AccountApiRecord)
+            # Field values straight from our own rows, serialized without building or validating models
+            account_values: List[dict] = await self.async_db.read_trusted_values(
+                AccountRecord.table_name(), "Account", user, AccountApiRecord, limit, after_cursor)
+            if not account_values and after_cursor is None:
                 raise HTTPException(status_code=404, detail=f"No account found.")
-        db_conn.close()
-        return account_api_records
+            json_response = JsonBytesResponse(account_values)
+            Server.set_next_page_cursor(json_response, account_values, limit)
+        return json_response
 
-    async def get_users_api_record(self) -> List[UserApiRecord]:
-        [db_conn, db_cursor] = self.db.connect()
-        user_records: List[UserRecord] = self.db.read_objects(db_conn, db_cursor, UserRecord.table_name(), "User", None)
+    async def get_users_api_record(
+            self,
+            response: Response,
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum records per page"),
+            after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+    ) -> List[UserApiRecord]:
+        after_cursor: Optional[PageCursor] = Server.parse_page_cursor(after)
+        user_records: List[UserRecord] = await self.async_db.read_objects(UserRecord.table_name(), "User", None, limit,
+                                                                          after_cursor)
         users: List[User] = [user_record.convert_to_object() for user_record in user_records]
         user_api_records: List[UserApiRecord] = [UserApiRecord.from_object(user) for user in users]
-        if not user_api_records:
-            db_conn.close()
+        if not user_api_records and after_cursor is None:
             raise HTTPException(status_code=404, detail=f"No users found.")
-        db_conn.close()
+        Server.set_next_page_cursor(response, user_records, limit)
         return user_api_records
 
     async def get_user(self, username: str) -> Optional[User]:
-        [db_conn, db_cursor] = self.db.connect()
-        user_records: List[UserRecord] = self.db.read_objects(db_conn, db_cursor, UserRecord.table_name(), "User", None)
-        all_profiles = self.db.get_profiles(db_conn, db_cursor)
-        users: List[User] = [user_record.convert_to_object() for user_record in user_records]
-        user = next((u for u in users if u.username == username), None)
-        db_conn.close()
+        # Username index lookup, cached until Users or Profiles change
+        user = await self.async_db.read_user_by_username(username)
         return user
 
-    async def get_workflows_api_record(self) -> List[WorkflowApiRecord]:
-        [db_conn, db_cursor] = self.db.connect()
-        workflow_records: List[WorkflowRecord] = self.db.read_objects(db_conn, db_cursor, WorkflowRecord.table_name(),
-                                                                      "Workflow", None)
+    async def get_workflows_api_record(
+            self,
+            response: Response,
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum records per page"),
+            after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+    ) -> List[WorkflowApiRecord]:
+        after_cursor: Optional[PageCursor] = Server.parse_page_cursor(after)
+        workflow_records: List[WorkflowRecord] = await self.async_db.read_objects(WorkflowRecord.table_name(),
+                                                                                  "Workflow", None, limit,
+                                                                                  after_cursor)
         workflows: List[Workflow] = [workflow_record.convert_to_object() for workflow_record in workflow_records]
         workflow_api_records: List[WorkflowApiRecord] = [WorkflowApiRecord.from_object(workflow) for
                                                          workflow in workflows]
-        if not workflow_api_records:
-            db_conn.close()
+        if not workflow_api_records and after_cursor is None:
             raise HTTPException(status_code=404, detail=f"No workflows found.")
-        db_conn.close()
+        Server.set_next_page_cursor(response, workflow_records, limit)
         return workflow_api_records
 
-    async def get_workflow_steps_api_record(self) -> List[WorkflowStepApiRecord]:
-        [db_conn, db_cursor] = self.db.connect()
-        workflow_step_records: List[WorkflowStepRecord] = self.db.read_objects(db_conn, db_cursor,
-                                                                               WorkflowStepRecord.table_name(),
-                                                                               "WorkflowStep", None)
-        workflow_steps: List[WorkflowStep] = [workflow_step_record.convert_to_object() for workflow_step_record in
-                                              workflow_step_records]
-        workflow_step_api_records: List[WorkflowStepApiRecord] = [WorkflowStepApiRecord.from_object(workflow_step) for
-                                                                  workflow_step in workflow_steps]
-        if not workflow_step_api_records:
-            db_conn.close()
-            raise HTTPException(status_code=404, detail=f"No workflow steps found.")
-        db_conn.close()
-        return workflow_step_api_records
-
-    async def get_workflow_trigger_api_record(self) -> List[WorkflowTriggerApiRecord]:
-        [db_conn, db_cursor] = self.db.connect()
-        workflow_trigger_records: List[WorkflowTriggerRecord] = self.db.read_objects(db_conn, db_cursor,
-                                                                                     WorkflowTriggerRecord.table_name(),
-                                                                                     "WorkflowTrigger", None)
+    async def get_workflow_trigger_api_record(
+            self,
+            response: Response,
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum records per page"),
+            after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+    ) -> List[WorkflowTriggerApiRecord]:
+        after_cursor: Optional[PageCursor] = Server.parse_page_cursor(after)
+        workflow_trigger_records: List[WorkflowTriggerRecord] = await self.async_db.read_objects(
+            WorkflowTriggerRecord.table_name(), "WorkflowTrigger", None, limit, after_cursor)
         workflow_triggers: List[WorkflowTrigger] = [workflow_trigger_record.convert_to_object() for
                                                     workflow_trigger_record in workflow_trigger_records]
         workflow_trigger_api_records: List[WorkflowTriggerApiRecord] = [
             WorkflowTriggerApiRecord.from_object(workflow_trigger) for
             workflow_trigger in
             workflow_triggers]
-        if not workflow_trigger_api_records:
-            db_conn.close()
+        if not workflow_trigger_api_records and after_cursor is None:
             raise HTTPException(status_code=404, detail=f"No workflow triggers found.")
-        db_conn.close()
+        Server.set_next_page_cursor(response, workflow_trigger_records, limit)
         return workflow_trigger_api_records
 
-    async def get_workflow_steps_api_record(self) -> List[WorkflowStepApiRecord]:
-        [db_conn, db_cursor] = self.db.connect()
-        workflow_step_records: List[WorkflowStepRecord] = self.db.read_objects(db_conn, db_cursor,
-                                                                               WorkflowStepRecord.table_name(),
-                                                                               "WorkflowStep", None)
+    async def get_workflow_steps_api_record(
+            self,
+            response: Response,
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum records per page"),
+            after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+    ) -> List[WorkflowStepApiRecord]:
+        after_cursor: Optional[PageCursor] = Server.parse_page_cursor(after)
+        workflow_step_records: List[WorkflowStepRecord] = await self.async_db.read_objects(
+            WorkflowStepRecord.table_name(), "WorkflowStep", None, limit, after_cursor)
         workflow_steps: List[WorkflowStep] = \
             [workflow_step_record.convert_to_object() for workflow_step_record in workflow_step_records]
         workflow_step_api_records: List[WorkflowStepApiRecord] = \
             [WorkflowStepApiRecord.from_object(workflow_step) for workflow_step in workflow_steps]
-        if not workflow_step_api_records:
-            db_conn.close()
+        if not workflow_step_api_records and after_cursor is None:
             raise HTTPException(status_code=404, detail=f"No workflow steps found.")
-        db_conn.close()
+        Server.set_next_page_cursor(response, workflow_step_records, limit)
         return workflow_step_api_records
 
-    async def get_cases_by_username(self, username: str = Query(..., description="Username to filter cases by")) -> \
-            List[CaseApiRecord]:
+    async def get_cases_by_username(
+            self,
+            username: str = Query(..., description="Username to filter cases by"),
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum records per page"),
+            after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+    ) -> List[CaseApiRecord]:
+        after_cursor: Optional[PageCursor] = Server.parse_page_cursor(after)
         user: Optional[User] = await self.get_user(username)
-        [db_conn, db_cursor] = self.db.connect()
         if user is None:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"User '{username}' not found.")
         else:
-            case_records: List[CaseRecord] = self.db.read_objects(db_conn, db_cursor, CaseRecord.table_name(), "Case",
-                                                                  user)
-            cases: List[Case] = [case_record.convert_to_object() for case_record in case_records]
-            case_api_records: List[CaseApiRecord] = [CaseApiRecord.from_object(_case) for _case in cases]
+            # Field values straight from our own rows, serialized without building or validating models
+            case_values: List[dict] = await self.async_db.read_trusted_values(
+                CaseRecord.table_name(), "Case", user, CaseApiRecord, limit, after_cursor)
             # Username based filtering
             # user_cases = [case for case in DUMMY_CASES if case.owner_id == username]
-            if not case_api_records:
-                db_conn.close()
+            if not case_values and after_cursor is None:
                 raise HTTPException(status_code=404, detail=f"No cases found for user '{username}'.")
-            db_conn.close()
-            return case_api_records
+            json_response = JsonBytesResponse(case_values)
+            Server.set_next_page_cursor(json_response, case_values, limit)
+            return json_response
+
+    async def search(
+            self,
+            q: str = Query(..., min_length=1, description="Words to find in case and case comment texts"),
+            username: str = Query(..., description="Username to check access"),
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum hits per page"),
+            after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+    ) -> List[SearchHitApiRecord]:
+        after_cursor: Optional[SearchCursor] = Server.parse_search_cursor(after)
+        if not q.strip():
+            raise HTTPException(status_code=400, detail="Search text is empty.")
+        user: Optional[User] = await self.get_user(username)
+        if user is None:
+            raise HTTPException(status_code=404, detail=f"User '{username}' not found.")
+        # Best match first, only in object types the user has access to
+        hits: List[dict] = await self.async_db.search(q, user, limit, after_cursor)
+        json_response = JsonBytesResponse(hits)
+        # A full page means there may be more hits after it
+        if hits and len(hits) >= limit:
+            json_response.headers["X-Next-Cursor"] = SearchCursor.from_db_row(hits[-1]).to_token()
+        return json_response
 
     async def get_user_by_id(
             self,
@@ -319,22 +467,17 @@ class Server:
     ) -> UserApiRecord:
         username = "admin"
         user: Optional[User] = await self.get_user(username)
-        [db_conn, db_cursor] = self.db.connect()
         if user is None:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"User '{username}' not found.")
         else:
-            user_record: UserRecord = self.db.read_object_by_id(db_conn, db_cursor, UserRecord.table_name(), "User",
-                                                                user_id, user)
+            user_record: UserRecord = await self.async_db.read_object_by_id(UserRecord.table_name(), "User", user_id,
+                                                                            user)
             if not user_record:
-                db_conn.close()
                 raise HTTPException(status_code=404, detail=f"No user found for id '{user_id}'.")
             _user: User = user_record.convert_to_object()
             user_api_record: UserApiRecord = UserApiRecord.from_object(_user)
             if not user_api_record:
-                db_conn.close()
                 raise HTTPException(status_code=404, detail=f"No user found for id '{user_id}'.")
-            db_conn.close()
             return user_api_record
 
     async def get_case_by_id_and_user(
@@ -343,25 +486,15 @@ class Server:
             username: str = Query(..., description="Username to check access or ownership")
     ) -> CaseApiRecord:
         user: Optional[User] = await self.get_user(username)
-        [db_conn, db_cursor] = self.db.connect()
         if user is None:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"User '{username}' not found.")
         else:
-            case_record: CaseRecord = self.db.read_object_by_id(db_conn, db_cursor, CaseRecord.table_name(), "Case",
-                                                                case_id, user)
-            if not case_record:
-                db_conn.close()
+            # Only the fields visible to the user, serialized without building or validating models
+            case_value: Optional[dict] = await self.async_db.read_trusted_value_by_id(
+                CaseRecord.table_name(), "Case", case_id, user, CaseApiRecord)
+            if not case_value:
                 raise HTTPException(status_code=404, detail=f"No case found for user '{username}'.")
-            _case: Case = case_record.convert_to_object()
-            case_api_record: CaseApiRecord = CaseApiRecord.from_object(_case)
-            # Username based filtering
-            # user_cases = [case for case in DUMMY_CASES if case.owner_id == username]
-            if not case_api_record:
-                db_conn.close()
-                raise HTTPException(status_code=404, detail=f"No case found for user '{username}'.")
-            db_conn.close()
-            return case_api_record
+            return JsonBytesResponse(case_value)
 
     async def get_case_comment_by_id_and_user(
             self,
@@ -369,23 +502,15 @@ class Server:
             username: str = Query(..., description="Username to check access or ownership")
     ) -> CaseCommentApiRecord:
         user: Optional[User] = await self.get_user(username)
-        [db_conn, db_cursor] = self.db.connect()
         if user is None:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"User '{username}' not found.")
         else:
-            case_comment_record: CaseCommentRecord = self.db.read_object_by_id(
-                db_conn, db_cursor, CaseCommentRecord.table_name(), "CaseComment", case_comment_id, user)
-            if not case_comment_record:
-                db_conn.close()
-                raise HTTPException(status_code=404, detail=f"No case comment found for user '{username}'.")
-            case_comment: CaseComment = case_comment_record.convert_to_object()
-            case_comment_api_record: CaseCommentApiRecord = CaseCommentApiRecord.from_object(case_comment)
-            if not case_comment_api_record:
-                db_conn.close()
+            # Only the fields visible to the user, serialized without building or validating models
+            case_comment_value: Optional[dict] = await self.async_db.read_trusted_value_by_id(
+                CaseCommentRecord.table_name(), "CaseComment", case_comment_id, user, CaseCommentApiRecord)
+            if not case_comment_value:
                 raise HTTPException(status_code=404, detail=f"No case comment found for user '{username}'.")
-            db_conn.close()
-            return case_comment_api_record
+            return JsonBytesResponse(case_comment_value)
 
     async def get_account_by_id_and_user(
             self,
@@ -393,63 +518,42 @@ class Server:
             username: str = Query(..., description="Username to check access or ownership")
     ) -> AccountApiRecord:
         user: Optional[User] = await self.get_user(username)
-        [db_conn, db_cursor] = self.db.connect()
         if user is None:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"User '{username}' not found.")
         else:
-            account_record: AccountRecord = self.db.read_object_by_id(db_conn, db_cursor, AccountRecord.table_name(),
-                                                                      "Account", account_id, user)
-            if not account_record:
-                db_conn.close()
+            # Only the fields visible to the user, serialized without building or validating models
+            account_value: Optional[dict] = await self.async_db.read_trusted_value_by_id(
+                AccountRecord.table_name(), "Account", account_id, user, AccountApiRecord)
+            if not account_value:
                 raise HTTPException(status_code=404, detail=f"No account found for user '{username}'.")
-            account: Account = account_record.convert_to_object()
-            account_api_record: AccountApiRecord = AccountApiRecord.from_object(account)
-            # Username based filtering
-            # user_accounts = [account for account in DUMMY_ACCOUNTS if account.owner_id == username]
-            if not account_api_record:
-                db_conn.close()
-                raise HTTPException(status_code=404, detail=f"No account found for user '{username}'.")
-            db_conn.close()
-            return account_api_record
+            return JsonBytesResponse(account_value)
 
     async def get_workflow_by_id(
             self,
             workflow_id: uuid.UUID = FastAPIPath(..., description="Workflow ID (UUID)")
     ) -> WorkflowApiRecord:
-        [db_conn, db_cursor] = self.db.connect()
-
-        workflow_record: WorkflowRecord = self.db.read_object_by_id(db_conn, db_cursor, WorkflowRecord.table_name(),
-                                                                    "Workflow", workflow_id, None)
+        workflow_record: WorkflowRecord = await self.async_db.read_object_by_id(WorkflowRecord.table_name(),
+                                                                                "Workflow", workflow_id, None)
         if not workflow_record:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"No workflow found by id '{str(workflow_id)}'.")
         workflow: Workflow = workflow_record.convert_to_object()
         workflow_api_record: WorkflowApiRecord = WorkflowApiRecord.from_object(workflow)
         if not workflow_api_record:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"No workflow found by id '{str(workflow_id)}'.")
-        db_conn.close()
         return workflow_api_record
 
     async def get_workflow_step_by_id(
             self,
             workflow_step_id: uuid.UUID = FastAPIPath(..., description="Workflow Step ID (UUID)")
     ) -> WorkflowStepApiRecord:
-        [db_conn, db_cursor] = self.db.connect()
-
-        workflow_step_record: WorkflowStepRecord = self.db.read_object_by_id(db_conn, db_cursor,
-                                                                             WorkflowStepRecord.table_name(),
-                                                                             "WorkflowStep", workflow_step_id, None)
+        workflow_step_record: WorkflowStepRecord = await self.async_db.read_object_by_id(
+            WorkflowStepRecord.table_name(), "WorkflowStep", workflow_step_id, None)
         if not workflow_step_record:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"No workflow step found by id '{str(workflow_step_id)}'.")
         workflow_step: WorkflowStep = workflow_step_record.convert_to_object()
         workflow_step_api_record: WorkflowStepApiRecord = WorkflowStepApiRecord.from_object(workflow_step)
         if not workflow_step_api_record:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"No workflow step found by id '{str(workflow_step_id)}'.")
-        db_conn.close()
         return workflow_step_api_record
 
     async def update_workflow_step_by_id(
@@ -457,61 +561,79 @@ class Server:
             workflow_step_id: uuid.UUID = FastAPIPath(..., description="Workflow Step ID (UUID)"),
             update_request: WorkflowStepUpdateRequestApiRecord = None
     ) -> WorkflowStepApiRecord:
-        [db_conn, db_cursor] = self.db.connect()
-
-        workflow_step_record: WorkflowStepRecord = self.db.read_object_by_id(db_conn, db_cursor,
-                                                                             WorkflowStepRecord.table_name(),
-                                                                             "WorkflowStep", workflow_step_id, None)
+        workflow_step_record: WorkflowStepRecord = await self.async_db.read_object_by_id(
+            WorkflowStepRecord.table_name(), "WorkflowStep", workflow_step_id, None)
         if not workflow_step_record:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"No workflow step found by id '{str(workflow_step_id)}'.")
         workflow_step: WorkflowStep = workflow_step_record.convert_to_object()
         # Apply update request
         update_request.update_workflow_step(workflow_step)
+        # Invalid code is rejected here, instead of failing every time the step runs
+        try:
+            workflow_step.compiled_code()
+        except SyntaxError as e:
+            raise HTTPException(status_code=400, detail=f"Syntax error in workflow step code, line {e.lineno}: {e.msg}")
         # Write to database
-        WorkflowStepRecord.from_object(workflow_step).insert_or_replace_to_db(db_conn, db_cursor)
+        await self.async_db.write(WorkflowStepRecord.from_object(workflow_step).insert_or_replace_to_db)
         # TODO: Reread record from database
         workflow_step_api_record: WorkflowStepApiRecord = WorkflowStepApiRecord.from_object(workflow_step)
         if not workflow_step_api_record:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"No workflow step found by id '{str(workflow_step_id)}'.")
         # Reload all workflows, triggers and workflow steps to make them live
-        self.db.init_workflows_and_triggers(db_conn, db_cursor)
-        db_conn.close()
+        await self.async_db.init_workflows_and_triggers()
         return workflow_step_api_record
 
     async def run_workflow_by_id(
             self,
             workflow_id: uuid.UUID = FastAPIPath(..., description="Workflow ID (UUID)")
     ) -> WorkflowApiRecord:
-        [db_conn, db_cursor] = self.db.connect()
-
-        workflow_record: WorkflowRecord = self.db.read_object_by_id(db_conn, db_cursor, WorkflowRecord.table_name(),
-                                                                    "Workflow", workflow_id, None)
+        workflow_record: WorkflowRecord = await self.async_db.read_object_by_id(WorkflowRecord.table_name(),
+                                                                                "Workflow", workflow_id, None)
         if not workflow_record:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"No workflow found by id '{str(workflow_id)}'.")
         workflow: Workflow = workflow_record.convert_to_object()
         # Read actual steps content
         workflow_steps: List[WorkflowStep] = []
         for workflow_step_id in workflow.workflow_step_ids.object_ids:
-            workflow_step_record: WorkflowStepRecord = self.db.read_object_by_id(db_conn, db_cursor,
-                                                                                 WorkflowStepRecord.table_name(),
-                                                                                 "WorkflowStep", workflow_step_id,
-                                                                                 None)
+            workflow_step_record: WorkflowStepRecord = await self.async_db.read_object_by_id(
+                WorkflowStepRecord.table_name(), "WorkflowStep", workflow_step_id, None)
             workflow_steps.append(workflow_step_record.convert_to_object())
         # Set actual steps content to workflow before running it
         workflow.load_steps(workflow_steps)
-        workflow.run_workflow(None, None)
+        await self.async_db.run_blocking(workflow.run_workflow, None, None)
 
         # Return record
         workflow_api_record: WorkflowApiRecord = WorkflowApiRecord.from_object(workflow)
         if not workflow_api_record:
-            db_conn.close()
             raise HTTPException(status_code=404, detail=f"No workflow found by id '{str(workflow_id)}'.")
-        db_conn.close()
         return workflow_api_record
 
+    async def get_workflow_runs_api_record(
+            self,
+            state: Optional[str] = Query(None, description="Only runs in this state: pending, running, done or dead"),
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum records")
+    ) -> List[WorkflowRunApiRecord]:
+        if state is not None and state not in WorkflowRunQueue.all_states:
+            raise HTTPException(status_code=400, detail=f"Unknown workflow run state '{state}'.")
+        workflow_runs: List[WorkflowRun] = await self.async_db.run(
+            lambda db_conn, db_cursor: WorkflowRunQueue.list_runs(db_cursor, state, limit))
+        return [WorkflowRunApiRecord.from_workflow_run(workflow_run) for workflow_run in workflow_runs]
+
+    async def retry_workflow_run_by_id(
+            self,
+            workflow_run_id: uuid.UUID = FastAPIPath(..., description="Workflow run ID (UUID)")
+    ) -> WorkflowRunApiRecord:
+        def retry(db_conn: Connection, db_cursor: Cursor) -> Optional[WorkflowRun]:
+            if not WorkflowRunQueue.retry_dead(db_cursor, str(workflow_run_id)):
+                return None
+            return WorkflowRunQueue.read_run(db_cursor, str(workflow_run_id))
+
+        workflow_run: Optional[WorkflowRun] = await self.async_db.write(retry)
+        if workflow_run is None:
+            raise HTTPException(status_code=404, detail=f"No dead workflow run found by id '{str(workflow_run_id)}'.")
+        self.workflow_executor.wake_up()
+        return WorkflowRunApiRecord.from_workflow_run(workflow_run)
+
 
 # Mount the router
 server = Server()
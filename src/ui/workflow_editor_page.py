@@ -36,8 +36,11 @@ def workflow_editor_page():
                     headers: {{"Content-Type": "application/json"}},
                     body: JSON.stringify({{"id": "{workflow_step_id}", "workflow_step_name": "", "workflow_step_code": {code!r}
                     }})
-                }})
+                }}).then(r => r.ok ? {{}} : r.json())
                 ''', timeout=5.0)
+                if response and "detail" in response:
+                    ui.notify(f"Not saved: {response['detail']}", color="negative")
+                    return
                 ui.notify(f"Saving step {current_id[0]}:\n{code[:30]}...", color="positive")
 
 
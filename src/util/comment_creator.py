@@ -22,7 +22,7 @@ class CommentCreator(BaseModel):
     def connect_to_db(self) -> [Connection, Cursor]:
         if self.db is None:
             self.db = Database(db_name="database/crm.db")
-        # Connect to database
+        # Connect to database, reusing the connection pool shared with the server for the same database file
         [db_conn, db_cursor] = self.db.connect()
         return db_conn, db_cursor
 
@@ -34,6 +34,7 @@ class CommentCreator(BaseModel):
             summary=comment_summary,
             description=comment_description)
         CaseCommentRecord.from_object(case1_comment_1).insert_to_db(db_conn, db_cursor)
+        db_conn.close()
 
 
 if __name__ == "__main__":
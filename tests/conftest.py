@@ -0,0 +1,92 @@
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Iterator
+
+import pytest
+
+from src.core.access.access_rule import AccessRule
+from src.core.access.access_type import AccessType
+from src.core.access.profile import Profile
+from src.core.access.row_predicate import RowPredicate
+from src.core.access.user import User
+from src.core.eventbus.workflow_trigger import WorkflowTrigger
+from src.core.objects.account import Account
+from src.core.objects.case import Case
+from src.core.reference.object_reference import ObjectReference
+from src.core.reference.object_reference_list import ObjectReferenceList
+from src.db.account_record import AccountRecord
+from src.db.case_record import CaseRecord
+from src.db.database import Database
+from src.db.profile_record import ProfileRecord
+from src.db.user_record import UserRecord
+
+
+@pytest.fixture
+def db(tmp_path: Path) -> Iterator[Database]:
+    """
+    A fresh database file per test, with the process wide state pointing to it put back afterwards.
+    """
+    database = Database(db_name=str(tmp_path / "crm.db"))
+    yield database
+    WorkflowTrigger.event_dispatcher = None
+    CaseRecord.number_allocator = None
+    AccountRecord.number_allocator = None
+    database.delete_if_exists()
+
+
+@pytest.fixture
+def crm(db: Database) -> SimpleNamespace:
+    """
+    Two users with full access and a sales agent with the access rules of the CLI sample data, and cases that the
+    sales agent may read or not:
+    - own_case: owned by the sales agent, on Jill's account
+    - account_case: owned by Jill, on the sales agent's account
+    - other_case: owned by Jill, on Jill's account
+    """
+    full_access = AccessType.READ | AccessType.WRITE | AccessType.CREATE | AccessType.DELETE
+    administrator_profile = Profile(name="Administrator", access_rules=[
+        AccessRule(data_object_type="Account", access_type=full_access),
+        AccessRule(data_object_type="Case", access_type=full_access),
+        AccessRule(data_object_type="CaseComment", access_type=full_access)])
+    sales_agent_profile = Profile(name="Sales Agent", access_rules=[
+        AccessRule(data_object_type="Account", access_type=AccessType.READ,
+                   row_predicates=[RowPredicate.owned_by_user()]),
+        AccessRule(data_object_type="Case", access_type=AccessType.READ,
+                   row_predicates=[RowPredicate.owned_by_user()], hidden_fields=["description"]),
+        AccessRule(data_object_type="Case", access_type=AccessType.READ,
+                   row_predicates=[RowPredicate.referenced_object_owned_by_user("account_object_id", "Account")],
+                   hidden_fields=["description"])])
+    admin = User(username="admin", fullname="Administrator",
+                 profile_ids=ObjectReferenceList.from_list([administrator_profile]))
+    jill = User(username="jilljohns", fullname="Jill Johns",
+                profile_ids=ObjectReferenceList.from_list([administrator_profile]))
+    jack = User(username="jackhills", fullname="Jack Hills",
+                profile_ids=ObjectReferenceList.from_list([sales_agent_profile]))
+    jill_account = Account(account_name="Jill's account", owner_id=ObjectReference.from_object(jill))
+    jack_account = Account(account_name="Jack's account", owner_id=ObjectReference.from_object(jack))
+    own_case = Case(owner_id=ObjectReference.from_object(jack), account_id=ObjectReference.from_object(jill_account),
+                    summary="Printer jams on own case", description="secret alpha")
+    account_case = Case(owner_id=ObjectReference.from_object(jill),
+                        account_id=ObjectReference.from_object(jack_account),
+                        summary="Printer jams on account case", description="secret beta")
+    other_case = Case(owner_id=ObjectReference.from_object(jill), account_id=ObjectReference.from_object(jill_account),
+                      summary="Printer jams on other case", description="secret gamma")
+    [conn, cursor] = db.connect()
+    try:
+        db.insert_records(conn, cursor, [
+            ProfileRecord.from_object(administrator_profile),
+            ProfileRecord.from_object(sales_agent_profile),
+            UserRecord.from_object(admin),
+            UserRecord.from_object(jill),
+            UserRecord.from_object(jack),
+            AccountRecord.from_object(jill_account),
+            AccountRecord.from_object(jack_account),
+            CaseRecord.from_object(own_case),
+            CaseRecord.from_object(account_case),
+            CaseRecord.from_object(other_case),
+        ])
+    finally:
+        conn.close()
+    return SimpleNamespace(db=db, admin=admin, jill=jill, jack=jack, jill_account=jill_account,
+                           jack_account=jack_account, own_case=own_case, account_case=account_case,
+                           other_case=other_case)
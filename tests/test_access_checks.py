@@ -0,0 +1,33 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from src.db.database import Database
+
+
+def test_check_access_many_matches_single_reads(crm: SimpleNamespace, monkeypatch: pytest.MonkeyPatch):
+    # Small batches, so the last one is padded and duplicates and misses fall into different batches
+    monkeypatch.setattr(Database, "check_access_many_batch_size", 2)
+    missing_id = uuid.uuid4()
+    object_ids = [
+        ("Case", crm.own_case.id),
+        ("Case", crm.other_case.id),
+        ("Case", missing_id),
+        ("Case", crm.account_case.id),
+        ("Case", crm.own_case.id),
+        ("Account", crm.jack_account.id),
+        ("Account", crm.jill_account.id),
+        ("CaseComment", uuid.uuid4()),
+        ("NoSuchType", crm.own_case.id),
+    ]
+    [conn, cursor] = crm.db.connect()
+    try:
+        allowed = crm.db.check_access_many(conn, cursor, crm.jack, object_ids)
+        admin_allowed = crm.db.check_access_many(conn, cursor, crm.admin, object_ids)
+        no_user_allowed = crm.db.check_access_many(conn, cursor, None, object_ids)
+    finally:
+        conn.close()
+    assert allowed == [True, False, False, True, True, True, False, False, False]
+    assert admin_allowed == [True, True, False, True, True, True, True, False, False]
+    assert no_user_allowed == [False] * len(object_ids)
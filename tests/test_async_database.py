@@ -0,0 +1,16 @@
+import pytest
+
+from src.db.async_database import AsyncDatabase
+from src.db.database import Database
+
+
+def test_database_threads_follow_the_shared_pool(db: Database):
+    # Same file, so the pool of `db` is shared, and its size wins over the requested one
+    larger_db = Database(db_name=db.db_name, pool_size=db.pool_size + 8)
+    async_db = AsyncDatabase(db=larger_db, reserved_connections=2)
+    try:
+        assert async_db.database_threads == db.pool_size - 2
+    finally:
+        async_db.shutdown()
+    with pytest.raises(ValueError):
+        AsyncDatabase(db=larger_db, reserved_connections=db.pool_size)
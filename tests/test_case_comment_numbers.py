@@ -0,0 +1,74 @@
+import threading
+from typing import List
+
+from src.core.objects.case_comment import CaseComment
+from src.core.reference.object_reference import ObjectReference
+from src.db.case_comment_record import CaseCommentRecord
+from src.db.database import Database
+
+OWNER = ObjectReference.from_type_and_id("User", "00000000-0000-0000-0000-000000000001")
+CASE_1 = ObjectReference.from_type_and_id("Case", "00000000-0000-0000-0000-000000000011")
+CASE_2 = ObjectReference.from_type_and_id("Case", "00000000-0000-0000-0000-000000000012")
+
+
+def new_comment_record(case_id: ObjectReference) -> CaseCommentRecord:
+    return CaseCommentRecord.from_object(CaseComment(owner_id=OWNER, case_id=case_id, summary="Comment"))
+
+
+def insert_comment(db: Database, case_id: ObjectReference) -> str:
+    [conn, cursor] = db.connect()
+    try:
+        case_comment_record = new_comment_record(case_id)
+        case_comment_record.insert_to_db(conn, cursor)
+        return case_comment_record.case_comment_number
+    finally:
+        conn.close()
+
+
+def test_comments_are_numbered_per_case(db: Database):
+    assert [insert_comment(db, CASE_1) for _ in range(3)] == ["00000001", "00000002", "00000003"]
+    assert insert_comment(db, CASE_2) == "00000001"
+
+
+def test_imported_comment_numbers_move_the_counter_past_them(db: Database):
+    imported = new_comment_record(CASE_1)
+    imported.case_comment_number = CaseComment.case_comment_number_from_number(10)
+    [conn, cursor] = db.connect()
+    try:
+        db.insert_records(conn, cursor, [imported])
+    finally:
+        conn.close()
+    assert insert_comment(db, CASE_1) == "00000011"
+
+
+def test_concurrent_comments_on_one_case_get_distinct_numbers(db: Database):
+    numbers: List[str] = []
+    numbers_lock = threading.Lock()
+
+    def insert_comments() -> None:
+        for _ in range(20):
+            number = insert_comment(db, CASE_1)
+            with numbers_lock:
+                numbers.append(number)
+
+    threads = [threading.Thread(target=insert_comments) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(numbers) == [CaseComment.case_comment_number_from_number(number) for number in range(1, 81)]
+
+
+def test_bulk_inserted_new_comments_are_numbered_from_the_counter(db: Database):
+    imported = new_comment_record(CASE_1)
+    imported.case_comment_number = CaseComment.case_comment_number_from_number(4)
+    new_records = [new_comment_record(CASE_1) for _ in range(3)]
+    [conn, cursor] = db.connect()
+    try:
+        db.insert_records(conn, cursor, new_records + [imported, new_comment_record(CASE_2)])
+    finally:
+        conn.close()
+    # New comments continue after the imported number in the same batch
+    assert [record.case_comment_number for record in new_records] == ["00000005", "00000006", "00000007"]
+    assert insert_comment(db, CASE_1) == "00000008"
+    assert insert_comment(db, CASE_2) == "00000002"
@@ -0,0 +1,21 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from src.db.connection_pool import ConnectionPool
+
+
+def test_connection_checked_out_during_close_all_is_closed_on_release(tmp_path: Path):
+    pool = ConnectionPool(db_name=str(tmp_path / "pool.db"), max_size=1, timeout=0.1)
+    conn = pool.acquire()
+    raw_connection = conn.raw_connection
+    pool.close_all()
+    conn.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        raw_connection.execute("SELECT 1")
+    # Its slot is free again, the pool opens a new connection
+    new_conn = pool.acquire()
+    assert new_conn.raw_connection is not raw_connection
+    new_conn.close()
+    pool.close_all()
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+from src.api.case_api_record import CaseApiRecord
+from src.api.search_hit_api_record import SearchHitApiRecord
+from src.core.access.access_rule import AccessRule
+from src.core.access.access_type import AccessType
+from src.core.access.profile import Profile
+from src.core.access.user import User
+from src.core.reference.object_reference_list import ObjectReferenceList
+from src.db.case_record import CaseRecord
+from src.db.profile_record import ProfileRecord
+from src.db.user_record import UserRecord
+
+
+def visible_case_ids(crm: SimpleNamespace):
+    return {str(crm.own_case.id), str(crm.account_case.id)}
+
+
+def test_list_returns_only_readable_cases_without_hidden_fields(crm: SimpleNamespace):
+    [conn, cursor] = crm.db.connect()
+    try:
+        values = crm.db.read_trusted_values(conn, cursor, CaseRecord.table_name(), "Case", crm.jack, CaseApiRecord)
+    finally:
+        conn.close()
+    assert {value["id"] for value in values} == visible_case_ids(crm)
+    assert all("description" not in value for value in values)
+    assert all(value["case_number"] for value in values)
+
+
+def test_list_for_full_access_user_has_all_fields(crm: SimpleNamespace):
+    [conn, cursor] = crm.db.connect()
+    try:
+        values = crm.db.read_trusted_values(conn, cursor, CaseRecord.table_name(), "Case", crm.admin, CaseApiRecord)
+    finally:
+        conn.close()
+    assert len(values) == 3
+    assert {value["description"] for value in values} == {"secret alpha", "secret beta", "secret gamma"}
+
+
+def test_get_by_id_respects_rows_and_fields(crm: SimpleNamespace):
+    [conn, cursor] = crm.db.connect()
+    try:
+        own = crm.db.read_trusted_value_by_id(conn, cursor, CaseRecord.table_name(), "Case", crm.own_case.id,
+                                              crm.jack, CaseApiRecord)
+        other = crm.db.read_trusted_value_by_id(conn, cursor, CaseRecord.table_name(), "Case", crm.other_case.id,
+                                                crm.jack, CaseApiRecord)
+    finally:
+        conn.close()
+    assert own is not None and own["id"] == str(crm.own_case.id)
+    assert "description" not in own
+    assert other is None
+
+
+def test_search_skips_hidden_rows_and_hidden_fields(crm: SimpleNamespace):
+    [conn, cursor] = crm.db.connect()
+    try:
+        summary_hits = crm.db.search(conn, cursor, "printer", crm.jack, 10)
+        description_hits = crm.db.search(conn, cursor, "secret", crm.jack, 10)
+        admin_description_hits = crm.db.search(conn, cursor, "secret", crm.admin, 10)
+    finally:
+        conn.close()
+    assert {hit["id"] for hit in summary_hits} == visible_case_ids(crm)
+    assert all("secret" not in hit["snippet"] for hit in summary_hits)
+    assert description_hits == []
+    assert len(admin_description_hits) == 3
+
+
+def test_ndjson_rows_respect_rows_and_fields(crm: SimpleNamespace):
+    # The rows NDJSON responses are streamed from
+    [conn, cursor] = crm.db.connect()
+    try:
+        rows = list(crm.db.iter_readable_rows(conn, cursor, CaseRecord.table_name(), "Case", crm.jack, batch_size=1))
+    finally:
+        conn.close()
+    assert {row["id"] for row in rows} == visible_case_ids(crm)
+    assert all("description" not in row for row in rows)
+
+
+def test_values_with_hidden_number_and_summary_match_the_response_models(crm: SimpleNamespace):
+    profile = Profile(name="Reviewer", access_rules=[
+        AccessRule(data_object_type="Case", access_type=AccessType.READ, hidden_fields=["case_number", "summary"])])
+    reviewer = User(username="reviewer", fullname="Reviewer", profile_ids=ObjectReferenceList.from_list([profile]))
+    [conn, cursor] = crm.db.connect()
+    try:
+        crm.db.insert_records(conn, cursor, [ProfileRecord.from_object(profile), UserRecord.from_object(reviewer)])
+        values = crm.db.read_trusted_values(conn, cursor, CaseRecord.table_name(), "Case", reviewer, CaseApiRecord)
+        hits = crm.db.search(conn, cursor, "secret", reviewer, 10)
+    finally:
+        conn.close()
+    assert len(values) == 3 and all("summary" not in value for value in values)
+    assert all(CaseApiRecord.model_validate(value).case_number is None for value in values)
+    assert len(hits) == 3 and all(SearchHitApiRecord.model_validate(hit).number is None for hit in hits)
@@ -0,0 +1,31 @@
+import uuid
+
+from src.core.objects.account import Account
+from src.core.reference.object_reference import ObjectReference
+from src.db.account_record import AccountRecord
+from src.db.database import Database
+from src.db.record_registry import RecordRegistry
+
+OWNER = ObjectReference.from_type_and_id("User", "00000000-0000-0000-0000-000000000001")
+
+
+def test_record_fields_match_table_columns(db: Database):
+    [conn, cursor] = db.connect()
+    try:
+        for record_type in RecordRegistry.record_types():
+            cursor.execute(f"PRAGMA table_info({record_type.table_name})")
+            table_columns = {row["name"] for row in cursor.fetchall()}
+            assert set(record_type.columns) == table_columns, record_type.object_type_name
+    finally:
+        conn.close()
+
+
+def test_inserted_record_reads_back_equal(db: Database):
+    account_record = AccountRecord.from_object(Account(account_name="Account", owner_id=OWNER))
+    [conn, cursor] = db.connect()
+    try:
+        account_record.insert_to_db(conn, cursor)
+        rows = db.get_table_row(conn, cursor, AccountRecord.table_name(), uuid.UUID(account_record.id))
+    finally:
+        conn.close()
+    assert AccountRecord.from_db_row(rows[0]) == account_record
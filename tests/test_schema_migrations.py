@@ -0,0 +1,67 @@
+import sqlite3
+import uuid
+from pathlib import Path
+
+from src.core.reference.object_reference import ObjectReference
+from src.db.case_comment_record import CaseCommentRecord
+from src.db.case_record import CaseRecord
+from src.db.database import Database
+from src.db.full_text_search import FullTextSearch
+from src.db.schema_migrations import SchemaMigrations
+from src.db.sequence_allocator import SequenceAllocator
+
+# Tables as created before the migrations existed, with user_version 0
+BASELINE_TABLES = [
+    '''Accounts (id TEXT PRIMARY KEY, account_number TEXT UNIQUE NOT NULL, owner_id TEXT NOT NULL,
+        account_name TEXT NOT NULL, description TEXT, created_at FLOAT, updated_at FLOAT, commit_at FLOAT,
+        object_type_name TEXT NOT NULL)''',
+    '''Cases (id TEXT PRIMARY KEY, case_number TEXT UNIQUE NOT NULL, owner_id TEXT NOT NULL, account_id TEXT NOT NULL,
+        summary TEXT NOT NULL, description TEXT, created_at FLOAT, updated_at FLOAT, commit_at FLOAT,
+        object_type_name TEXT NOT NULL)''',
+    '''CaseComments (id TEXT PRIMARY KEY, case_comment_number TEXT NOT NULL, owner_id TEXT NOT NULL,
+        case_id TEXT NOT NULL, summary TEXT NOT NULL, description TEXT, created_at FLOAT, updated_at FLOAT,
+        commit_at FLOAT, object_type_name TEXT NOT NULL)''',
+]
+
+
+def reference(object_type_name: str, object_id: str) -> str:
+    return ObjectReference.from_type_and_id(object_type_name, object_id).to_json_str()
+
+
+def test_baseline_database_is_migrated_and_backfilled(tmp_path: Path):
+    db_name = str(tmp_path / "baseline.db")
+    owner_id = str(uuid.uuid4())
+    account_id = str(uuid.uuid4())
+    case_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+    conn = sqlite3.connect(db_name)
+    for table_definition in BASELINE_TABLES:
+        conn.execute(f"CREATE TABLE {table_definition}")
+    conn.execute("INSERT INTO Accounts VALUES (?, '00000007', ?, 'Account', '', 1, 1, 1, 'Account')",
+                 (account_id, reference("User", owner_id)))
+    for (number, case_id) in enumerate(case_ids, start=41):
+        conn.execute("INSERT INTO Cases VALUES (?, ?, ?, ?, 'Broken printer', 'Paper jam', 1, 1, 1, 'Case')",
+                     (case_id, f"{number:08d}", reference("User", owner_id), reference("Account", account_id)))
+    for number in [1, 2, 5]:
+        conn.execute("INSERT INTO CaseComments VALUES (?, ?, ?, ?, 'Comment', 'Toner', 1, 1, 1, 'CaseComment')",
+                     (str(uuid.uuid4()), f"{number:08d}", reference("User", owner_id), reference("Case", case_ids[0])))
+    conn.commit()
+    conn.close()
+
+    db = Database(db_name=db_name)
+    [conn, cursor] = db.connect()
+    try:
+        assert SchemaMigrations.read_version(cursor) == SchemaMigrations.latest_version()
+        cursor.execute(f"SELECT owner_object_id, account_object_id FROM {CaseRecord.table_name()}")
+        assert {tuple(row) for row in cursor.fetchall()} == {(owner_id, account_id)}
+        cursor.execute(f"SELECT DISTINCT case_object_id FROM {CaseCommentRecord.table_name()}")
+        assert [row[0] for row in cursor.fetchall()] == [case_ids[0]]
+        cursor.execute(f"SELECT name, next_value FROM {SequenceAllocator.table_name()}")
+        assert dict((row[0], row[1]) for row in cursor.fetchall()) == {"case_number": 43, "account_number": 8}
+        # New comments continue after the highest existing number of their case
+        assert CaseCommentRecord.next_case_comment_number_for_case(cursor, case_ids[0]) == 6
+        assert CaseCommentRecord.next_case_comment_number_for_case(cursor, case_ids[1]) == 1
+        hits = FullTextSearch.search(cursor, "printer", ["Case"], 10)
+        assert {hit["id"] for hit in hits} == set(case_ids)
+    finally:
+        conn.close()
+        db.delete_if_exists()
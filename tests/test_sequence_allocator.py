@@ -0,0 +1,119 @@
+import multiprocessing
+import threading
+from typing import List
+
+import pytest
+
+from src.core.objects.case import Case
+from src.core.reference.object_reference import ObjectReference
+from src.db.case_record import CaseRecord
+from src.db.database import Database
+from src.db.sequence_allocator import SequenceAllocator
+
+
+def take_numbers(db_name: str, count: int) -> List[int]:
+    # Runs in a separate process, with its own pool and allocator
+    Database(db_name=db_name)
+    allocator = SequenceAllocator(db_name=db_name, sequence_name=CaseRecord.number_sequence_name(), block_size=7)
+    return [allocator.next_value() for _ in range(count)]
+
+
+def new_case() -> Case:
+    return Case(owner_id=ObjectReference.from_type_and_id("User", "00000000-0000-0000-0000-000000000001"),
+                account_id=ObjectReference.from_type_and_id("Account", "00000000-0000-0000-0000-000000000002"),
+                summary="Summary")
+
+
+def read_sequence(db: Database, sequence_name: str) -> int:
+    [conn, cursor] = db.connect()
+    try:
+        cursor.execute(f"SELECT next_value FROM {SequenceAllocator.table_name()} WHERE name = ?", (sequence_name,))
+        return int(cursor.fetchone()[0])
+    finally:
+        conn.close()
+
+
+def test_threads_sharing_allocators_never_get_the_same_number(db: Database):
+    # Two allocators stand in for two processes, each shared by several threads
+    allocators = [SequenceAllocator(db_name=db.db_name, sequence_name="test", block_size=5) for _ in range(2)]
+    numbers: List[int] = []
+    numbers_lock = threading.Lock()
+
+    def take(allocator: SequenceAllocator) -> None:
+        taken = [allocator.next_value() for _ in range(200)]
+        with numbers_lock:
+            numbers.extend(taken)
+
+    threads = [threading.Thread(target=take, args=(allocators[number % 2],)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(numbers) == 1600
+    assert len(set(numbers)) == 1600
+
+
+def test_processes_never_get_the_same_number(db: Database):
+    with multiprocessing.get_context("spawn").Pool(3) as pool:
+        results = pool.starmap(take_numbers, [(db.db_name, 60)] * 3)
+    numbers = [number for result in results for number in result]
+    assert len(set(numbers)) == 180
+
+
+def test_number_is_taken_on_insert_not_on_construction(db: Database):
+    db.init_number_sequences()
+    before = read_sequence(db, CaseRecord.number_sequence_name())
+    case = new_case()
+    assert case.case_number == ""
+    assert read_sequence(db, CaseRecord.number_sequence_name()) == before
+    case_record = CaseRecord.from_object(case)
+    [conn, cursor] = db.connect()
+    try:
+        case_record.insert_to_db(conn, cursor)
+    finally:
+        conn.close()
+    assert case_record.case_number == Case.case_number_from_number(before)
+
+
+def test_insert_holding_the_write_lock_takes_number_on_its_connection(db: Database):
+    db.init_number_sequences()
+    block_size = CaseRecord.number_allocator.block_size
+    before = read_sequence(db, CaseRecord.number_sequence_name())
+    with pytest.raises(RuntimeError):
+        with db.transaction() as [conn, cursor]:
+            # The first insert takes a block, on another connection, before the transaction holds the write lock
+            CaseRecord.from_object(new_case()).insert_to_db(conn, cursor)
+            # A second connection would now wait for the lock, so the number is reserved in the transaction
+            CaseRecord.from_object(new_case()).insert_to_db(conn, cursor)
+            raise RuntimeError("roll back")
+    # Only the block stays reserved, the number reserved in the transaction was rolled back with it
+    assert read_sequence(db, CaseRecord.number_sequence_name()) == before + block_size
+
+
+def test_number_reserved_ahead_comes_from_the_block(db: Database):
+    db.init_number_sequences()
+    block_size = CaseRecord.number_allocator.block_size
+    before = read_sequence(db, CaseRecord.number_sequence_name())
+    case_numbers = [CaseRecord.reserve_case_number() for _ in range(3)]
+    with db.transaction() as [conn, cursor]:
+        for case_number in case_numbers:
+            case_record = CaseRecord.from_object(new_case())
+            case_record.case_number = case_number
+            case_record.insert_to_db(conn, cursor)
+    assert case_numbers == [Case.case_number_from_number(before + offset) for offset in range(3)]
+    # One block for all of them, the write transaction left the sequence alone
+    assert read_sequence(db, CaseRecord.number_sequence_name()) == before + block_size
+
+
+def test_imported_numbers_move_the_sequence_past_them(db: Database):
+    imported = CaseRecord.from_object(new_case())
+    imported.case_number = Case.case_number_from_number(500)
+    fresh = CaseRecord.from_object(new_case())
+    [conn, cursor] = db.connect()
+    try:
+        db.insert_records(conn, cursor, [imported])
+        db.insert_records(conn, cursor, [fresh])
+    finally:
+        conn.close()
+    assert imported.case_number == "00000500"
+    assert fresh.case_number == "00000501"
@@ -0,0 +1,88 @@
+from typing import List
+
+import pytest
+
+from src.core.objects.account import Account
+from src.core.reference.object_reference import ObjectReference
+from src.db.account_record import AccountRecord
+from src.db.database import Database
+from src.db.unit_of_work import UnitOfWork
+
+OWNER = ObjectReference.from_type_and_id("User", "00000000-0000-0000-0000-000000000001")
+
+
+def insert_account(conn, cursor, account_name: str) -> None:
+    AccountRecord.from_object(Account(account_name=account_name, owner_id=OWNER)).insert_to_db(conn, cursor)
+
+
+def account_names(db: Database) -> List[str]:
+    [conn, cursor] = db.connect()
+    try:
+        cursor.execute(f"SELECT account_name FROM {AccountRecord.table_name()} ORDER BY account_name")
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def test_writes_commit_together_or_not_at_all(db: Database):
+    with db.transaction() as [conn, cursor]:
+        insert_account(conn, cursor, "A")
+        insert_account(conn, cursor, "B")
+    with pytest.raises(RuntimeError):
+        with db.transaction() as [conn, cursor]:
+            insert_account(conn, cursor, "C")
+            # Joins the outer unit of work, its commit is deferred
+            with db.transaction() as [inner_conn, inner_cursor]:
+                insert_account(inner_conn, inner_cursor, "D")
+            raise RuntimeError("roll back")
+    assert account_names(db) == ["A", "B"]
+
+
+def test_savepoint_discards_only_its_writes_and_hooks(db: Database):
+    calls: List[str] = []
+    with db.transaction() as [conn, cursor]:
+        unit_of_work = UnitOfWork.current(db.db_name)
+        insert_account(conn, cursor, "kept")
+        unit_of_work.after_commit(lambda: calls.append("kept"))
+        with pytest.raises(RuntimeError):
+            with unit_of_work.savepoint():
+                insert_account(conn, cursor, "discarded")
+                unit_of_work.after_commit(lambda: calls.append("discarded"))
+                raise RuntimeError("roll back savepoint")
+        # Hooks only run once the writes are committed
+        assert calls == []
+    assert calls == ["kept"]
+    assert account_names(db) == ["kept"]
+
+
+def test_after_commit_hooks_are_dropped_on_rollback(db: Database):
+    calls: List[str] = []
+    with pytest.raises(RuntimeError):
+        with db.transaction() as [conn, cursor]:
+            UnitOfWork.current(db.db_name).after_commit(lambda: calls.append("hook"))
+            raise RuntimeError("roll back")
+    assert calls == []
+
+
+def test_failing_hook_does_not_fail_the_commit(db: Database):
+    calls: List[str] = []
+
+    def failing_hook() -> None:
+        raise RuntimeError("hook failed")
+
+    with db.transaction() as [conn, cursor]:
+        insert_account(conn, cursor, "A")
+        UnitOfWork.current(db.db_name).after_commit(failing_hook)
+        UnitOfWork.current(db.db_name).after_commit(lambda: calls.append("next"))
+    assert calls == ["next"]
+    assert account_names(db) == ["A"]
+
+
+def test_released_connection_rolls_back_uncommitted_writes(db: Database):
+    [conn, cursor] = db.connect()
+    raw_connection = conn.raw_connection
+    cursor.execute(f"INSERT INTO {AccountRecord.table_name()} (id, account_number, owner_id, account_name, "
+                   f"object_type_name) VALUES ('id', '1', 'owner', 'uncommitted', 'Account')")
+    conn.close()
+    assert not raw_connection.in_transaction
+    assert account_names(db) == []
@@ -0,0 +1,14 @@
+from types import SimpleNamespace
+
+from src.db.user_cache import UserCache
+
+
+def test_only_known_users_are_cached(crm: SimpleNamespace):
+    [conn, cursor] = crm.db.connect()
+    try:
+        for index in range(100):
+            assert crm.db.read_user_by_username(conn, cursor, f"nobody{index}") is None
+        assert crm.db.read_user_by_username(conn, cursor, "jackhills").id == crm.jack.id
+    finally:
+        conn.close()
+    assert list(UserCache.all_users[crm.db.db_name]) == ["jackhills"]
@@ -0,0 +1,103 @@
+from typing import List, Tuple
+
+import pytest
+
+from src.core.eventbus.workflow import Workflow
+from src.core.eventbus.workflow_step import WorkflowStep
+from src.core.eventbus.workflow_trigger import WorkflowDispatchIndex, WorkflowTrigger
+from src.core.objects.account import Account
+from src.core.reference.object_reference import ObjectReference
+from src.core.reference.object_reference_list import ObjectReferenceList
+from src.db.account_record import AccountRecord
+from src.db.database import Database
+from src.db.workflow_executor import WorkflowExecutor
+from src.db.workflow_run_queue import WorkflowRunQueue
+
+# (account number, whether the step ran inside a unit of work), appended by the workflow step below
+step_calls: List[Tuple[str, bool]] = []
+
+STEP_CODE = '''
+from src.db.unit_of_work import UnitOfWork
+from tests.test_workflow_executor import step_calls
+step_calls.append((sender.account_number, UnitOfWork.current_unit_of_work.get() is not None))
+if sender.account_name == "Failing":
+    raise RuntimeError("step failed")
+'''
+
+OWNER = ObjectReference.from_type_and_id("User", "00000000-0000-0000-0000-000000000001")
+
+
+@pytest.fixture
+def account_trigger(monkeypatch: pytest.MonkeyPatch):
+    step = WorkflowStep(owner_id=OWNER, workflow_step_name="Record", workflow_step_code=STEP_CODE)
+    workflow = Workflow(owner_id=OWNER, workflow_name="Workflow",
+                        workflow_step_ids=ObjectReferenceList.from_list([step]))
+    workflow.load_steps([step])
+    trigger = WorkflowTrigger(owner_id=OWNER, workflow_trigger_object_type_name="Account",
+                              workflow_trigger_event_type="CREATE",
+                              workflow_to_run_id=ObjectReference.from_object(workflow))
+    trigger.workflows = [workflow]
+    monkeypatch.setattr(WorkflowTrigger, "dispatch_index", WorkflowDispatchIndex.build([trigger]))
+    step_calls.clear()
+
+
+@pytest.fixture
+def executor(db: Database, account_trigger: None, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(WorkflowRunQueue, "max_attempts", 2)
+    monkeypatch.setattr(WorkflowRunQueue, "base_backoff_seconds", 0.0)
+    workflow_executor = WorkflowExecutor(db=db, max_concurrency=2, poll_interval_seconds=0.05)
+    workflow_executor.install()
+    yield workflow_executor
+    workflow_executor.shutdown()
+
+
+def create_account(db: Database, account_name: str) -> str:
+    with db.transaction() as [conn, cursor]:
+        account_record = AccountRecord.from_object(Account(account_name=account_name, owner_id=OWNER))
+        account_record.insert_to_db(conn, cursor)
+        return account_record.account_number
+
+
+def runs_in_state(db: Database, state: str) -> int:
+    [conn, cursor] = db.connect()
+    try:
+        return len(WorkflowRunQueue.list_runs(cursor, state, 100))
+    finally:
+        conn.close()
+
+
+def test_steps_run_after_commit_outside_any_unit_of_work(db: Database, executor: WorkflowExecutor):
+    account_number = create_account(db, "Working")
+    assert executor.wait_idle(timeout=10)
+    assert step_calls == [(account_number, False)]
+    assert runs_in_state(db, WorkflowRunQueue.DONE) == 1
+
+
+def test_rolled_back_object_queues_no_run(db: Database, executor: WorkflowExecutor):
+    with pytest.raises(RuntimeError):
+        with db.transaction() as [conn, cursor]:
+            AccountRecord.from_object(Account(account_name="Working", owner_id=OWNER)).insert_to_db(conn, cursor)
+            raise RuntimeError("roll back")
+    assert executor.wait_idle(timeout=10)
+    assert step_calls == []
+    assert runs_in_state(db, WorkflowRunQueue.DONE) == 0
+
+
+def test_failing_run_is_retried_then_dead(db: Database, executor: WorkflowExecutor):
+    account_number = create_account(db, "Failing")
+    assert executor.wait_idle(timeout=10)
+    # At least once: every attempt runs the steps again
+    assert step_calls == [(account_number, False)] * 2
+    assert runs_in_state(db, WorkflowRunQueue.DEAD) == 1
+
+
+def test_without_executor_steps_run_after_insert_with_the_number(db: Database, account_trigger: None):
+    account_number = create_account(db, "Working")
+    [conn, cursor] = db.connect()
+    try:
+        account_record = AccountRecord.from_object(Account(account_name="Bulk", owner_id=OWNER))
+        db.insert_records(conn, cursor, [account_record])
+    finally:
+        conn.close()
+    assert account_number
+    assert step_calls == [(account_number, True), (account_record.account_number, False)]
@@ -0,0 +1,97 @@
+from typing import Optional
+
+import pytest
+
+from src.db.database import Database
+from src.db.workflow_run_queue import WorkflowRun, WorkflowRunQueue
+
+
+def enqueue(db: Database) -> str:
+    with db.transaction() as [conn, cursor]:
+        return WorkflowRunQueue.enqueue(cursor, "trigger", "workflow", "Case", "case")
+
+
+def claim(db: Database) -> Optional[WorkflowRun]:
+    with db.transaction() as [conn, cursor]:
+        return WorkflowRunQueue.claim(cursor)
+
+
+def fail(db: Database, workflow_run: WorkflowRun) -> str:
+    with db.transaction() as [conn, cursor]:
+        return WorkflowRunQueue.fail(cursor, workflow_run, "error")
+
+
+def read(db: Database, run_id: str) -> WorkflowRun:
+    [conn, cursor] = db.connect()
+    try:
+        return WorkflowRunQueue.read_run(cursor, run_id)
+    finally:
+        conn.close()
+
+
+def test_claim_leases_the_run_to_one_worker(db: Database):
+    run_id = enqueue(db)
+    workflow_run = claim(db)
+    assert workflow_run.id == run_id
+    assert workflow_run.state == WorkflowRunQueue.RUNNING
+    assert workflow_run.attempts == 1
+    assert claim(db) is None
+    with db.transaction() as [conn, cursor]:
+        assert WorkflowRunQueue.complete(cursor, workflow_run)
+    assert read(db, run_id).state == WorkflowRunQueue.DONE
+    assert claim(db) is None
+
+
+def test_failed_run_is_retried_after_backoff(db: Database, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(WorkflowRunQueue, "base_backoff_seconds", 60.0)
+    run_id = enqueue(db)
+    assert fail(db, claim(db)) == WorkflowRunQueue.PENDING
+    # Not due before the backoff has passed
+    assert claim(db) is None
+    assert read(db, run_id).last_error == "error"
+    with db.transaction() as [conn, cursor]:
+        # As if the backoff had passed
+        cursor.execute(f"UPDATE {WorkflowRunQueue.table_name()} SET next_run_at = next_run_at - 60")
+    workflow_run = claim(db)
+    assert workflow_run.id == run_id
+    assert workflow_run.attempts == 2
+
+
+def test_backoff_grows_exponentially_up_to_the_maximum():
+    assert [WorkflowRunQueue.backoff_seconds(attempts) for attempts in [1, 2, 3, 4]] == [1.0, 2.0, 4.0, 8.0]
+    assert WorkflowRunQueue.backoff_seconds(100) == WorkflowRunQueue.max_backoff_seconds
+
+
+def test_run_is_dead_after_last_attempt_until_retried(db: Database, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(WorkflowRunQueue, "max_attempts", 2)
+    monkeypatch.setattr(WorkflowRunQueue, "base_backoff_seconds", 0.0)
+    run_id = enqueue(db)
+    assert fail(db, claim(db)) == WorkflowRunQueue.PENDING
+    assert fail(db, claim(db)) == WorkflowRunQueue.DEAD
+    assert claim(db) is None
+    with db.transaction() as [conn, cursor]:
+        assert [workflow_run.id for workflow_run in WorkflowRunQueue.list_runs(cursor, WorkflowRunQueue.DEAD, 10)] \
+            == [run_id]
+        assert WorkflowRunQueue.retry_dead(cursor, run_id)
+        assert not WorkflowRunQueue.retry_dead(cursor, run_id)
+    workflow_run = claim(db)
+    assert workflow_run.id == run_id
+    assert workflow_run.attempts == 1
+
+
+def test_expired_lease_is_claimed_again_and_stale_attempt_is_ignored(db: Database,
+                                                                     monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(WorkflowRunQueue, "lease_seconds", 0.0)
+    run_id = enqueue(db)
+    stale_run = claim(db)
+    current_run = claim(db)
+    assert current_run.id == run_id
+    assert current_run.attempts == 2
+    with db.transaction() as [conn, cursor]:
+        # The first worker finishing late does not touch the run the second one holds now
+        assert not WorkflowRunQueue.complete(cursor, stale_run)
+        assert WorkflowRunQueue.fail(cursor, stale_run, "late") == WorkflowRunQueue.RUNNING
+    assert read(db, run_id).state == WorkflowRunQueue.RUNNING
+    with db.transaction() as [conn, cursor]:
+        assert WorkflowRunQueue.complete(cursor, current_run)
+    assert read(db, run_id).state == WorkflowRunQueue.DONE